@@ -0,0 +1,336 @@
+"""
+Local stand-in for the BigQuery and Asset Inventory endpoints, serving a synthetic catalog. Credentials need a
+non-expiring access token, token endpoint is not configurable in authorized user credentials.
+
+Resources are generated from their names on every request (nothing is stored), so catalogs of millions of tables
+cost no memory. Run standalone with `python benchmarks/fake_server.py --port 8080` and point bq-meta to it with
+BQ_META_BIGQUERY_ENDPOINT and BQ_META_ASSET_ENDPOINT.
+"""
+import argparse
+import hashlib
+import json
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from typing import Callable, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlparse
+
+WIDE_TABLE = "wide_nested"  # table with wide_columns nested columns, present in every dataset
+ROLES = ["roles/bigquery.dataViewer", "roles/bigquery.dataEditor", "roles/bigquery.dataOwner"]
+
+
+@dataclass(frozen=True)
+class Catalog:
+    projects: int = 1
+    datasets: int = 1  # per project
+    tables: int = 100  # per dataset
+    columns: int = 50  # columns of regular tables
+    wide_columns: int = 12000  # columns of the wide nested table
+    depth: int = 3  # nesting of records
+    members: int = 100  # members per role, in iam policies and analyses
+    page_size: int = 1000  # max results of list calls
+    latency_ms: float = 0.0  # added to every response
+
+    def project_ids(self) -> List[str]:
+        return [f"bench-p{idx}" for idx in range(self.projects)]
+
+    def dataset_ids(self) -> List[str]:
+        return [f"d{idx}" for idx in range(self.datasets)]
+
+    def table_ids(self) -> List[str]:
+        return [self.table_id(idx) for idx in range(self.tables + 1)]
+
+    def table_id(self, idx: int) -> str:
+        return f"t{idx:07d}" if idx < self.tables else WIDE_TABLE
+
+    def has_table(self, project_id: str, dataset_id: str, table_id: str) -> bool:
+        if project_id not in self.project_ids() or dataset_id not in self.dataset_ids():
+            return False
+        return table_id == WIDE_TABLE or (table_id[1:].isdigit() and int(table_id[1:]) < self.tables)
+
+    def table(self, project_id: str, dataset_id: str, table_id: str) -> dict:
+        seed = _seed(f"{project_id}:{dataset_id}.{table_id}")
+        num_rows = seed % 10**9
+        logical = seed % 10**12
+        columns = self.wide_columns if table_id == WIDE_TABLE else self.columns
+        return {
+            "kind": "bigquery#table",
+            "etag": f"etag-{seed % 10**6}",
+            "id": f"{project_id}:{dataset_id}.{table_id}",
+            "selfLink": f"/projects/{project_id}/datasets/{dataset_id}/tables/{table_id}",
+            "tableReference": {"projectId": project_id, "datasetId": dataset_id, "tableId": table_id},
+            "description": f"Synthetic table {table_id}",
+            "labels": {"team": ["ads", "core", "ml"][seed % 3], "env": "bench"},
+            "schema": {"fields": _schema(columns, self.depth)},
+            "numBytes": str(logical),
+            "numLongTermBytes": str(logical // 2),
+            "numRows": str(num_rows),
+            "numTotalLogicalBytes": str(logical),
+            "numActiveLogicalBytes": str(logical // 2),
+            "numLongTermLogicalBytes": str(logical // 2),
+            "numTotalPhysicalBytes": str(logical // 4),
+            "numActivePhysicalBytes": str(logical // 8),
+            "numLongTermPhysicalBytes": str(logical // 8),
+            "numTimeTravelPhysicalBytes": "0",
+            "creationTime": "1700000000000",
+            "lastModifiedTime": "1700000000000",
+            "type": "TABLE",
+            "location": "US",
+        }
+
+    def members_of(self, role: str) -> List[str]:
+        return [f"user:{role.rsplit('.', 1)[-1].lower()}{idx}@example.com" for idx in range(self.members)]
+
+
+@lru_cache(maxsize=None)
+def _schema(columns: int, depth: int) -> List[dict]:
+    """
+    Every tenth column is a record of ten columns, nested up to depth levels
+    """
+
+    def fields(count: int, level: int, budget: List[int]) -> List[dict]:
+        result = []
+        for idx in range(count):
+            if budget[0] <= 0:
+                break
+            budget[0] -= 1
+            if level < depth and idx % 10 == 9:
+                result.append(
+                    {
+                        "name": f"record_{idx}",
+                        "type": "RECORD",
+                        "mode": "REPEATED",
+                        "fields": fields(10, level + 1, budget),
+                    }
+                )
+            else:
+                result.append({"name": f"column_{idx}", "type": ["STRING", "INTEGER", "TIMESTAMP"][idx % 3]})
+        return result
+
+    budget = [columns]
+    result = []
+    while budget[0] > 0:
+        result.extend(fields(budget[0], 0, budget))
+    return result
+
+
+def _seed(name: str) -> int:
+    return int.from_bytes(hashlib.blake2b(name.encode(), digest_size=8).digest(), "big")
+
+
+class FakeServer:
+    def __init__(self, catalog: Catalog, port: int = 0) -> None:
+        self.catalog = catalog
+        self.requests: Counter = Counter()  # route -> number of requests
+        self.bytes_sent = 0
+        self.lock = Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), _handler(self))
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def start(self) -> "FakeServer":
+        Thread(target=self.httpd.serve_forever, name="fake-server", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def reset_stats(self):
+        with self.lock:
+            self.requests.clear()
+            self.bytes_sent = 0
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"requests": dict(self.requests), "bytes_sent": self.bytes_sent}
+
+    def handle(self, method: str, path: str, query: dict, headers: dict) -> Tuple[str, int, Optional[dict]]:
+        """
+        Route name, status and json body of the response
+        """
+        catalog = self.catalog
+        if re.fullmatch(r"/v1/(.+):analyzeIamPolicy", path):
+            return "asset.analyze", 200, self._analyze(query)
+        if not path.startswith("/bigquery/v2/"):
+            return "unknown", 404, _error(404, f"Not found: {path}")
+        parts = path.removeprefix("/bigquery/v2/").split("/")
+        match parts:
+            case ["projects"]:
+                return "projects.list", 200, self._page(query, catalog.project_ids(), "projects", _project)
+            case ["projects", project_id, "datasets"] if project_id in catalog.project_ids():
+                datasets = self._page(query, catalog.dataset_ids(), "datasets", lambda d: _dataset(project_id, d))
+                return "datasets.list", 200, datasets
+            case ["projects", project_id, "datasets", dataset_id] if project_id in catalog.project_ids():
+                if dataset_id not in catalog.dataset_ids():
+                    return "datasets.get", 404, _error(404, f"Not found: Dataset {project_id}:{dataset_id}")
+                return "datasets.get", 200, _dataset(project_id, dataset_id)
+            case ["projects", project_id, "datasets", dataset_id, "tables"] if dataset_id in catalog.dataset_ids():
+                tables = self._page(
+                    query,
+                    _Ids(catalog.tables + 1, catalog.table_id),  # ids of millions of tables are never materialized
+                    "tables",
+                    lambda table_id: _table_item(project_id, dataset_id, table_id),
+                )
+                return "tables.list", 200, tables
+            case ["projects", project_id, "datasets", dataset_id, "tables", table_id]:
+                if table_id.endswith(":getIamPolicy") and method == "POST":
+                    return "tables.getIamPolicy", 200, self._policy()
+                if not catalog.has_table(project_id, dataset_id, table_id):
+                    return "tables.get", 404, _error(404, f"Not found: Table {project_id}:{dataset_id}.{table_id}")
+                table = catalog.table(project_id, dataset_id, table_id)
+                if headers.get("if-none-match") == table["etag"]:
+                    return "tables.get", 304, None
+                return "tables.get", 200, table
+        return "unknown", 404, _error(404, f"Not found: {path}")
+
+    def _page(self, query: dict, ids: Sequence[str], key: str, item: Callable[[str], dict]) -> dict:
+        start = int(query.get("pageToken", ["0"])[0])
+        max_results = min(int(query.get("maxResults", [self.catalog.page_size])[0]), self.catalog.page_size)
+        page = {key: [item(resource_id) for resource_id in ids[start : start + max_results]], "totalItems": len(ids)}
+        if start + max_results < len(ids):
+            page["nextPageToken"] = str(start + max_results)
+        return page
+
+    def _policy(self) -> dict:
+        return {
+            "version": 1,
+            "etag": "BwX=",
+            "bindings": [{"role": role, "members": self.catalog.members_of(role)} for role in ROLES],
+        }
+
+    def _analyze(self, query: dict) -> dict:
+        """
+        Roles bound to the dataset, attached to the table resource (or expanded to tables of the dataset)
+        """
+        resource = query.get("analysisQuery.resourceSelector.fullResourceName", [""])[0]
+        roles = query.get("analysisQuery.accessSelector.roles", ROLES)
+        expand = query.get("analysisQuery.options.expandResources", ["false"])[0] == "true"
+        if match := re.search(r"projects/([^/]+)/datasets/([^/]+)", resource):
+            project_id, dataset_ids = match.group(1), [match.group(2)]
+        else:
+            project_id, dataset_ids = resource.rsplit("/", 1)[-1], self.catalog.dataset_ids()
+        datasets = [f"//bigquery.googleapis.com/projects/{project_id}/datasets/{d}" for d in dataset_ids]
+        if expand:
+            tables = [f"{dataset}/tables/{table_id}" for dataset in datasets for table_id in self.catalog.table_ids()]
+        else:
+            tables = [resource]
+        results = [
+            {
+                "attachedResourceFullName": datasets[0],
+                "iamBinding": {"role": role, "members": self.catalog.members_of(role)},
+                "accessControlLists": [{"resources": [{"fullResourceName": table} for table in tables]}],
+                "fullyExplored": True,
+            }
+            for role in roles
+        ]
+        return {"mainAnalysis": {"analysisResults": results, "fullyExplored": True}, "fullyExplored": True}
+
+
+class _Ids(Sequence):
+    def __init__(self, count: int, id_at: Callable[[int], str]) -> None:
+        self.count = count
+        self.id_at = id_at
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self.id_at(idx) for idx in range(*item.indices(self.count))]
+        return self.id_at(item)
+
+
+def _project(project_id: str) -> dict:
+    return {
+        "kind": "bigquery#project",
+        "id": project_id,
+        "numericId": str(_seed(project_id) % 10**12),
+        "projectReference": {"projectId": project_id},
+        "friendlyName": project_id,
+    }
+
+
+def _dataset(project_id: str, dataset_id: str) -> dict:
+    return {
+        "kind": "bigquery#dataset",
+        "id": f"{project_id}:{dataset_id}",
+        "etag": f"etag-{_seed(dataset_id) % 10**6}",
+        "datasetReference": {"projectId": project_id, "datasetId": dataset_id},
+        "location": "US",
+        "creationTime": "1700000000000",
+        "lastModifiedTime": "1700000000000",
+    }
+
+
+def _table_item(project_id: str, dataset_id: str, table_id: str) -> dict:
+    return {
+        "kind": "bigquery#table",
+        "id": f"{project_id}:{dataset_id}.{table_id}",
+        "tableReference": {"projectId": project_id, "datasetId": dataset_id, "tableId": table_id},
+        "type": "TABLE",
+        "creationTime": "1700000000000",
+    }
+
+
+def _error(code: int, message: str) -> dict:
+    return {"error": {"code": code, "message": message, "errors": [{"message": message, "reason": "notFound"}]}}
+
+
+def _handler(server: FakeServer):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, clients reuse connections like against the real api
+        disable_nagle_algorithm = True  # headers and body are written separately, no delayed ack between them
+
+        def do_GET(self):
+            self._respond("GET")
+
+        def do_POST(self):
+            self._respond("POST")
+
+        def _respond(self, method: str):
+            length = int(self.headers.get("Content-Length", 0))
+            if length:
+                self.rfile.read(length)
+            url = urlparse(self.path)
+            headers = {name.lower(): value for name, value in self.headers.items()}
+            route, status, body = server.handle(method, url.path, parse_qs(url.query), headers)
+            content = json.dumps(body).encode() if body is not None else b""
+            if server.catalog.latency_ms:
+                time.sleep(server.catalog.latency_ms / 1000)
+            with server.lock:
+                server.requests[route] += 1
+                server.bytes_sent += len(content)
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8080)
+    for name, default in Catalog().__dict__.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(default), default=default)
+    args = vars(parser.parse_args())
+    port = args.pop("port")
+    server = FakeServer(Catalog(**args), port)
+    print(f"Serving {server.catalog} on {server.url}")
+    server.httpd.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+"""
+Benchmarks of bq-meta against a local fake BigQuery / Asset Inventory server (see fake_server.py).
+
+Every scenario runs for every catalog size (tables per dataset) and reports latency percentiles, throughput, requests
+sent to the server and optionally peak python memory. Results are written as json, a previous result file can be
+compared with --compare, e.g.
+
+    python benchmarks/run.py --sizes 10,1000 --output before.json
+    python benchmarks/run.py --sizes 10,1000 --compare before.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fake_server import WIDE_TABLE, Catalog, FakeServer  # noqa: E402
+
+PROJECT_ID = "bench-p0"
+DATASET_ID = "d0"
+GET_TABLES = 200  # tables fetched by the table scenarios (at most the catalog size)
+CLI_RUNS = 5
+
+
+@dataclass
+class Result:
+    scenario: str
+    size: int
+    latencies: List[float] = field(default_factory=list)  # seconds of every measured operation
+    items: int = 0  # items processed (tables, rows, members), for throughput
+    requests: Dict[str, int] = field(default_factory=dict)
+    bytes_received: int = 0
+    peak_memory: Optional[int] = None  # bytes, only with --memory
+
+    def summary(self) -> dict:
+        from bq_meta.util.stats_utils import percentile  # same formula as the session stats
+
+        total = sum(self.latencies)
+        latencies = sorted(self.latencies)
+        return {
+            "scenario": self.scenario,
+            "size": self.size,
+            "runs": len(latencies),
+            "total_s": round(total, 6),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+            "max_ms": round(latencies[-1] * 1000, 3) if latencies else 0,
+            "items_per_s": round(self.items / total, 1) if total and self.items else None,
+            "requests": self.requests,
+            "bytes_received": self.bytes_received,
+            "peak_memory_mb": round(self.peak_memory / 2**20, 2) if self.peak_memory is not None else None,
+        }
+
+
+class Bench:
+    def __init__(self, home: str, server: FakeServer, memory: bool) -> None:
+        self.home = home
+        self.server = server
+        self.memory = memory
+        self.services = None
+
+    def reset(self, catalog: Catalog):
+        """
+        Empty BQ_META_HOME (except the config) and fresh services, nothing is cached between catalog sizes
+        """
+        from bq_meta.config import Config
+        from bq_meta.service.services import Services
+        from rich.console import Console
+
+        self.server.catalog = catalog
+        for path in Path(self.home).iterdir():
+            if path.name != "config.yaml":
+                shutil.rmtree(path) if path.is_dir() else path.unlink()
+        for name in ("history", "projects"):
+            Path(self.home, name).touch()
+        Path(self.home, "cache").mkdir()
+        self.services = Services(Console(file=io.StringIO(), width=160, height=50), Config())
+
+    def run(self, scenario: str, size: int, fn: Callable[[Result], None]) -> Result:
+        result = Result(scenario, size)
+        self.server.reset_stats()
+        if self.memory:
+            tracemalloc.start()
+        try:
+            fn(result)
+        finally:
+            if self.memory:
+                result.peak_memory = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+        stats = self.server.stats()
+        result.requests = stats["requests"]
+        result.bytes_received = stats["bytes_sent"]
+        return result
+
+    def timed(self, result: Result, fn: Callable, *args):
+        start = time.perf_counter()
+        value = fn(*args)
+        result.latencies.append(time.perf_counter() - start)
+        return value
+
+
+def scenarios(bench: Bench, catalog: Catalog) -> Dict[str, Callable[[Result], None]]:
+    services = bench.services
+    table_ids = [catalog.table_id(idx) for idx in range(min(GET_TABLES, catalog.tables))]
+
+    def table_get_cold(result: Result):
+        for table_id in table_ids:  # not cached, whichever scenario ran before
+            services.table_service.remove_cached_table(f"{PROJECT_ID}.{DATASET_ID}.{table_id}")
+        bench.server.reset_stats()
+        for table_id in table_ids:
+            bench.timed(result, services.table_service.get_table, PROJECT_ID, DATASET_ID, table_id)
+        result.items = len(table_ids)
+
+    def table_get_cached(result: Result):
+        for table_id in table_ids:  # warm-up, every table is cached
+            services.table_service.get_table(PROJECT_ID, DATASET_ID, table_id)
+        bench.server.reset_stats()
+        for table_id in table_ids:
+            bench.timed(result, services.table_service.get_table, PROJECT_ID, DATASET_ID, table_id)
+        result.items = len(table_ids)
+
+    def table_revalidate(result: Result):
+        cache_ttl = services.config.cache_ttl
+        services.config.cache_ttl = 0  # every cached entry is expired, revalidated by etag
+        try:
+            for table_id in table_ids:
+                bench.timed(result, services.table_service.get_table, PROJECT_ID, DATASET_ID, table_id)
+        finally:
+            services.config.cache_ttl = cache_ttl
+        result.items = len(table_ids)
+
+    def tables_list(result: Result):
+        count = 0
+        start = time.perf_counter()
+        for page in services.table_service.stream_table_ids(PROJECT_ID, DATASET_ID):
+            result.latencies.append(time.perf_counter() - start)  # time to every page
+            count += len(page)
+            start = time.perf_counter()
+        result.items = count
+
+    def history_save(result: Result):
+        tables = [services.table_service.get_table(PROJECT_ID, DATASET_ID, table_id) for table_id in table_ids]
+        bench.server.reset_stats()
+        for table in tables:
+            bench.timed(result, services.history_service.save_table, table)
+        result.items = len(tables)
+
+    def history_load(result: Result):
+        from bq_meta.service.history_service import HistoryService
+
+        history_service = HistoryService(services.console, services.config, services.table_service)
+        result.items = len(bench.timed(result, history_service.list_tables))
+
+    def history_purge(result: Result):
+        bench.timed(result, services.history_service.purge_tables)
+        result.items = len(table_ids)
+
+    def iam_fetch(result: Result):
+        tables = [services.table_service.get_table(PROJECT_ID, DATASET_ID, table_id) for table_id in table_ids[:20]]
+        bench.server.reset_stats()
+        for table in tables:  # first table analyzes the dataset, others need only their own policy
+            bench.timed(result, services.iam_service.fetch_all_roles_members, table, services.config.iam_roles)
+        result.items = len(tables) * len(services.config.iam_roles) * catalog.members
+
+    def iam_audit(result: Result):
+        out = io.StringIO()
+        args = (PROJECT_ID, DATASET_ID, services.config.iam_roles, "ndjson", out)
+        result.items = bench.timed(result, services.iam_service.audit_roles_members, *args)
+
+    def render_table(result: Result):
+        from bq_meta import output
+
+        table = services.table_service.get_table(PROJECT_ID, DATASET_ID, table_ids[0])
+        for _ in range(50):
+            bench.timed(result, services.console.print, output.get_table_output(table))
+        result.items = 50
+
+    def render_schema(result: Result):
+        from bq_meta.util.schema_util import SchemaBrowser
+
+        table = services.table_service.get_table(PROJECT_ID, DATASET_ID, WIDE_TABLE)
+        fields = table._properties["schema"]["fields"]
+        browser = bench.timed(result, SchemaBrowser, "wide", fields)
+        for _ in range(50):
+            bench.timed(result, services.console.print, browser)
+        result.items = len(browser.nodes)
+
+    found = {
+        "table.get.cold": table_get_cold,
+        "table.get.cached": table_get_cached,
+        "table.revalidate": table_revalidate,
+        "tables.list": tables_list,
+        "history.save": history_save,
+        "history.load": history_load,
+        "history.purge": history_purge,
+        "iam.fetch": iam_fetch,
+        "render.table": render_table,
+        "render.schema": render_schema,
+    }
+    if catalog.tables <= 100_000:  # expanded analysis lists every table of the dataset for every role
+        found["iam.audit"] = iam_audit
+    return found
+
+
+def cli_cold_start(bench: Bench, size: int, prefixes: tuple) -> List[Result]:
+    """
+    New interpreter for every run, the way the command is used from scripts
+    """
+    commands = {
+        "cli.info": ["--info"],
+        "cli.raw": [f"{PROJECT_ID}:{DATASET_ID}.{bench.server.catalog.table_id(0)}", "--raw"],
+    }
+    results = []
+    for scenario, args in commands.items():
+        if not scenario.startswith(prefixes):
+            continue
+
+        def run(result: Result):
+            for _ in range(CLI_RUNS):
+                start = time.perf_counter()
+                subprocess.run(
+                    [sys.executable, "-m", "bq_meta", *args], check=True, capture_output=True, env=os.environ
+                )
+                result.latencies.append(time.perf_counter() - start)
+            result.items = CLI_RUNS
+
+        results.append(bench.run(scenario, size, run))
+    return results
+
+
+def setup_home(server: FakeServer) -> str:
+    home = tempfile.mkdtemp(prefix="bq-meta-bench-")
+    os.environ.update(
+        BQ_META_HOME=home,
+        BQ_META_BIGQUERY_ENDPOINT=server.url,
+        BQ_META_ASSET_ENDPOINT=server.url,
+        PYTHONPATH=os.pathsep.join(
+            filter(None, [str(Path(__file__).resolve().parent.parent), os.getenv("PYTHONPATH")])
+        ),
+    )
+    from bq_meta.config import Config
+
+    config = Config()
+    config.write_default()
+    config.update(
+        {
+            # access token never expires, the token endpoint is not served by the fake server
+            "credentials": json.dumps(
+                {
+                    "client_id": "bench",
+                    "client_secret": "bench",
+                    "refresh_token": "bench",
+                    "token": "bench",
+                    "expiry": "2099-01-01T00:00:00Z",
+                }
+            ),
+            "current_version": "bench",
+            "available_version": "bench",
+            "version_checked": 4102444800,  # no version check against PyPI
+        }
+    )
+    return home
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,1000,100000", help="tables per dataset, comma separated (up to 1000000)")
+    parser.add_argument("--scenarios", help="run only scenarios starting with one of the comma separated prefixes")
+    parser.add_argument("--members", type=int, default=1000, help="members of every iam role")
+    parser.add_argument("--wide-columns", type=int, default=12000, help="columns of the wide nested table")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="latency added to every server response")
+    parser.add_argument("--memory", action="store_true", help="measure peak python memory (slows scenarios down)")
+    parser.add_argument("--output", help="write results into the json file")
+    parser.add_argument("--compare", help="compare with results of a previous run (json file)")
+    args = parser.parse_args()
+
+    server = FakeServer(Catalog()).start()
+    home = setup_home(server)
+    from loguru import logger
+
+    logger.remove()
+    bench = Bench(home, server, args.memory)
+    prefixes = tuple(args.scenarios.split(",")) if args.scenarios else ("",)
+    results: List[Result] = []
+    try:
+        for size in [int(size) for size in args.sizes.split(",")]:
+            catalog = Catalog(
+                tables=size, members=args.members, wide_columns=args.wide_columns, latency_ms=args.latency_ms
+            )
+            bench.reset(catalog)
+            for scenario, fn in scenarios(bench, catalog).items():
+                if scenario.startswith(prefixes):
+                    results.append(bench.run(scenario, size, fn))
+                    _print(results[-1].summary())
+            for result in cli_cold_start(bench, size, prefixes):
+                results.append(result)
+                _print(result.summary())
+    finally:
+        server.stop()
+        shutil.rmtree(home, ignore_errors=True)
+
+    report = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "args": vars(args),
+        "results": [result.summary() for result in results],
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare, "r") as f:
+            _compare(json.load(f), report)
+
+
+def _print(summary: dict):
+    requests = sum(summary["requests"].values())
+    throughput = f"{summary['items_per_s']:>12}/s" if summary["items_per_s"] else " " * 14
+    memory = f"  {summary['peak_memory_mb']} MB" if summary["peak_memory_mb"] is not None else ""
+    print(
+        f"{summary['scenario']:<18} {summary['size']:>8}  p50 {summary['p50_ms']:>10.3f} ms  "
+        f"p95 {summary['p95_ms']:>10.3f} ms  total {summary['total_s']:>9.3f} s  {throughput}  "
+        f"{requests:>6} requests{memory}",
+        flush=True,
+    )
+
+
+def _compare(baseline: dict, report: dict):
+    print(f"\nCompared with {baseline.get('commit')} (ratio of total time, < 1 is faster)")
+    previous = {(result["scenario"], result["size"]): result for result in baseline["results"]}
+    for result in report["results"]:
+        before = previous.get((result["scenario"], result["size"]))
+        if before and before["total_s"]:
+            ratio = result["total_s"] / before["total_s"]
+            print(
+                f"{result['scenario']:<18} {result['size']:>8}  {before['total_s']:>9.3f} s -> {result['total_s']:>9.3f} s  x{ratio:.2f}"
+            )
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,19 @@
-from bq_meta.cli import cli
+import sys
+
+
+def main():
+    """
+    Entry point of the bq-meta script, with --profile-startup the import hook is installed before the cli and its
+    dependencies are imported
+    """
+    if "--profile-startup" in sys.argv[1:]:
+        from bq_meta.util import profile_utils
+
+        profile_utils.start_profiler()
+    from bq_meta.cli import cli
 
-if __name__ == "__main__":
     cli()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,60 +1,123 @@
+import json
 import os
-from typing import Optional
+import sys
+from typing import Optional, TextIO, Tuple
 
 import click
+from loguru import logger
 from rich.console import Console
-from rich.panel import Panel
-from rich.text import Text
-from google.cloud.bigquery.table import TableReference
 
-from bq_meta import const, output
-from bq_meta.client import Client
+from bq_meta import const
 from bq_meta.config import Config
-from bq_meta.initialize import initialize
-from bq_meta.service.history_service import HistoryService
-from bq_meta.service.iam_service import IamService
-from bq_meta.service.project_service import ProjectService
-from bq_meta.service.table_service import TableService
-from bq_meta.service.snippet_service import SnippetService
-from bq_meta.service.version_service import VersionService
-from bq_meta.util import table_utils
-from bq_meta.window import Window
-from loguru import logger
-import os
+from bq_meta.service.services import Services
+from bq_meta.util import profile_utils, stats_utils
+from bq_meta.util.profile_utils import span
 
 
 @click.command()
 @click.argument("full_table_id", required=False)
 @click.option("--raw", help="View raw response from the BigQuery for specific 'FULL_TABLE_ID'", is_flag=True)
+@click.option(
+    "--batch",
+    help="Fetch tables listed in file (one 'FULL_TABLE_ID' per line, '-' for stdin), print them as json lines",
+    type=click.File("r"),
+)
+@click.option("--workers", help="Number of concurrent fetches in --batch mode", type=int)
 @click.option("--init", help="Initialize 'bq-meta' configuration", is_flag=True)
 @click.option("--info", help="Print info of currently used account", is_flag=True)
 @click.option("--fetch-projects", help="Fetch available google projects", is_flag=True)
+@click.option("--crawl", help="Fetch available google projects and crawl their datasets and tables", is_flag=True)
+@click.option("--restart", help="With --crawl, start over instead of resuming an incomplete crawl", is_flag=True)
+@click.option("--sync", help="Update local catalog, listing tables only in changed datasets", is_flag=True)
+@click.option(
+    "--iam-audit",
+    help="Print members of the iam roles for every table of 'PROJECT' or 'PROJECT:DATASET'",
+    metavar="SCOPE",
+)
+@click.option(
+    "--format", "fmt", help="Output format of --iam-audit", type=click.Choice(["ndjson", "csv"]), default="ndjson"
+)
+@click.option("--daemon", help="Serve table metadata to other calls over BQ_META_HOME/daemon.sock", is_flag=True)
+@click.option(
+    "--find-column", help="Print tables having the column (name, record.name or name prefix*)", metavar="NAME"
+)
+@click.option("--storage-report", help="Print largest cached tables, answered from the local catalog", is_flag=True)
+@click.option(
+    "--label", "labels", help="With --storage-report, tables with label 'KEY=VALUE' (or 'KEY')", multiple=True
+)
+@click.option("--description", help="With --storage-report, tables with description containing text")
+@click.option(
+    "--dataset-summary", help="Print storage totals and largest tables of 'PROJECT:DATASET'", metavar="DATASET"
+)
+@click.option(
+    "--sort-by",
+    help="With --storage-report or --dataset-summary, storage metric to sort by",
+    type=click.Choice(list(const.STORAGE_METRICS)),
+    default="physical",
+)
+@click.option(
+    "--limit", help="With --storage-report or --dataset-summary, number of tables printed", type=int, default=100
+)
+@click.option("--percentiles", help="With --storage-report, print percentiles of the --sort-by metric", is_flag=True)
 @click.option("--purge-history", help="Remove non existing tables from history", is_flag=True)
+@click.option("--profile-startup", help="Print import and init timings at exit", is_flag=True)
+@click.option(
+    "--profile", help="Sample the session, write folded stacks into BQ_META_HOME/profile.folded at exit", is_flag=True
+)
+@click.option(
+    "--stats", help="Print remote call and render stats at exit, dump them into BQ_META_HOME/stats.json", is_flag=True
+)
 @click.option("--debug", help="Log debug messages into BQ_META_HOME/debug.log", is_flag=True)
 @click.option("--trace", help="Log tace messages into BQ_META_HOME/trace.log", is_flag=True)
 @click.version_option()
 def cli(
     full_table_id: Optional[str],
     raw: bool,
+    batch: Optional[TextIO],
+    workers: Optional[int],
     init: bool,
     info: bool,
     fetch_projects: bool,
+    crawl: bool,
+    restart: bool,
+    sync: bool,
+    iam_audit: Optional[str],
+    fmt: str,
+    daemon: bool,
+    find_column: Optional[str],
+    storage_report: bool,
+    labels: Tuple[str, ...],
+    description: Optional[str],
+    dataset_summary: Optional[str],
+    sort_by: str,
+    limit: int,
+    percentiles: bool,
     purge_history: bool,
+    profile_startup: bool,
+    profile: bool,
+    stats: bool,
     debug: bool,
     trace: bool,
 ):
     """BiqQuery metadata"""
 
     ctx = click.get_current_context()
+    if restart and not crawl:
+        raise click.UsageError("--restart requires --crawl")
     console = Console(theme=const.theme, soft_wrap=True, force_interactive=True)
-    config = Config()
-    client = Client(console, config)
-    project_service = ProjectService(console, config, client)
-    table_service = TableService(console, config, client, project_service)
-    snippet_service = SnippetService()
-    history_service = HistoryService(console, config, table_service)
-    iam_service = IamService(console, config, client)
-    window = Window(console, config, history_service, table_service, snippet_service, iam_service)
+    if profile_startup:
+        profiler = profile_utils.start_profiler()
+        ctx.call_on_close(lambda: profiler.report(console))
+    if profile:
+        sampler = profile_utils.SamplingProfiler().start()
+        ctx.call_on_close(lambda: _report_profile(sampler, console))
+    if stats:
+        session_stats = stats_utils.start_stats()
+        ctx.call_on_close(lambda: _report_stats(session_stats, console))
+
+    with span("init config"):
+        config = Config()
+        services = Services(console, config)
     table = None
 
     logger.remove(0)  # disable stdout handler
@@ -66,15 +129,23 @@ def cli(
         logger.add(const.BQ_META_TRACE, colorize=True, level="TRACE", rotation="1 MB", format=const.logger_format)
 
     if os.path.exists(const.BQ_META_HOME):
-        version_service = VersionService()
-        version_service.update_config(config)
+        with span("version check"):
+            from bq_meta.service.version_service import VersionService
+
+            version_service = VersionService()
+            version_service.update_config(config)
 
     logger.debug(f"Loaded config: {config.conf}")
 
     if init:
-        initialize(config, console, project_service)
+        from bq_meta.initialize import initialize
+
+        initialize(config, console, services.project_service)
         ctx.exit()
     elif not os.path.exists(const.BQ_META_HOME):
+        from rich.panel import Panel
+        from rich.text import Text
+
         panel = Panel(
             title="Not initialized, run",
             renderable=Text("bq-meta --init"),
@@ -85,22 +156,92 @@ def cli(
         console.print(panel)
         ctx.exit()
     elif info:
+        from bq_meta import output
+
         console.print(output.get_config_info(config))
         ctx.exit()
-    elif fetch_projects:
-        project_service.fetch_projects()
+    elif fetch_projects or crawl:
+        services.project_service.fetch_projects()
+        if crawl:
+            services.crawl_service.crawl(restart)
+        ctx.exit()
+    elif batch:
+        with span("init services"):
+            batch_service = services.batch_service
+        batch_service.fetch_tables(batch, workers or config.batch_workers, sys.stdout)
+        ctx.exit()
+    elif sync:
+        services.crawl_service.sync()
+        ctx.exit()
+    elif iam_audit:
+        project_id, _, dataset_id = iam_audit.replace(":", ".").partition(".")
+        services.iam_service.audit_roles_members(project_id, dataset_id or None, config.iam_roles, fmt, sys.stdout)
+        ctx.exit()
+    elif daemon:
+        services.daemon_service.serve()
+        ctx.exit()
+    elif find_column:
+        from bq_meta import output
+
+        console.print(output.get_columns_output(services.table_service.find_columns(find_column)), end="")
+        ctx.exit()
+    elif storage_report:
+        services.storage_service.report(list(labels), description, sort_by, limit, percentiles)
+        ctx.exit()
+    elif dataset_summary:
+        services.storage_service.print_dataset_summary(dataset_summary, sort_by, limit)
         ctx.exit()
     elif purge_history:
-        history_service.purge_tables()
+        services.history_service.purge_tables()
         ctx.exit()
     elif full_table_id:
-        table_ref = TableReference.from_string(full_table_id.replace(":", "."))
-        project_id = table_ref.project
-        dataset_id = table_ref.dataset_id
-        table_id = table_ref.table_id
-        table = table_service.get_table(project_id, dataset_id, table_id)
-        if raw:
-            console.print_json(table_utils.get_properties(table))
-            ctx.exit()
+        with span("daemon request"):
+            from bq_meta.util import daemon_utils
+
+            response = daemon_utils.request({"method": "get_table", "table": full_table_id})
+        if response and "error" in response:  # fetching in-process would repeat the failed call
+            from rich.text import Text
+
+            console.print(Text(f"Table {full_table_id} not fetched: {response['error']}", style=const.error_style))
+            ctx.exit(1)
+        if response and "table" in response:
+            logger.debug(f"Table {full_table_id} served by the daemon")
+            if raw:
+                console.print_json(json.dumps(response["table"], indent=2))
+                ctx.exit()
+            from google.cloud import bigquery
 
+            table = bigquery.Table.from_api_repr(response["table"])
+        else:
+            with span("init services"):
+                from google.cloud.bigquery.table import TableReference
+                from bq_meta.util import table_utils
+
+                table_service = services.table_service
+            table_ref = TableReference.from_string(full_table_id.replace(":", "."))
+            project_id = table_ref.project
+            dataset_id = table_ref.dataset_id
+            table_id = table_ref.table_id
+            with span("get table"):
+                table = table_service.get_table(project_id, dataset_id, table_id)
+            if raw:
+                console.print_json(table_utils.get_properties(table))
+                ctx.exit()
+
+    with span("init window"):
+        window = services.window
     window.live_window(table)
+
+
+def _report_stats(session_stats: stats_utils.SessionStats, console: Console):
+    path = const.BQ_META_STATS if os.path.exists(const.BQ_META_HOME) else None
+    if path:
+        session_stats.dump(path)
+    session_stats.report(console, path)
+
+
+def _report_profile(sampler: profile_utils.SamplingProfiler, console: Console):
+    sampler.stop()
+    path = const.BQ_META_PROFILE if os.path.exists(const.BQ_META_HOME) else "profile.folded"
+    sampler.write(path)
+    sampler.report(console, path)
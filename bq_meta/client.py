@@ -1,9 +1,36 @@
-from google.cloud.asset_v1 import AssetServiceClient
-from google.cloud.bigquery import Client as BigQueryClient
-from google.oauth2.credentials import Credentials
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
 from rich.console import Console
 
+from bq_meta import const
 from bq_meta.config import Config
+from bq_meta.util import stats_utils
+
+if TYPE_CHECKING:
+    from google.api_core.retry import Retry
+    from google.cloud.asset_v1 import AssetServiceClient
+    from google.cloud.bigquery import Client as BigQueryClient
+
+
+@lru_cache(maxsize=None)
+def rate_limit_retry() -> "Retry":
+    """
+    Exponential backoff on rate limiting and transient server errors, used by bulk operations
+    """
+    from google.api_core.exceptions import BadGateway, GatewayTimeout, InternalServerError, ServiceUnavailable
+    from google.api_core.exceptions import TooManyRequests
+    from google.api_core.retry import Retry, if_exception_type
+
+    return Retry(
+        predicate=if_exception_type(
+            TooManyRequests, InternalServerError, BadGateway, ServiceUnavailable, GatewayTimeout
+        ),
+        initial=1.0,
+        maximum=32.0,
+        multiplier=2.0,
+        deadline=300.0,
+    )
 
 
 class Client:
@@ -16,18 +43,43 @@ class Client:
         self.config = config
 
     @property
-    def bq_client(self) -> BigQueryClient:
+    def bq_client(self) -> "BigQueryClient":
         if not self._bq_client:
+            from google.cloud.bigquery import Client as BigQueryClient
+            from google.oauth2.credentials import Credentials
+
+            endpoint = const.BQ_META_BIGQUERY_ENDPOINT
             self._bq_client = BigQueryClient(
                 project="",  # leaving project as None would result in error
                 credentials=Credentials.from_authorized_user_info(self.config.credentials),
+                client_options={"api_endpoint": endpoint} if endpoint else None,
             )
+            if stats_utils.enabled():
+                self._bq_client._http.hooks["response"].append(stats_utils.record_response)
         return self._bq_client
 
     @property
-    def asset_client(self) -> AssetServiceClient:
+    def asset_client(self) -> "AssetServiceClient":
         if not self._asset_client:
+            from google.cloud.asset_v1 import AssetServiceClient
+            from google.oauth2.credentials import Credentials
+
+            endpoint = const.BQ_META_ASSET_ENDPOINT
             self._asset_client = AssetServiceClient(
                 credentials=Credentials.from_authorized_user_info(self.config.credentials),
+                client_options={"api_endpoint": endpoint} if endpoint else None,
+                transport="rest" if endpoint else None,  # local stand-ins serve plain http, not grpc
             )
+            session = getattr(self._asset_client._transport, "_session", None)  # rest transport only
+            if session is not None and stats_utils.enabled():
+                session.hooks["response"].append(stats_utils.record_response)
         return self._asset_client
+
+    def get_if_none_match(self, path: str, etag: str) -> dict:
+        """
+        GET of a BigQuery resource, raises NotModified (304) when its etag is still current.
+        Public client methods (get_table, ...) can't send request headers, so this goes through the private
+        `_call_api` of the bigquery client - the same entry point its public methods use. The supported
+        google-cloud-bigquery range is pinned in setup.cfg, re-check this call when widening it.
+        """
+        return self.bq_client._call_api(None, method="GET", path=path, headers={"If-None-Match": etag})
@@ -1,9 +1,11 @@
 import json
+from threading import RLock
 from typing import List
 
 import yaml
 
 from bq_meta import const
+from bq_meta.util.file_utils import atomic_write
 from loguru import logger
 
 
@@ -32,20 +34,44 @@ class Config:
         "current_version": "",
         "available_version": "",
         "account": "",
+        "cache_ttl": 3600,  # seconds, before cached table metadata is revalidated
+        "cache_size": 100 * 1024 * 1024,  # bytes, before least recently used tables are evicted
+        "catalog_ttl": 24 * 3600,  # seconds, before cached dataset and table listings are fetched again
+        "crawl_workers": 16,  # concurrent listings during --crawl
+        "crawl_project_workers": 4,  # concurrent listings of a single project during --crawl
+        "batch_workers": 16,  # concurrent table fetches during --batch
+        "purge_workers": 8,  # concurrent existence checks during --purge-history
+        "iam_cache_ttl": 600,  # seconds, before iam roles members are analyzed again
+        "iam_cache_size": 1000,  # number of cached iam analyses
+        "iam_cache_persist": False,  # keep iam analyses in BQ_META_HOME/cache/iam.json between sessions
+        "dataset_summary_ttl": 3600,  # seconds, before storage summary of a dataset is queried again
+        "version_check_interval": 24 * 3600,  # seconds, between checks of the available version on PyPI
+        "version_checked": 0,  # epoch seconds of the last check of the available version
+        "picker": "builtin",  # builtin or fzf
+        "group_shards": True,  # show date sharded tables (table_YYYYMMDD) as a single 'table_*' entry when picking
     }
 
     def __init__(self) -> None:
         self.config_path = const.BQ_META_CONFIG
         self._conf = None
+        self.lock = RLock()
 
     def write_default(self):
         conf = Config.default
         self._save_conf(conf)
 
+    def update(self, values: dict):
+        """
+        Update multiple values with a single write
+        """
+        with self.lock:
+            conf = {**self.conf, **values}
+            self._save_conf(conf)
+
     def _save_conf(self, conf: dict):
-        self._conf = conf
-        with open(self.config_path, "w") as f:
-            yaml.safe_dump(conf, f)
+        with self.lock:
+            self._conf = conf
+            atomic_write(self.config_path, yaml.safe_dump(conf))
 
     @property
     def conf(self) -> dict:
@@ -68,8 +94,7 @@ class Config:
 
     @account.setter
     def account(self, account: str):
-        conf = {**self.conf, "account": account}
-        self._save_conf(conf)
+        self.update({"account": account})
 
     @property
     def credentials(self) -> dict:
@@ -77,8 +102,7 @@ class Config:
 
     @credentials.setter
     def credentials(self, credentials: dict):
-        conf = {**self.conf, "credentials": credentials}
-        self._save_conf(conf)
+        self.update({"credentials": credentials})
 
     @property
     def current_version(self) -> str:
@@ -86,8 +110,7 @@ class Config:
 
     @current_version.setter
     def current_version(self, current_version: str):
-        conf = {**self.conf, "current_version": current_version}
-        self._save_conf(conf)
+        self.update({"current_version": current_version})
 
     @property
     def iam_roles(self) -> List[str]:
@@ -95,8 +118,7 @@ class Config:
 
     @iam_roles.setter
     def iam_roles(self, iam_roles: List[str]):
-        conf = {**self.conf, "iam_roles": iam_roles}
-        self._save_conf(conf)
+        self.update({"iam_roles": iam_roles})
 
     @property
     def available_version(self) -> str:
@@ -104,5 +126,124 @@ class Config:
 
     @available_version.setter
     def available_version(self, available_version: str):
-        conf = {**self.conf, "available_version": available_version}
-        self._save_conf(conf)
+        self.update({"available_version": available_version})
+
+    @property
+    def cache_ttl(self) -> int:
+        return self.conf.get("cache_ttl", Config.default["cache_ttl"])
+
+    @cache_ttl.setter
+    def cache_ttl(self, cache_ttl: int):
+        self.update({"cache_ttl": cache_ttl})
+
+    @property
+    def cache_size(self) -> int:
+        return self.conf.get("cache_size", Config.default["cache_size"])
+
+    @cache_size.setter
+    def cache_size(self, cache_size: int):
+        self.update({"cache_size": cache_size})
+
+    @property
+    def catalog_ttl(self) -> int:
+        return self.conf.get("catalog_ttl", Config.default["catalog_ttl"])
+
+    @catalog_ttl.setter
+    def catalog_ttl(self, catalog_ttl: int):
+        self.update({"catalog_ttl": catalog_ttl})
+
+    @property
+    def crawl_workers(self) -> int:
+        return self.conf.get("crawl_workers", Config.default["crawl_workers"])
+
+    @crawl_workers.setter
+    def crawl_workers(self, crawl_workers: int):
+        self.update({"crawl_workers": crawl_workers})
+
+    @property
+    def crawl_project_workers(self) -> int:
+        return self.conf.get("crawl_project_workers", Config.default["crawl_project_workers"])
+
+    @crawl_project_workers.setter
+    def crawl_project_workers(self, crawl_project_workers: int):
+        self.update({"crawl_project_workers": crawl_project_workers})
+
+    @property
+    def batch_workers(self) -> int:
+        return self.conf.get("batch_workers", Config.default["batch_workers"])
+
+    @batch_workers.setter
+    def batch_workers(self, batch_workers: int):
+        self.update({"batch_workers": batch_workers})
+
+    @property
+    def purge_workers(self) -> int:
+        return self.conf.get("purge_workers", Config.default["purge_workers"])
+
+    @purge_workers.setter
+    def purge_workers(self, purge_workers: int):
+        self.update({"purge_workers": purge_workers})
+
+    @property
+    def iam_cache_ttl(self) -> int:
+        return self.conf.get("iam_cache_ttl", Config.default["iam_cache_ttl"])
+
+    @iam_cache_ttl.setter
+    def iam_cache_ttl(self, iam_cache_ttl: int):
+        self.update({"iam_cache_ttl": iam_cache_ttl})
+
+    @property
+    def iam_cache_size(self) -> int:
+        return self.conf.get("iam_cache_size", Config.default["iam_cache_size"])
+
+    @iam_cache_size.setter
+    def iam_cache_size(self, iam_cache_size: int):
+        self.update({"iam_cache_size": iam_cache_size})
+
+    @property
+    def iam_cache_persist(self) -> bool:
+        return self.conf.get("iam_cache_persist", Config.default["iam_cache_persist"])
+
+    @iam_cache_persist.setter
+    def iam_cache_persist(self, iam_cache_persist: bool):
+        self.update({"iam_cache_persist": iam_cache_persist})
+
+    @property
+    def version_check_interval(self) -> int:
+        return self.conf.get("version_check_interval", Config.default["version_check_interval"])
+
+    @version_check_interval.setter
+    def version_check_interval(self, version_check_interval: int):
+        self.update({"version_check_interval": version_check_interval})
+
+    @property
+    def version_checked(self) -> float:
+        return self.conf.get("version_checked", Config.default["version_checked"])
+
+    @version_checked.setter
+    def version_checked(self, version_checked: float):
+        self.update({"version_checked": version_checked})
+
+    @property
+    def picker(self) -> str:
+        return self.conf.get("picker", Config.default["picker"])
+
+    @picker.setter
+    def picker(self, picker: str):
+        self.update({"picker": picker})
+
+    @property
+    def group_shards(self) -> bool:
+        return self.conf.get("group_shards", Config.default["group_shards"])
+
+    @group_shards.setter
+    def group_shards(self, group_shards: bool):
+        self.update({"group_shards": group_shards})
+
+    @property
+    def dataset_summary_ttl(self) -> int:
+        return self.conf.get("dataset_summary_ttl", Config.default["dataset_summary_ttl"])
+
+    @dataset_summary_ttl.setter
+    def dataset_summary_ttl(self, dataset_summary_ttl: int):
+        self.update({"dataset_summary_ttl": dataset_summary_ttl})
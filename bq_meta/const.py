@@ -12,8 +12,32 @@ BQ_META_CONFIG = f"{BQ_META_HOME}/config.yaml"
 BQ_META_PROJECTS = f"{BQ_META_HOME}/projects"
 BQ_META_HISTORY = f"{BQ_META_HOME}/history"
 BQ_META_SNIPPETS = f"{BQ_META_HOME}/snippets"
+BQ_META_CACHE = f"{BQ_META_HOME}/cache"
+BQ_META_CATALOG = f"{BQ_META_HOME}/catalog.db"
+BQ_META_IAM_CACHE = f"{BQ_META_HOME}/cache/iam.json"
+BQ_META_DATASET_CACHE = f"{BQ_META_HOME}/cache/datasets.json"
+BQ_META_CRAWL_CHECKPOINT = f"{BQ_META_HOME}/crawl_checkpoint"
+BQ_META_DAEMON_SOCKET = f"{BQ_META_HOME}/daemon.sock"
 BQ_META_DEBUG = f"{BQ_META_HOME}/debug.log"
 BQ_META_TRACE = f"{BQ_META_HOME}/trace.log"
+BQ_META_STATS = f"{BQ_META_HOME}/stats.json"
+BQ_META_PROFILE = f"{BQ_META_HOME}/profile.folded"
+
+# storage metric -> (column, property)
+STORAGE_METRICS = {
+    "rows": ("num_rows", "numRows"),
+    "logical": ("total_logical_bytes", "numTotalLogicalBytes"),
+    "active-logical": ("active_logical_bytes", "numActiveLogicalBytes"),
+    "long-term-logical": ("long_term_logical_bytes", "numLongTermLogicalBytes"),
+    "physical": ("total_physical_bytes", "numTotalPhysicalBytes"),
+    "active-physical": ("active_physical_bytes", "numActivePhysicalBytes"),
+    "long-term-physical": ("long_term_physical_bytes", "numLongTermPhysicalBytes"),
+    "time-travel-physical": ("time_travel_physical_bytes", "numTimeTravelPhysicalBytes"),
+}
+
+# api endpoints, overridden only to run against local stand-ins (see benchmarks)
+BQ_META_BIGQUERY_ENDPOINT = os.getenv("BQ_META_BIGQUERY_ENDPOINT")
+BQ_META_ASSET_ENDPOINT = os.getenv("BQ_META_ASSET_ENDPOINT")
 
 BQ_META_DISABLE_COLORS = os.getenv("BQ_META_DISABLE_COLORS", "False").lower() in ("true", "1", "t")
 BQ_META_SKIN = os.getenv("BQ_META_SKIN")
@@ -32,6 +32,8 @@ def initialize(config: Config, console: Console, project_service: ProjectService
     _print_created(console, const.BQ_META_HISTORY)
     Path(const.BQ_META_SNIPPETS).mkdir(parents=True, exist_ok=True)
     _print_created(console, const.BQ_META_SNIPPETS)
+    Path(const.BQ_META_CACHE).mkdir(parents=True, exist_ok=True)
+    _print_created(console, const.BQ_META_CACHE)
     Path(bq_meta.__file__).resolve().parent
     copy_tree(Path(bq_meta.__file__).resolve().parent / "snippets", const.BQ_META_SNIPPETS)
 
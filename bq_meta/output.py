@@ -1,24 +1,24 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import TYPE_CHECKING, List, Optional
 
-from google.cloud import bigquery
-from packaging import version
 from rich.align import Align
 from rich.box import SIMPLE
-from rich.columns import Columns
 from rich.console import Group, NewLine, RenderableType
 from rich.layout import Layout
 from rich.panel import Panel
 from rich.rule import Rule
+from rich.spinner import Spinner
 from rich.table import Table
 from rich.text import Text
-from rich.tree import Tree
 
 from bq_meta import const
 from bq_meta.config import Config
-from bq_meta.util import table_utils
 from bq_meta.util.num_utils import bytes_fmt, num_fmt, ms_fmt
-from bq_meta.window import Hint
+
+if TYPE_CHECKING:
+    from google.cloud import bigquery
+
+    from bq_meta.window import Hint
 
 title = """
 ██▄ █ ▄▀  ▄▀▄ █ █ ██▀ █▀▄ ▀▄▀   █▄ ▄█ ██▀ ▀█▀ ▄▀▄ █▀▄ ▄▀▄ ▀█▀ ▄▀▄
@@ -29,15 +29,17 @@ title = """
 def header_layout(config: Config) -> Layout:
     header_title = Align(title, align="center", style=const.info_style)
     header = Layout(name="header", size=4)
-    left = version_layout(config)
+    left = Layout(version_text(config), name="version", size=20)
     mid = Layout(header_title)
     right = Layout(NewLine(), size=20)
     header.split_row(left, mid, right)
     return header
 
 
-def version_layout(config: Config) -> Layout:
+def version_text(config: Config) -> Text:
     if config.current_version and config.available_version:
+        from packaging import version
+
         current = version.parse(config.current_version)
         available = version.parse(config.available_version)
         if current < available:
@@ -46,13 +48,12 @@ def version_layout(config: Config) -> Layout:
             version_text = Text(f"{current}", style=const.darker_style)
     else:
         version_text = Text(" ", style=const.darker_style)
-    return Layout(version_text, name="version", size=20)
+    return version_text
 
 
-def list_layout(values: List[str], selected: Optional[str]) -> Layout:
-    show = values and selected
+def list_panel(values: List[str], selected: Optional[str]) -> Panel:
     panel = Panel(NewLine())
-    if show:
+    if values and selected:
         separator = Rule(style=const.darker_style)
         values_list = []
         for value in values:
@@ -62,7 +63,7 @@ def list_layout(values: List[str], selected: Optional[str]) -> Layout:
                 text = Text(f"  {value}", style="default")
             values_list.extend([text, separator])
         panel = Panel(Group(*values_list), box=const.box_right_rounded, style=const.darker_style)
-    return Layout(panel, size=32, visible=show)
+    return panel
 
 
 def content_panel(renderable: Optional[RenderableType]) -> Panel:
@@ -75,14 +76,18 @@ def content_panel(renderable: Optional[RenderableType]) -> Panel:
 
 def window_panel(renderable: RenderableType, now: datetime) -> Panel:
     return Panel(
-        title=now.strftime("%Y-%m-%d %H:%M:%S UTC"),
+        title=window_title(now),
         title_align="right",
         renderable=renderable,
         border_style=const.border_style,
     )
 
 
-def hints_layout(hints: List[Hint], bottom_hints: List[Hint]) -> Layout:
+def window_title(now: datetime) -> str:
+    return now.strftime("%Y-%m-%d %H:%M:%S UTC")
+
+
+def hints_panel(hints: List["Hint"], bottom_hints: List["Hint"]) -> Panel:
     hints_layout = Layout(name="hints")
     separator = Rule(style=const.darker_style)
     hints_list = []
@@ -96,24 +101,15 @@ def hints_layout(hints: List[Hint], bottom_hints: List[Hint]) -> Layout:
         bottom_hints_list.extend([separator, text])
     bottom = Layout(Align(Group(*bottom_hints_list, fit=False), vertical="bottom"))
     hints_layout.split_column(top, bottom)
-    return Layout(Panel(hints_layout, box=const.box_left_rounded, style=const.darker_style), size=30)
+    return Panel(hints_layout, box=const.box_left_rounded, style=const.darker_style)
 
 
 def get_config_info(config: Config) -> Group:
     return Group(text_tuple("Account", config.account))
 
 
-def get_schema_output(table: bigquery.Table) -> Group:
-    schema = table.schema
-    tree = Tree(Text(table.full_table_id, const.key_style))
-    table = Table(box=SIMPLE, show_header=False)
-    table_utils.scheme_tree(schema, tree)
-    table_utils.scheme_table(schema, table)
-    return Group(Rule("Schema", style=const.darker_style), Columns([tree, table]))
-
-
 # fmt: off
-def get_table_output(table: bigquery.Table) -> Group:
+def get_table_output(table: "bigquery.Table") -> Group:
     total_logical_bytes = bytes_fmt(int(table._properties.get("numTotalLogicalBytes", 0)))
     active_logical_bytes = bytes_fmt(int(table._properties.get("numActiveLogicalBytes", 0)))
     long_term_logical_bytes = bytes_fmt(int(table._properties.get("numLongTermLogicalBytes", 0)))
@@ -214,7 +210,88 @@ def get_members_output(members: List[str]) -> Text:
     return text
 
 
-def get_missing_assets_permission_output(config: Config, table: bigquery.Table) -> Text:
+def get_columns_output(columns: List[tuple]) -> Text:
+    text = Text()
+    for project_id, dataset_id, table_id, path, type, mode in columns:
+        text.append(f"{project_id}:{dataset_id}.{table_id}", style=const.key_style)
+        text.append(f" {path} ").append(f"{type} {mode}\n", style=const.darker_style)
+    return text
+
+
+def get_storage_report_output(tables: list, sort_by: str) -> Table:
+    names = [f"{row['project_id']}:{row['dataset_id']}.{row['table_id']}" for row in tables]
+    return _storage_table(f"{len(tables)} largest tables by {sort_by}", names, tables, sort_by)
+
+
+def get_dataset_summary_output(summary: dict, first: int, count: int) -> Group:
+    """
+    Totals of the dataset and one page of its largest tables
+    """
+    totals = Table(
+        title=f"{summary['count']} tables in {summary['location']}", title_style=const.info_style, box=SIMPLE
+    )
+    totals.add_column("", style=const.key_style)
+    totals.add_column("Total", justify="right")
+    for metric, (column, _) in const.STORAGE_METRICS.items():
+        totals.add_row(metric, _metric_fmt(metric, summary["totals"].get(column)))
+    tables = summary["tables"][first : first + count]
+    names = [row["table_id"] for row in tables]
+    title = f"Largest tables by {summary['sort_by']}, {first + 1}-{first + len(tables)}" if tables else "No tables"
+    return Group(totals, _storage_table(title, names, tables, summary["sort_by"]))
+
+
+def _storage_table(title: str, names: List[str], rows: list, sort_by: Optional[str] = None) -> Table:
+    metrics = ["rows", "logical", "long-term-logical", "physical", "long-term-physical"]  # shown by default
+    if sort_by and sort_by not in metrics:
+        metrics.append(sort_by)
+    table = Table(title=title, title_style=const.info_style, border_style=const.darker_style, box=SIMPLE)
+    table.add_column("Table", style=const.key_style)
+    for metric in metrics:
+        table.add_column(metric, justify="right", style=const.request_style if metric == sort_by else None)
+    for name, row in zip(names, rows):
+        table.add_row(name, *[_metric_fmt(metric, row[const.STORAGE_METRICS[metric][0]]) for metric in metrics])
+    return table
+
+
+def get_percentiles_output(stats: dict, metric: str) -> Table:
+    table = Table(title=f"{metric} of {stats['count']} tables", title_style=const.info_style, box=SIMPLE)
+    table.add_column("", style=const.key_style)
+    table.add_column("", justify="right")
+    for name, value in stats.items():
+        if name != "count":
+            table.add_row(name, _metric_fmt(metric, value))
+    return table
+
+
+def _metric_fmt(metric: str, value: Optional[int]) -> str:
+    return num_fmt(value) if metric == "rows" else bytes_fmt(value)
+
+
+def get_loading_output(name: str) -> Spinner:
+    return Spinner("dots", text=Text(f"Fetching {name}", style=const.darker_style), style=const.info_style)
+
+
+def get_error_message(error: Exception) -> str:
+    """
+    Api errors are reduced to the message of the server, without the request url and job details
+    """
+    errors = getattr(error, "errors", None)
+    if errors and isinstance(errors[0], dict) and errors[0].get("message"):
+        return errors[0]["message"]
+    return str(error)
+
+
+def get_error_output(title: str, error: Exception) -> Panel:
+    return Panel(
+        title=title,
+        padding=(0, 3),
+        renderable=Text(get_error_message(error)),
+        expand=False,
+        border_style=const.error_style,
+    )
+
+
+def get_missing_assets_permission_output(config: Config, table: "bigquery.Table") -> Text:
     message = """
 User does not have permission to use Asset Inventory API 
 https://cloud.google.com/asset-inventory/docs/access-control#required_permissions
@@ -0,0 +1,60 @@
+import json
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Iterable, Set, TextIO
+
+from google.api_core.exceptions import NotFound
+from loguru import logger
+
+from bq_meta.config import Config
+from bq_meta.service.table_service import TableService
+
+
+class BatchService:
+    def __init__(self, config: Config, table_service: TableService) -> None:
+        self.config = config
+        self.table_service = table_service
+
+    def fetch_tables(self, lines: Iterable[str], workers: int, out: TextIO):
+        """
+        Fetch tables concurrently, writing one json line per table as soon as it is fetched (in completion order).
+        Only a bounded number of tables is in flight, so memory stays flat regardless of the input size.
+        """
+        logger.trace("Method call")
+        num_tables = 0
+        num_errors = 0
+        in_flight: Set[Future] = set()
+
+        def flush(futures: Set[Future]):
+            nonlocal num_tables, num_errors
+            for future in futures:
+                record = future.result()
+                num_tables += 1
+                num_errors += 1 if "error" in record else 0
+                out.write(json.dumps(record) + "\n")
+            out.flush()
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch") as executor:
+            for line in lines:
+                table_str = line.strip()
+                if not table_str or table_str.startswith("#"):
+                    continue
+                if len(in_flight) >= workers * 2:
+                    completed, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    flush(completed)
+                in_flight.add(executor.submit(self._fetch_table, table_str))
+            while in_flight:
+                completed, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                flush(completed)
+        logger.debug(f"Fetched {num_tables} tables in batch, {num_errors} errors")
+
+    def _fetch_table(self, table_id: str) -> dict:
+        table_str = table_id.replace(":", ".")
+        try:
+            table = self.table_service.load_table(table_str)
+            return {"id": table_id, "table": table._properties}
+        except NotFound as e:
+            self.table_service.remove_cached_table(table_str)
+            return {"id": table_id, "error": e.message, "code": e.code}
+        except Exception as e:
+            logger.warning(f"Table {table_id} not fetched: {e}")
+            return {"id": table_id, "error": str(e)}
@@ -0,0 +1,136 @@
+import json
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from threading import Lock
+from typing import Optional, Set
+
+from loguru import logger
+
+from bq_meta import const
+from bq_meta.config import Config
+from bq_meta.util.file_utils import atomic_write
+
+
+@dataclass
+class CacheEntry:
+    fetched: float  # epoch seconds of the last successful fetch or revalidation
+    properties: dict
+
+    @property
+    def etag(self) -> Optional[str]:
+        return self.properties.get("etag")
+
+
+class CacheService:
+    """
+    Persistent table metadata cache, one json file per table under BQ_META_HOME/cache/tables
+    """
+
+    def __init__(self, config: Config) -> None:
+        self.config = config
+        self.tables_path = f"{const.BQ_META_CACHE}/tables"
+        self.lock = Lock()
+        self._size: Optional[int] = None
+
+    def get(self, table_str: str) -> Optional[CacheEntry]:
+        logger.trace("Method call")
+        path = self._path(table_str)
+        entry = None
+        try:
+            with open(path, "r") as f:
+                record = json.load(f)
+            entry = CacheEntry(record["fetched"], record["properties"])
+            os.utime(path)  # modification time tracks last access, used for eviction
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Corrupted cache entry {path}: {e}")
+            self.remove(table_str)
+        return entry
+
+    def peek(self, table_str: str) -> Optional[CacheEntry]:
+        """
+        Same as get, but the entry is not marked as recently used (for aggregations over many tables)
+        """
+        try:
+            with open(self._path(table_str), "r") as f:
+                record = json.load(f)
+            return CacheEntry(record["fetched"], record["properties"])
+        except Exception:
+            return None
+
+    def cached_table_strs(self) -> Set[str]:
+        return {entry.name.removesuffix(".json") for entry in self._scan()}
+
+    def put(self, table_str: str, properties: dict):
+        logger.trace("Method call")
+        Path(self.tables_path).mkdir(parents=True, exist_ok=True)
+        path = self._path(table_str)
+        content = json.dumps({"fetched": time.time(), "properties": properties})
+        with self.lock:
+            previous = self._file_size(path)
+            atomic_write(path, content)
+            if self._size is not None:
+                self._size += len(content) - previous
+        logger.debug(f"Cached table: {table_str}")
+        self._evict()
+
+    def touch(self, table_str: str):
+        """
+        Mark cached entry as revalidated, without rewriting its properties
+        """
+        logger.trace("Method call")
+        entry = self.get(table_str)
+        if entry:
+            self.put(table_str, entry.properties)
+
+    def remove(self, table_str: str):
+        logger.trace("Method call")
+        path = self._path(table_str)
+        with self.lock:
+            size = self._file_size(path)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            if self._size is not None:
+                self._size -= size
+        logger.debug(f"Removed cached table: {table_str}")
+
+    def is_expired(self, entry: CacheEntry) -> bool:
+        return time.time() - entry.fetched > self.config.cache_ttl
+
+    def _evict(self):
+        """
+        Remove least recently used tables, until the cache fits into configured size
+        """
+        with self.lock:
+            if self._size is None:
+                self._size = sum(entry.stat().st_size for entry in self._scan())
+            if self._size <= self.config.cache_size:
+                return
+            entries = sorted(self._scan(), key=lambda entry: entry.stat().st_mtime)
+            target = int(self.config.cache_size * 0.9)  # leave some headroom, evicting on every put is expensive
+            for entry in entries:
+                if self._size <= target:
+                    break
+                self._size -= entry.stat().st_size
+                os.remove(entry.path)
+                logger.debug(f"Evicted cached table: {entry.name}")
+
+    def _scan(self) -> list:
+        try:
+            return [entry for entry in os.scandir(self.tables_path) if entry.name.endswith(".json")]
+        except FileNotFoundError:
+            return []
+
+    def _file_size(self, path: str) -> int:
+        try:
+            return os.path.getsize(path)
+        except FileNotFoundError:
+            return 0
+
+    def _path(self, table_str: str) -> str:
+        return f"{self.tables_path}/{table_str.replace(':', '.')}.json"
@@ -0,0 +1,409 @@
+import sqlite3
+import time
+from threading import RLock
+from typing import Iterable, List, Optional, Tuple
+
+from loguru import logger
+
+from bq_meta import const
+from bq_meta.config import Config
+from bq_meta.util import stats_utils, table_utils
+
+PROJECT_LISTING = ""  # dataset_id of the listing, which holds datasets of the project
+
+migrations = [
+    """
+    CREATE TABLE datasets (
+        project_id TEXT NOT NULL,
+        dataset_id TEXT NOT NULL,
+        tables_count INTEGER,
+        tables_created INTEGER,
+        PRIMARY KEY (project_id, dataset_id)
+    ) WITHOUT ROWID;
+    CREATE TABLE tables (
+        project_id TEXT NOT NULL,
+        dataset_id TEXT NOT NULL,
+        table_id TEXT NOT NULL,
+        PRIMARY KEY (project_id, dataset_id, table_id)
+    ) WITHOUT ROWID;
+    CREATE TABLE listings (
+        project_id TEXT NOT NULL,
+        dataset_id TEXT NOT NULL,
+        fetched REAL NOT NULL,
+        PRIMARY KEY (project_id, dataset_id)
+    ) WITHOUT ROWID;
+    CREATE TABLE columns (
+        column_name TEXT NOT NULL COLLATE NOCASE,
+        project_id TEXT NOT NULL,
+        dataset_id TEXT NOT NULL,
+        table_id TEXT NOT NULL,
+        path TEXT NOT NULL,
+        type TEXT,
+        mode TEXT,
+        PRIMARY KEY (column_name, project_id, dataset_id, table_id, path)
+    ) WITHOUT ROWID;
+    CREATE INDEX columns_table ON columns (project_id, dataset_id, table_id);
+    CREATE TABLE indexed_tables (
+        project_id TEXT NOT NULL,
+        dataset_id TEXT NOT NULL,
+        table_id TEXT NOT NULL,
+        etag TEXT,
+        PRIMARY KEY (project_id, dataset_id, table_id)
+    ) WITHOUT ROWID;
+    CREATE TABLE state (
+        key TEXT NOT NULL PRIMARY KEY,
+        value TEXT
+    ) WITHOUT ROWID;
+    CREATE TABLE table_stats (
+        project_id TEXT NOT NULL,
+        dataset_id TEXT NOT NULL,
+        table_id TEXT NOT NULL,
+        type TEXT,
+        description TEXT,
+        modified INTEGER,
+        num_rows INTEGER NOT NULL,
+        num_partitions INTEGER,
+        total_logical_bytes INTEGER NOT NULL,
+        active_logical_bytes INTEGER NOT NULL,
+        long_term_logical_bytes INTEGER NOT NULL,
+        total_physical_bytes INTEGER NOT NULL,
+        active_physical_bytes INTEGER NOT NULL,
+        long_term_physical_bytes INTEGER NOT NULL,
+        time_travel_physical_bytes INTEGER NOT NULL,
+        PRIMARY KEY (project_id, dataset_id, table_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX table_stats_rows ON table_stats (num_rows);
+    CREATE INDEX table_stats_logical ON table_stats (total_logical_bytes);
+    CREATE INDEX table_stats_active_logical ON table_stats (active_logical_bytes);
+    CREATE INDEX table_stats_long_term_logical ON table_stats (long_term_logical_bytes);
+    CREATE INDEX table_stats_physical ON table_stats (total_physical_bytes);
+    CREATE INDEX table_stats_active_physical ON table_stats (active_physical_bytes);
+    CREATE INDEX table_stats_long_term_physical ON table_stats (long_term_physical_bytes);
+    CREATE INDEX table_stats_time_travel_physical ON table_stats (time_travel_physical_bytes);
+    CREATE TABLE labels (
+        key TEXT NOT NULL,
+        value TEXT NOT NULL,
+        project_id TEXT NOT NULL,
+        dataset_id TEXT NOT NULL,
+        table_id TEXT NOT NULL,
+        PRIMARY KEY (key, value, project_id, dataset_id, table_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX labels_table ON labels (project_id, dataset_id, table_id);
+    """,
+]
+
+METADATA_BACKFILLED = "metadata_backfilled"  # state key, set once metadata of all cached tables is indexed
+TABLE_METADATA = ("columns", "table_stats", "labels", "indexed_tables")  # tables indexing metadata of bq tables
+
+
+class CatalogService:
+    """
+    Local index of project -> dataset -> table hierarchy, stored in BQ_META_HOME/catalog.db
+    """
+
+    def __init__(self, config: Config) -> None:
+        self.config = config
+        self.catalog_path = const.BQ_META_CATALOG
+        self.lock = RLock()
+        self._connection: Optional[sqlite3.Connection] = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        with self.lock:
+            if not self._connection:
+                self._connection = sqlite3.connect(self.catalog_path, check_same_thread=False)
+                self._connection.execute("PRAGMA journal_mode=WAL")
+                self._connection.execute("PRAGMA synchronous=NORMAL")  # in WAL mode commits don't wait for fsync
+                self._migrate(self._connection)
+            return self._connection
+
+    def list_datasets(self, project_id: str, fresh: bool = True) -> Optional[List[str]]:
+        """
+        Cached dataset ids of the project, None if listing is missing or stale (unless fresh is False)
+        """
+        logger.trace("Method call")
+        if fresh and not self.is_fresh(project_id, PROJECT_LISTING):
+            return None
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT dataset_id FROM datasets WHERE project_id = ? ORDER BY dataset_id",
+                (project_id,),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def save_datasets(self, project_id: str, dataset_ids: List[str]):
+        logger.trace("Method call")
+        with self.lock, self.connection as connection:
+            rows = connection.execute("SELECT dataset_id FROM datasets WHERE project_id = ?", (project_id,))
+            existing = {row[0] for row in rows}
+            removed = existing.difference(dataset_ids)
+            connection.executemany(
+                "DELETE FROM datasets WHERE project_id = ? AND dataset_id = ?",
+                ((project_id, dataset_id) for dataset_id in removed),
+            )
+            connection.executemany(
+                "DELETE FROM tables WHERE project_id = ? AND dataset_id = ?",
+                ((project_id, dataset_id) for dataset_id in removed),
+            )
+            connection.executemany(
+                "INSERT OR IGNORE INTO datasets (project_id, dataset_id) VALUES (?, ?)",
+                ((project_id, dataset_id) for dataset_id in dataset_ids),
+            )
+            self._save_listing(connection, project_id, PROJECT_LISTING)
+        logger.debug(f"Saved {len(dataset_ids)} datasets of {project_id}")
+
+    def list_tables(self, project_id: str, dataset_id: str) -> Optional[List[str]]:
+        """
+        Cached table ids of the dataset, None if listing is missing or stale
+        """
+        logger.trace("Method call")
+        if not self.is_fresh(project_id, dataset_id):
+            return None
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT table_id FROM tables WHERE project_id = ? AND dataset_id = ? ORDER BY table_id",
+                (project_id, dataset_id),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def save_tables(self, project_id: str, dataset_id: str, table_ids: List[str]):
+        logger.trace("Method call")
+        with self.lock, self.connection as connection:
+            connection.execute(
+                "DELETE FROM tables WHERE project_id = ? AND dataset_id = ?",
+                (project_id, dataset_id),
+            )
+            connection.executemany(
+                "INSERT OR IGNORE INTO tables (project_id, dataset_id, table_id) VALUES (?, ?, ?)",
+                ((project_id, dataset_id, table_id) for table_id in table_ids),
+            )
+            self._save_listing(connection, project_id, dataset_id)
+            for index_table in TABLE_METADATA:  # tables removed since the last listing
+                connection.execute(
+                    f"""
+                    DELETE FROM {index_table} WHERE project_id = ? AND dataset_id = ? AND table_id NOT IN (
+                        SELECT table_id FROM tables WHERE project_id = ? AND dataset_id = ?
+                    )""",
+                    (project_id, dataset_id, project_id, dataset_id),
+                )
+        logger.debug(f"Saved {len(table_ids)} tables of {project_id}.{dataset_id}")
+
+    def get_dataset_state(self, project_id: str, dataset_id: str) -> Tuple[Optional[int], Optional[int]]:
+        """
+        Number of tables and the latest table creation time (epoch millis) of the dataset, as seen during the last
+        table listing. Both are None when unknown.
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT tables_count, tables_created FROM datasets WHERE project_id = ? AND dataset_id = ?",
+                (project_id, dataset_id),
+            ).fetchone()
+        return (row[0], row[1]) if row else (None, None)
+
+    def save_dataset_state(self, project_id: str, dataset_id: str, tables_count: int, tables_created: Optional[int]):
+        with self.lock, self.connection as connection:
+            connection.execute(
+                "UPDATE datasets SET tables_count = ?, tables_created = ? WHERE project_id = ? AND dataset_id = ?",
+                (tables_count, tables_created, project_id, dataset_id),
+            )
+
+    def touch_listing(self, project_id: str, dataset_id: str):
+        """
+        Mark listing as fresh, when it is known to be unchanged
+        """
+        with self.lock, self.connection as connection:
+            self._save_listing(connection, project_id, dataset_id)
+
+    def count_tables(self, project_id: str, dataset_id: str) -> int:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT COUNT(*) FROM tables WHERE project_id = ? AND dataset_id = ?",
+                (project_id, dataset_id),
+            ).fetchone()
+        return row[0]
+
+    def is_listed(self, project_id: str, dataset_id: str) -> bool:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT 1 FROM listings WHERE project_id = ? AND dataset_id = ?",
+                (project_id, dataset_id),
+            ).fetchone()
+        return bool(row)
+
+    def is_fresh(self, project_id: str, dataset_id: str) -> bool:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT fetched FROM listings WHERE project_id = ? AND dataset_id = ?",
+                (project_id, dataset_id),
+            ).fetchone()
+        return bool(row) and time.time() - row[0] <= self.config.catalog_ttl
+
+    def save_table_metadata(self, tables: Iterable[dict]):
+        """
+        Index columns, storage stats and labels of the tables (api representation) in a single transaction, tables
+        indexed with the same etag are skipped
+        """
+        with self.lock, self.connection as connection:
+            for properties in tables:
+                table_ref = properties.get("tableReference")
+                if not table_ref:
+                    continue
+                table_key = (table_ref["projectId"], table_ref["datasetId"], table_ref["tableId"])
+                etag = properties.get("etag")
+                row = connection.execute(
+                    "SELECT etag FROM indexed_tables WHERE project_id = ? AND dataset_id = ? AND table_id = ?",
+                    table_key,
+                ).fetchone()
+                if row and etag and row[0] == etag:
+                    continue
+                self._delete_table_metadata(connection, table_key)
+                columns = table_utils.column_paths(properties.get("schema", {}).get("fields", []))
+                connection.executemany(
+                    "INSERT OR IGNORE INTO columns VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    ((path.rsplit(".", 1)[-1], *table_key, path, type, mode) for path, type, mode in columns),
+                )
+                connection.execute(
+                    f"INSERT INTO table_stats VALUES ({', '.join('?' * 15)})",
+                    (
+                        *table_key,
+                        properties.get("type"),
+                        properties.get("description"),
+                        _int(properties.get("lastModifiedTime")),
+                        _int(properties.get("numRows")) or 0,
+                        _int(properties.get("numPartitions")),
+                        *(_int(properties.get(prop)) or 0 for _, prop in list(const.STORAGE_METRICS.values())[1:]),
+                    ),
+                )
+                connection.executemany(
+                    "INSERT OR IGNORE INTO labels VALUES (?, ?, ?, ?, ?)",
+                    ((key, value, *table_key) for key, value in properties.get("labels", {}).items()),
+                )
+                connection.execute("INSERT OR REPLACE INTO indexed_tables VALUES (?, ?, ?, ?)", (*table_key, etag))
+
+    def remove_table_metadata(self, project_id: str, dataset_id: str, table_id: str):
+        with self.lock, self.connection as connection:
+            self._delete_table_metadata(connection, (project_id, dataset_id, table_id))
+
+    def find_columns(self, column: str, limit: Optional[int] = None) -> List[Tuple[str, str, str, str, str, str]]:
+        """
+        Indexed columns (project_id, dataset_id, table_id, path, type, mode) by name, case insensitive. Nested
+        columns match by their name or by full path (record.column), trailing '*' matches name prefix.
+        """
+        logger.trace("Method call")
+        name = column.rsplit(".", 1)[-1]
+        query = "SELECT project_id, dataset_id, table_id, path, type, mode FROM columns"
+        if name.endswith("*"):
+            query += " WHERE column_name >= ? AND column_name < ?"  # range instead of LIKE, to use the index
+            params: list = [name[:-1], f"{name[:-1]}\U0010ffff"]
+        else:
+            query += " WHERE column_name = ?"
+            params = [name]
+        if "." in column:
+            query += " AND path LIKE ? ESCAPE '\\'"
+            params.append(_like_escape(column).replace("*", "%"))
+        query += " ORDER BY project_id, dataset_id, table_id, path"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self.lock:
+            return self.connection.execute(query, params).fetchall()
+
+    def list_table_stats(
+        self, labels: List[Tuple[str, Optional[str]]], description: Optional[str], sort_by: str, limit: Optional[int]
+    ) -> List[sqlite3.Row]:
+        """
+        Storage stats of tables with all the labels (key, or key and value) and description, largest first
+        """
+        logger.trace("Method call")
+        where, params = self._stats_filter(labels, description)
+        column = const.STORAGE_METRICS[sort_by][0]
+        query = f"SELECT * FROM table_stats{where} ORDER BY {column} DESC"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self.lock:
+            cursor = self.connection.cursor()
+            cursor.row_factory = sqlite3.Row
+            return cursor.execute(query, params).fetchall()
+
+    def get_stats_percentiles(
+        self,
+        labels: List[Tuple[str, Optional[str]]],
+        description: Optional[str],
+        metric: str,
+        percentiles: Iterable[int],
+    ) -> dict:
+        """
+        Count, sum, min, max and nearest-rank percentiles of the metric, over tables matching the filter. Percentiles
+        are read from the metric index (one ordered lookup each), tables are never loaded into memory.
+        """
+        logger.trace("Method call")
+        where, params = self._stats_filter(labels, description)
+        column = const.STORAGE_METRICS[metric][0]
+        with self.lock:
+            count, total, minimum, maximum = self.connection.execute(
+                f"SELECT COUNT(*), SUM({column}), MIN({column}), MAX({column}) FROM table_stats{where}", params
+            ).fetchone()
+            stats = {"count": count, "sum": total or 0, "min": minimum}
+            for percentile in percentiles:
+                offset = stats_utils.percentile_rank(count, percentile)
+                row = self.connection.execute(
+                    f"SELECT {column} FROM table_stats{where} ORDER BY {column} LIMIT 1 OFFSET ?", [*params, offset]
+                ).fetchone()
+                stats[f"p{percentile}"] = row[0] if row else None
+            stats["max"] = maximum
+        return stats
+
+    def _stats_filter(self, labels: List[Tuple[str, Optional[str]]], description: Optional[str]) -> Tuple[str, list]:
+        conditions, params = [], []
+        for key, value in labels:
+            label_condition = "key = ?" if value is None else "key = ? AND value = ?"
+            conditions.append(
+                "(project_id, dataset_id, table_id) IN "
+                f"(SELECT project_id, dataset_id, table_id FROM labels WHERE {label_condition})"
+            )
+            params.extend([key] if value is None else [key, value])
+        if description:
+            conditions.append("description LIKE ? ESCAPE '\\'")
+            params.append(f"%{_like_escape(description)}%")
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        return where, params
+
+    def get_state(self, key: str) -> Optional[str]:
+        with self.lock:
+            row = self.connection.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def save_state(self, key: str, value: str):
+        with self.lock, self.connection as connection:
+            connection.execute("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, value))
+
+    def _delete_table_metadata(self, connection: sqlite3.Connection, table_key: Tuple[str, str, str]):
+        for index_table in TABLE_METADATA:
+            connection.execute(
+                f"DELETE FROM {index_table} WHERE project_id = ? AND dataset_id = ? AND table_id = ?", table_key
+            )
+
+    def _save_listing(self, connection: sqlite3.Connection, project_id: str, dataset_id: str):
+        connection.execute(
+            "INSERT OR REPLACE INTO listings (project_id, dataset_id, fetched) VALUES (?, ?, ?)",
+            (project_id, dataset_id, time.time()),
+        )
+
+    def _migrate(self, connection: sqlite3.Connection):
+        version = connection.execute("PRAGMA user_version").fetchone()[0]
+        for idx, migration in enumerate(migrations[version:], start=version + 1):
+            connection.executescript(migration)
+            connection.execute(f"PRAGMA user_version = {idx}")
+            logger.debug(f"Migrated catalog to version {idx}")
+
+
+def _like_escape(text: str) -> str:
+    """
+    Wildcards of LIKE matched literally, used with ESCAPE '\\'
+    """
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _int(value) -> Optional[int]:
+    return int(value) if value is not None else None
@@ -0,0 +1,292 @@
+import math
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from google.api_core.exceptions import Forbidden, NotFound
+from loguru import logger
+from rich.console import Console
+from rich.text import Text
+
+from bq_meta import const
+from bq_meta.client import Client
+from bq_meta.config import Config
+from bq_meta.service.catalog_service import PROJECT_LISTING, CatalogService
+from bq_meta.service.project_service import ProjectService
+from bq_meta.util import stats_utils
+from bq_meta.util.rich_utils import bar_progress
+
+CHECKPOINT_SEPARATOR = "\t"
+PAGE_SIZE = 1000
+
+
+class CrawlService:
+    """
+    Crawl datasets and tables of every project into the catalog, resumable from BQ_META_HOME/crawl_checkpoint
+    """
+
+    def __init__(
+        self,
+        console: Console,
+        config: Config,
+        client: Client,
+        project_service: ProjectService,
+        catalog_service: CatalogService,
+    ) -> None:
+        self.console = console
+        self.config = config
+        self.client = client
+        self.project_service = project_service
+        self.catalog_service = catalog_service
+        self.checkpoint_path = const.BQ_META_CRAWL_CHECKPOINT
+
+    def crawl(self, restart: bool = False):
+        """
+        Listings done are appended to the checkpoint, which is removed once the crawl completes. Listings failing with
+        NotFound or Forbidden are not retried by the resumed crawl, restart ignores the checkpoint.
+        """
+        logger.trace("Method call")
+        project_ids = self.project_service.list_projects()
+        if restart and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+        done = self._load_checkpoint()
+        if done:
+            self.console.print(Text("Resuming crawl", style=const.info_style).append(f": {len(done)} listings done"))
+        pending: Dict[str, Deque[str]] = {project_id: deque() for project_id in project_ids}
+        running: Dict[str, int] = {project_id: 0 for project_id in project_ids}
+        futures: Dict[Future, Tuple[str, str]] = {}
+        failed = 0
+        skipped = 0
+        num_tables = 0
+
+        for project_id in project_ids:
+            if (project_id, PROJECT_LISTING) in done:
+                dataset_ids = self.catalog_service.list_datasets(project_id, fresh=False) or []
+                pending[project_id].extend(d for d in dataset_ids if (project_id, d) not in done)
+            else:
+                pending[project_id].append(PROJECT_LISTING)
+
+        with ThreadPoolExecutor(
+            max_workers=self.config.crawl_workers, thread_name_prefix="crawl"
+        ) as executor, bar_progress(self.console) as progress, open(self.checkpoint_path, "a") as checkpoint:
+            projects_task = progress.add_task("Crawling projects", total=len(project_ids))
+            datasets_task = progress.add_task("Crawling datasets", total=sum(len(q) for q in pending.values()))
+            progress.update(projects_task, completed=sum(1 for p in project_ids if (p, PROJECT_LISTING) in done))
+
+            def schedule():
+                # round-robin over projects, so a single huge project can't take all workers
+                scheduled = True
+                while scheduled and len(futures) < self.config.crawl_workers:
+                    scheduled = False
+                    for project_id, queue in pending.items():
+                        if len(futures) >= self.config.crawl_workers:
+                            break
+                        if queue and running[project_id] < self.config.crawl_project_workers:
+                            dataset_id = queue.popleft()
+                            if dataset_id == PROJECT_LISTING:
+                                future = executor.submit(self._list_dataset_ids, project_id)
+                            else:
+                                future = executor.submit(self._list_tables, project_id, dataset_id)
+                            futures[future] = (project_id, dataset_id)
+                            running[project_id] += 1
+                            scheduled = True
+
+            schedule()
+            while futures:
+                completed, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in completed:
+                    project_id, dataset_id = futures.pop(future)
+                    running[project_id] -= 1
+                    skip = False
+                    try:
+                        result = future.result()
+                    except (NotFound, Forbidden) as e:  # retrying won't help, listing is done
+                        logger.warning(f"Crawl of {project_id}.{dataset_id} skipped: {e}")
+                        skipped += 1
+                        skip = True
+                        result = None
+                    except Exception as e:
+                        logger.warning(f"Crawl of {project_id}.{dataset_id} failed: {e}")
+                        failed += 1
+                        result = None
+                    if dataset_id == PROJECT_LISTING:
+                        progress.advance(projects_task)
+                        if result is not None:
+                            self.catalog_service.save_datasets(project_id, result)
+                            pending[project_id].extend(result)
+                            progress.update(datasets_task, total=progress.tasks[datasets_task].total + len(result))
+                    else:
+                        progress.advance(datasets_task)
+                        if result is not None:
+                            table_ids, created = result
+                            self.catalog_service.save_tables(project_id, dataset_id, table_ids)
+                            self.catalog_service.save_dataset_state(project_id, dataset_id, len(table_ids), created)
+                            num_tables += len(table_ids)
+                    if result is not None or skip:
+                        checkpoint.write(f"{project_id}{CHECKPOINT_SEPARATOR}{dataset_id}\n")
+                        checkpoint.flush()
+                schedule()
+
+        if failed:
+            self.console.print(
+                Text("Crawl incomplete", style=const.error_style).append(
+                    f": {failed} listings failed, {skipped} skipped (not found or forbidden), run again to resume"
+                    " or add --restart to start over",
+                    style=const.darker_style,
+                )
+            )
+        else:
+            os.remove(self.checkpoint_path)
+            self.console.print(
+                Text("Crawl finished", style=const.info_style).append(
+                    f": {num_tables} tables in {len(project_ids)} projects, {skipped} listings skipped"
+                    " (not found or forbidden)",
+                    style=const.darker_style,
+                )
+            )
+        logger.debug(f"Crawled {num_tables} tables, {failed} listings failed, {skipped} skipped")
+
+    def sync(self):
+        """
+        Update catalog of already crawled projects. Number of tables and the latest table creation time of every
+        dataset are queried from INFORMATION_SCHEMA.TABLES (one query per project and location), tables are listed
+        only in datasets where they differ from the last listing (a table was created or dropped).
+        """
+        logger.trace("Method call")
+        project_ids = self.project_service.list_projects()
+        locations: Dict[Tuple[str, str], Optional[str]] = {}  # (project, dataset) -> location
+        states: Dict[Tuple[str, str], Tuple[int, Optional[int]]] = {}  # (project, dataset) -> current state
+        queried: Set[Tuple[str, str]] = set()  # (project, location) of successful queries
+        changed: List[Tuple[str, str]] = []
+        calls = 0  # listing calls made by the sync
+        full_calls = 0  # listing calls a full crawl would make
+        queries = 0
+        failed = 0
+        num_unchanged = 0
+
+        with ThreadPoolExecutor(
+            max_workers=self.config.crawl_workers, thread_name_prefix="sync"
+        ) as executor, bar_progress(self.console) as progress:
+            task = progress.add_task("Syncing projects", total=len(project_ids))
+            futures = {executor.submit(self._list_datasets, p): p for p in project_ids}
+            for future in as_completed(futures):
+                project_id = futures[future]
+                progress.advance(task)
+                try:
+                    dataset_locations = future.result()
+                except Exception as e:
+                    logger.warning(f"Sync of {project_id} failed: {e}")
+                    failed += 1
+                    continue
+                calls += self._pages(len(dataset_locations))
+                full_calls += self._pages(len(dataset_locations))
+                self.catalog_service.save_datasets(project_id, list(dataset_locations))
+                locations.update(((project_id, dataset_id), loc) for dataset_id, loc in dataset_locations.items())
+
+            scopes = sorted({(project_id, loc) for (project_id, _), loc in locations.items() if loc})
+            task = progress.add_task("Checking datasets", total=len(scopes))
+            futures = {executor.submit(self._query_table_states, p, loc): (p, loc) for p, loc in scopes}
+            for future in as_completed(futures):
+                project_id, location = futures[future]
+                progress.advance(task)
+                queries += 1
+                try:
+                    dataset_states = future.result()
+                except Exception as e:  # datasets of the location are listed instead
+                    logger.warning(f"Tables of {project_id} in {location} not checked: {e}")
+                    continue
+                queried.add((project_id, location))
+                states.update(((project_id, dataset_id), state) for dataset_id, state in dataset_states.items())
+
+            for (project_id, dataset_id), location in locations.items():
+                state = states.get((project_id, dataset_id), (0, None))  # datasets without tables are not returned
+                if (
+                    (project_id, location) in queried
+                    and self.catalog_service.is_listed(project_id, dataset_id)
+                    and self.catalog_service.get_dataset_state(project_id, dataset_id) == state
+                ):
+                    full_calls += self._pages(state[0])
+                    self.catalog_service.touch_listing(project_id, dataset_id)
+                    num_unchanged += 1
+                else:
+                    changed.append((project_id, dataset_id))
+
+            task = progress.add_task("Listing changed datasets", total=len(changed))
+            futures = {executor.submit(self._list_tables, p, d): (p, d) for p, d in changed}
+            for future in as_completed(futures):
+                project_id, dataset_id = futures[future]
+                progress.advance(task)
+                try:
+                    table_ids, created = future.result()
+                except Exception as e:
+                    logger.warning(f"Sync of {project_id}.{dataset_id} failed: {e}")
+                    failed += 1
+                    continue
+                calls += self._pages(len(table_ids))
+                full_calls += self._pages(len(table_ids))
+                self.catalog_service.save_tables(project_id, dataset_id, table_ids)
+                self.catalog_service.save_dataset_state(project_id, dataset_id, len(table_ids), created)
+
+        self.console.print(
+            Text("Sync finished", style=const.info_style if not failed else const.error_style).append(
+                f": {len(changed)} datasets changed, {num_unchanged} unchanged, {failed} failed"
+                f" • {calls} listing calls and {queries} queries made, a full crawl makes {full_calls} listing calls",
+                style=const.darker_style,
+            )
+        )
+        logger.debug(f"Synced catalog, {calls} listing calls and {queries} queries made, {full_calls} by a full crawl")
+
+    def _list_dataset_ids(self, project_id: str) -> List[str]:
+        return list(self._list_datasets(project_id))
+
+    def _list_datasets(self, project_id: str) -> Dict[str, Optional[str]]:
+        """
+        Location of every dataset of the project, by dataset id
+        """
+        iterator = self.client.bq_client.list_datasets(project=project_id, page_size=PAGE_SIZE)
+        return {
+            dataset.dataset_id: dataset._properties.get("location")
+            for page in stats_utils.pages("list_datasets", iterator)
+            for dataset in page
+        }
+
+    def _list_tables(self, project_id: str, dataset_id: str) -> Tuple[List[str], Optional[int]]:
+        """
+        Table ids of the dataset and the latest creation time (epoch millis) of its tables
+        """
+        iterator = self.client.bq_client.list_tables(f"{project_id}.{dataset_id}", page_size=PAGE_SIZE)
+        tables = [table for page in stats_utils.pages("list_tables", iterator) for table in page]
+        created = [int(table._properties["creationTime"]) for table in tables if table._properties.get("creationTime")]
+        return [table.table_id for table in tables], max(created, default=None)
+
+    def _query_table_states(self, project_id: str, location: str) -> Dict[str, Tuple[int, Optional[int]]]:
+        """
+        Number of tables and the latest table creation time of every dataset of the project in the location. Dataset
+        etag and last modified time change only with dataset metadata, creating or dropping a table changes the count
+        or the creation time.
+        """
+        query = f"""
+SELECT table_schema, COUNT(*) AS tables_count, UNIX_MILLIS(MAX(creation_time)) AS tables_created
+FROM `{project_id}`.`region-{location.lower()}`.INFORMATION_SCHEMA.TABLES
+GROUP BY table_schema"""
+        with stats_utils.span("query"):
+            job = self.client.bq_client.query(query, project=project_id, location=location)
+            rows = job.result(page_size=PAGE_SIZE)
+        return {
+            row["table_schema"]: (row["tables_count"], row["tables_created"])
+            for page in stats_utils.pages("query.results", rows)
+            for row in page
+        }
+
+    def _pages(self, num_items: int) -> int:
+        return max(1, math.ceil(num_items / PAGE_SIZE))
+
+    def _load_checkpoint(self) -> Set[Tuple[str, str]]:
+        done = set()
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, "r") as f:
+                for line in f.read().splitlines():
+                    project_id, _, dataset_id = line.partition(CHECKPOINT_SEPARATOR)
+                    done.add((project_id, dataset_id))
+        return done
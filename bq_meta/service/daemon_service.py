@@ -0,0 +1,102 @@
+import json
+import os
+import signal
+import socketserver
+import threading
+from contextlib import suppress
+
+from google.api_core.exceptions import NotFound
+from loguru import logger
+from rich.console import Console
+from rich.text import Text
+
+from bq_meta import const, output
+from bq_meta.config import Config
+from bq_meta.service.table_service import TableService
+from bq_meta.util import daemon_utils
+
+
+class DaemonService:
+    """
+    Long-lived process keeping clients, connection pools and caches warm, serving other bq-meta calls over a unix
+    socket. Requests and responses are json lines, one connection may send any number of requests.
+    """
+
+    def __init__(self, console: Console, config: Config, table_service: TableService) -> None:
+        self.console = console
+        self.config = config
+        self.table_service = table_service
+
+    def serve(self, path: str = const.BQ_META_DAEMON_SOCKET):
+        logger.trace("Method call")
+        running = daemon_utils.request({"method": "ping"}, path)
+        if running:
+            self.console.print(Text(f"Daemon is already running (pid {running['pid']})", style=const.error_style))
+            return
+        if os.path.exists(path):
+            if not daemon_utils.is_stale(path):
+                self.console.print(
+                    Text(f"Daemon socket {path} is in use, daemon not responding", style=const.error_style)
+                )
+                return
+            with suppress(FileNotFoundError):
+                os.remove(path)  # left over by a killed daemon
+        self.table_service.client.bq_client  # load credentials upfront
+
+        server = _Server(path, _Handler)
+        server.daemon_service = self
+        os.chmod(path, 0o600)
+        # shutdown blocks until serve_forever returns, so it can't be called from the serving thread
+        signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+        self.console.print(Text("Daemon listening on ", style=const.info_style).append(path, style=const.key_style))
+        logger.debug(f"Daemon listening on {path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            with suppress(FileNotFoundError):
+                os.remove(path)
+            logger.debug("Daemon stopped")
+
+    def handle(self, request: dict) -> dict:
+        logger.trace("Method call")
+        match request.get("method"):
+            case "ping":
+                return {"pid": os.getpid()}
+            case "get_table":
+                return self._get_table(request["table"])
+            case method:
+                return {"error": f"Unknown method: {method}"}
+
+    def _get_table(self, table_id: str) -> dict:
+        table_str = table_id.replace(":", ".")
+        try:
+            table = self.table_service.load_table(table_str)
+            return {"table": table._properties}
+        except NotFound as e:
+            self.table_service.remove_cached_table(table_str)
+            return {"error": output.get_error_message(e), "code": e.code}
+        except Exception as e:
+            logger.warning(f"Table {table_id} not fetched: {e}")
+            return {"error": output.get_error_message(e)}
+
+
+class _Server(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    daemon_service: DaemonService
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: _Server
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                response = self.server.daemon_service.handle(json.loads(line))
+            except Exception as e:
+                logger.warning(f"Daemon request failed: {e}")
+                response = {"error": str(e)}
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
@@ -1,14 +1,23 @@
-from typing import List, Optional
+import math
+from collections import OrderedDict, defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import Dict, Iterable, List, Optional, Tuple
 
 from bq_meta import const
 from bq_meta.config import Config
 from bq_meta.service.table_service import TableService
-from bq_meta.util import bash_util
+from bq_meta.util import picker_util
+from bq_meta.util.file_utils import atomic_write, locked
+from bq_meta.util.rich_utils import bar_progress
 from google.cloud.bigquery.table import Table, TableReference
 from rich.console import Console
 from rich.live import Live
+from rich.text import Text
 from loguru import logger
 
+COMPACT_MIN_LINES = 1000  # history log is never compacted below this size
+COMPACT_RATIO = 2  # compact history log, once it has this many lines per unique table
+
 
 class HistoryService:
     def __init__(self, console: Console, config: Config, table_service: TableService) -> None:
@@ -16,50 +25,143 @@ class HistoryService:
         self.config = config
         self.table_service = table_service
         self.history_path = const.BQ_META_HISTORY
+        self._history: Optional[OrderedDict[str, None]] = None  # unique tables, from the least recent
+        self._num_lines = 0
+        self._ends_with_newline = True
+
+    @property
+    def history(self) -> OrderedDict[str, None]:
+        """
+        History file is an append-only log, table is appended every time it's opened. Loaded once, deduplicated.
+        """
+        if self._history is None:
+            self._load()
+        return self._history
+
+    def _load(self):
+        with open(self.history_path, "r") as f:
+            content = f.read()
+        lines = content.splitlines()
+        self._history = OrderedDict()
+        for line in lines:
+            if line:
+                self._history[line] = None
+                self._history.move_to_end(line)
+        self._num_lines = len(lines)
+        self._ends_with_newline = not content or content.endswith("\n")
 
     def list_tables(self) -> List[str]:
         logger.trace("Method call")
-        projects = open(self.history_path, "r").read().splitlines()
-        return projects
+        return list(self.history)
 
     def purge_tables(self):
+        """
+        Check tables concurrently, tables of the same dataset are validated by a single listing when it's cheaper
+        """
         logger.trace("Method call")
         history = self.list_tables()
-        new_history = []
+        removed = set()
+        datasets: Dict[Tuple[str, str], List[Tuple[str, str]]] = defaultdict(list)  # dataset -> (table id, entry)
         for table in history:
-            if self.table_service.get_table_str(table.replace(":", ".")):
-                new_history.append(table)
-        with open(self.history_path, "w") as f:
-            f.write("\n".join(new_history))
+            try:
+                table_ref = TableReference.from_string(table.replace(":", "."))
+            except ValueError:
+                logger.warning(f"Malformed history entry removed: {table}")
+                removed.add(table)
+                continue
+            datasets[(table_ref.project, table_ref.dataset_id)].append((table_ref.table_id, table))
+
+        failed = 0
+        with ThreadPoolExecutor(
+            max_workers=self.config.purge_workers, thread_name_prefix="purge"
+        ) as executor, bar_progress(self.console) as progress:
+            task = progress.add_task("Checking tables", total=len(history) - len(removed))
+            listings: Dict[Future, Tuple[str, str]] = {}  # future of existing table ids -> dataset
+            checks: Dict[Future, str] = {}  # future of table existence -> history entry
+            for (project_id, dataset_id), tables in datasets.items():
+                if self._is_listing_cheaper(project_id, dataset_id, len(tables)):
+                    future = executor.submit(self.table_service.existing_table_ids, project_id, dataset_id)
+                    listings[future] = (project_id, dataset_id)
+                else:
+                    for _, table in tables:
+                        future = executor.submit(self.table_service.table_exists, table.replace(":", "."))
+                        checks[future] = table
+            for future in as_completed([*listings, *checks]):
+                if future in listings:
+                    project_id, dataset_id = listings[future]
+                    tables = datasets[(project_id, dataset_id)]
+                    progress.advance(task, len(tables))
+                    try:
+                        existing = future.result()
+                    except Exception as e:
+                        logger.warning(f"Tables of {project_id}.{dataset_id} not checked: {e}")
+                        failed += len(tables)
+                        continue
+                    removed.update(table for table_id, table in tables if table_id not in existing)
+                else:
+                    table = checks[future]
+                    progress.advance(task)
+                    try:
+                        exists = future.result()
+                    except Exception as e:
+                        logger.warning(f"Table {table} not checked: {e}")
+                        failed += 1
+                        continue
+                    if not exists:
+                        removed.add(table)
+
+        self._compact(removed)
+        self.console.print(
+            Text("Purged history", style=const.info_style).append(
+                f": {len(removed)} removed, {len(self.history)} kept, {failed} not checked", style=const.darker_style
+            )
+        )
         logger.debug("Purged history")
 
+    def _is_listing_cheaper(self, project_id: str, dataset_id: str, num_tables: int) -> bool:
+        num_listed = self.table_service.catalog_service.count_tables(project_id, dataset_id)
+        if self.table_service.catalog_service.is_listed(project_id, dataset_id):
+            return math.ceil(num_listed / 1000) < num_tables
+        return num_tables > 1
+
     def save_table(self, table: Table):
         logger.trace("Method call")
-        history = self.list_tables()
-        try:
-            history.remove(table.full_table_id)
-        except ValueError:
-            pass
-        history.append(table.full_table_id)
-        with open(self.history_path, "w") as f:
-            f.write("\n".join(history))
+        table_id = table.full_table_id
+        self.history[table_id] = None
+        self.history.move_to_end(table_id)
+        with locked(self.history_path), open(self.history_path, "a") as f:
+            f.write(f"{table_id}\n" if self._ends_with_newline else f"\n{table_id}\n")
+        self._ends_with_newline = True
+        self._num_lines += 1
+        if self._num_lines > max(COMPACT_MIN_LINES, COMPACT_RATIO * len(self.history)):
+            self._compact()
         logger.debug(f"Saved table: {table}")
 
     def remove_table(self, table_ref: str):
         logger.trace("Method call")
-        history = self.list_tables()
-        try:
-            history.remove(table_ref)
-        except ValueError:
-            pass
-        with open(self.history_path, "w") as f:
-            f.write("\n".join(history))
+        if table_ref in self.history:
+            self._compact([table_ref])
         logger.debug(f"Removed table: {table_ref}")
 
+    def _compact(self, removed: Iterable[str] = ()):
+        """
+        Rewrite history log, keeping only the most recent entry of every table. The log is reloaded under the lock
+        first, so tables appended by other processes since it was loaded are kept.
+        """
+        with locked(self.history_path):
+            self._load()
+            for table_id in removed:
+                self._history.pop(table_id, None)
+            content = "".join(f"{table_id}\n" for table_id in self._history)
+            atomic_write(self.history_path, content)
+        self._num_lines = len(self.history)
+        self._ends_with_newline = True
+        logger.debug(f"Compacted history: {self._num_lines} tables")
+
     def pick_table(self, live: Optional[Live]) -> Optional[Table]:
         logger.trace("Method call")
         history = self.list_tables()
-        from_history = bash_util.pick_one(history, live)
+        from_history = picker_util.pick_one(history, live, self.config.picker, reverse=True)  # most recent first
         table = None
         if from_history:
             table_ref = TableReference.from_string(from_history.replace(":", "."))
@@ -1,14 +1,18 @@
-from typing import List
+import csv
+import json
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, TextIO, Tuple
 
 from loguru import logger
 from rich.console import Console
 
+from bq_meta import const
 from bq_meta.client import Client
 from bq_meta.config import Config
-from bq_meta.util.rich_utils import progress
-from google.cloud.bigquery import Table
+from bq_meta.util import stats_utils
+from bq_meta.util.cache_utils import TtlLruCache
 
-from google.cloud.asset_v1 import AnalyzeIamPolicyRequest, IamPolicyAnalysisQuery
+if TYPE_CHECKING:
+    from google.cloud.bigquery import Table
 
 
 class IamService:
@@ -16,36 +20,176 @@ class IamService:
         self.console = console
         self.config = config
         self.client = client
-        self.table = None
-        self.role_members = {}
+        # key -> role -> members, keys are table or dataset resource names with the analyzed roles
+        self.cache = TtlLruCache(
+            max_size=lambda: self.config.iam_cache_size,
+            ttl=lambda: self.config.iam_cache_ttl,
+            path=const.BQ_META_IAM_CACHE if self.config.iam_cache_persist else None,
+        )
+
+    def fetch_all_roles_members(self, table: "Table", roles: List[str], fresh: bool = False) -> bool:
+        """
+        Members of the roles are cached per table. Bindings inherited from the dataset (or above) are cached per
+        dataset, other tables of the same dataset then only need their own (fast) table iam policy.
+        Returns False when the Asset Inventory permission is missing, other errors are raised.
+        """
+        from google.api_core.exceptions import Forbidden, PermissionDenied
 
-    def fetch_all_roles_members(self, table: Table, roles: List[str]) -> bool:
         logger.trace("Method call")
+        table_key = self._cache_key(self._table_resource(table), roles)
+        dataset_key = self._cache_key(self._dataset_resource(table), roles)
+        if fresh:
+            self.cache.invalidate(lambda key: key in (table_key, dataset_key))
         try:
-            self.table = table
-            request = AnalyzeIamPolicyRequest()
-            analysis_query = IamPolicyAnalysisQuery()
-            analysis_query.scope = f"projects/{table.project}"
-            analysis_query.access_selector.roles = roles
-            analysis_query.resource_selector.full_resource_name = (
-                f"//bigquery.googleapis.com/projects/{table.project}/datasets/{table.dataset_id}/tables/{table.table_id}"
-            )
-            request.analysis_query = analysis_query
-            logger.debug(request)
-            response = self.client.asset_client.analyze_iam_policy(request=request)
-            self.role_members = {}
-            for result in response.main_analysis.analysis_results:
-                self.role_members[result.iam_binding.role] = result.iam_binding.members
-            logger.debug(f"Fetched all roles members: {self.role_members}")
+            table_hit = self.cache.get(table_key) is not None
+            stats_utils.cache("iam", table_hit)
+            if table_hit:
+                logger.debug(f"Iam cache hit: {table_key}")
+                return True
+            inherited = self.cache.get(dataset_key)
+            stats_utils.cache("iam.dataset", inherited is not None)
+            if inherited is not None:
+                logger.debug(f"Iam dataset cache hit: {dataset_key}")
+                direct = self._get_table_policy_members(table, roles)
+            else:
+                inherited, direct = self._analyze_roles_members(table, roles)
+                self.cache.put(dataset_key, inherited)
+            role_members = self._merge(inherited, direct)
+            self.cache.put(table_key, role_members)
+            logger.debug(f"Fetched all roles members: {role_members}")
             return True
-        except Exception as e:
+        except (PermissionDenied, Forbidden) as e:  # grpc and rest transport of the asset client
             logger.warning(e)
             return False
-            
 
-    def get_role_members(self, table: Table, role: str) -> List[str]:
+    def get_role_members(self, table: "Table", role: str, roles: Optional[List[str]] = None) -> Optional[List[str]]:
+        """
+        Cached members of the role, None when members of the table are not cached (never fetched, expired or evicted)
+        """
         logger.trace("Method call")
-        members = []
-        if self.table.full_table_id == table.full_table_id:
-            members = self.role_members[role]
-        return members
+        table_key = self._cache_key(self._table_resource(table), roles or self.config.iam_roles)
+        role_members = self.cache.get(table_key)
+        return role_members.get(role, []) if role_members is not None else None
+
+    def audit_roles_members(
+        self, project_id: str, dataset_id: Optional[str], roles: List[str], fmt: str, out: TextIO
+    ) -> int:
+        """
+        Write members of the roles for every table of the dataset (or project) as csv or json lines, returns number
+        of tables written
+        """
+        logger.trace("Method call")
+        writer = csv.writer(out)
+        if fmt == "csv":
+            writer.writerow(["table", "role", "member"])
+        tables = set()
+        for full_table_id, role, members in self._analyze_scope(project_id, dataset_id, roles):
+            tables.add(full_table_id)
+            if fmt == "csv":
+                writer.writerows([full_table_id, role, member] for member in members)
+            else:
+                out.write(json.dumps({"table": full_table_id, "role": role, "members": members}) + "\n")
+        out.flush()
+        logger.debug(f"Audited {len(tables)} tables")
+        return len(tables)
+
+    def _analyze_scope(
+        self, project_id: str, dataset_id: Optional[str], roles: List[str]
+    ) -> Iterator[Tuple[str, str, List[str]]]:
+        """
+        Single Asset Inventory analysis of the dataset (or project), expanded to all tables below it
+        """
+        from google.cloud.asset_v1 import AnalyzeIamPolicyRequest, IamPolicyAnalysisQuery
+
+        request = AnalyzeIamPolicyRequest()
+        analysis_query = IamPolicyAnalysisQuery()
+        analysis_query.scope = f"projects/{project_id}"
+        analysis_query.access_selector.roles = roles
+        if dataset_id:
+            resource = f"//bigquery.googleapis.com/projects/{project_id}/datasets/{dataset_id}"
+        else:
+            resource = f"//cloudresourcemanager.googleapis.com/projects/{project_id}"
+        analysis_query.resource_selector.full_resource_name = resource
+        analysis_query.options.expand_resources = True
+        request.analysis_query = analysis_query
+        logger.debug(request)
+        with stats_utils.span("analyze_iam_policy") as record:
+            response = self.client.asset_client.analyze_iam_policy(request=request)
+            self._record_response(record, response)
+        if not response.main_analysis.fully_explored:
+            logger.warning(f"Iam analysis of {resource} is not fully explored")
+
+        tables: Dict[str, Dict[str, List[str]]] = {}  # full_table_id -> role -> members
+        for result in response.main_analysis.analysis_results:
+            role_members = {result.iam_binding.role: list(result.iam_binding.members)}
+            for access_control_list in result.access_control_lists:
+                for resource in access_control_list.resources:
+                    full_table_id = self._full_table_id(resource.full_resource_name)
+                    if full_table_id:
+                        tables[full_table_id] = self._merge(tables.get(full_table_id, {}), role_members)
+        for full_table_id, role_members in sorted(tables.items()):
+            for role, members in role_members.items():
+                yield full_table_id, role, members
+
+    def _full_table_id(self, resource_name: str) -> Optional[str]:
+        # //bigquery.googleapis.com/projects/{project}/datasets/{dataset}/tables/{table}
+        parts = resource_name.removeprefix("//bigquery.googleapis.com/").split("/")
+        if len(parts) == 6 and parts[0] == "projects" and parts[2] == "datasets" and parts[4] == "tables":
+            return f"{parts[1]}:{parts[3]}.{parts[5]}"
+        return None
+
+    def _analyze_roles_members(self, table: "Table", roles: List[str]) -> tuple:
+        """
+        Asset Inventory analysis of the table, split into inherited and directly attached bindings
+        """
+        from google.cloud.asset_v1 import AnalyzeIamPolicyRequest, IamPolicyAnalysisQuery
+
+        request = AnalyzeIamPolicyRequest()
+        analysis_query = IamPolicyAnalysisQuery()
+        analysis_query.scope = f"projects/{table.project}"
+        analysis_query.access_selector.roles = roles
+        analysis_query.resource_selector.full_resource_name = self._table_resource(table)
+        request.analysis_query = analysis_query
+        logger.debug(request)
+        with stats_utils.span("analyze_iam_policy") as record:
+            response = self.client.asset_client.analyze_iam_policy(request=request)
+            self._record_response(record, response)
+        inherited: Dict[str, List[str]] = {}
+        direct: Dict[str, List[str]] = {}
+        for result in response.main_analysis.analysis_results:
+            attached_to_table = result.attached_resource_full_name == self._table_resource(table)
+            role_members = direct if attached_to_table else inherited
+            role_members.setdefault(result.iam_binding.role, []).extend(result.iam_binding.members)
+        return inherited, direct
+
+    def _get_table_policy_members(self, table: "Table", roles: List[str]) -> Dict[str, List[str]]:
+        with stats_utils.span("get_iam_policy") as record:
+            policy = self.client.bq_client.get_iam_policy(table)
+            record.items = len(policy.bindings)
+        direct: Dict[str, List[str]] = {}
+        for binding in policy.bindings:
+            if binding["role"] in roles:
+                direct.setdefault(binding["role"], []).extend(sorted(binding["members"]))
+        return direct
+
+    def _record_response(self, record: stats_utils.Span, response):
+        record.items = len(response.main_analysis.analysis_results)
+        if not record.bytes and stats_utils.enabled():  # grpc transport, no http response measured
+            record.bytes = type(response).pb(response).ByteSize()
+
+    def _merge(self, *role_members_list: Dict[str, List[str]]) -> Dict[str, List[str]]:
+        merged: Dict[str, List[str]] = {}
+        for role_members in role_members_list:
+            for role, members in role_members.items():
+                merged.setdefault(role, [])
+                merged[role].extend(member for member in members if member not in merged[role])
+        return merged
+
+    def _cache_key(self, resource: str, roles: List[str]) -> str:
+        return f"{resource}|{','.join(sorted(roles))}"
+
+    def _table_resource(self, table: "Table") -> str:
+        return f"{self._dataset_resource(table)}/tables/{table.table_id}"
+
+    def _dataset_resource(self, table: "Table") -> str:
+        return f"//bigquery.googleapis.com/projects/{table.project}/datasets/{table.dataset_id}"
@@ -6,6 +6,7 @@ from rich.console import Console
 from bq_meta import const
 from bq_meta.client import Client
 from bq_meta.config import Config
+from bq_meta.util import stats_utils
 from bq_meta.util.rich_utils import progress
 
 
@@ -25,7 +26,8 @@ class ProjectService:
         logger.trace("Method call")
         projects_ids = ["bigquery-public-data"]  # add bq public datasets explicitly, for testing purposes
         iterator = self.client.bq_client.list_projects()
-        for project in progress(self.console, "projects", iterator):
+        pages = stats_utils.pages("list_projects", iterator)
+        for project in progress(self.console, "projects", (project for page in pages for project in page)):
             projects_ids.append(project.project_id)
         logger.debug(f"Fetched projects: {projects_ids}")
         with open(self.projects_path, "w") as f:
@@ -0,0 +1,114 @@
+from functools import cached_property
+from typing import TYPE_CHECKING
+
+from rich.console import Console
+
+from bq_meta.client import Client
+from bq_meta.config import Config
+
+if TYPE_CHECKING:
+    from bq_meta.service.batch_service import BatchService
+    from bq_meta.service.cache_service import CacheService
+    from bq_meta.service.catalog_service import CatalogService
+    from bq_meta.service.crawl_service import CrawlService
+    from bq_meta.service.daemon_service import DaemonService
+    from bq_meta.service.history_service import HistoryService
+    from bq_meta.service.iam_service import IamService
+    from bq_meta.service.project_service import ProjectService
+    from bq_meta.service.snippet_service import SnippetService
+    from bq_meta.service.storage_service import StorageService
+    from bq_meta.service.table_service import TableService
+    from bq_meta.window import Window
+
+
+class Services:
+    """
+    Services are imported and constructed on first use, so every command loads only the modules it needs
+    """
+
+    def __init__(self, console: Console, config: Config) -> None:
+        self.console = console
+        self.config = config
+        self.client = Client(console, config)
+
+    @cached_property
+    def project_service(self) -> "ProjectService":
+        from bq_meta.service.project_service import ProjectService
+
+        return ProjectService(self.console, self.config, self.client)
+
+    @cached_property
+    def cache_service(self) -> "CacheService":
+        from bq_meta.service.cache_service import CacheService
+
+        return CacheService(self.config)
+
+    @cached_property
+    def catalog_service(self) -> "CatalogService":
+        from bq_meta.service.catalog_service import CatalogService
+
+        return CatalogService(self.config)
+
+    @cached_property
+    def table_service(self) -> "TableService":
+        from bq_meta.service.table_service import TableService
+
+        return TableService(
+            self.console, self.config, self.client, self.project_service, self.cache_service, self.catalog_service
+        )
+
+    @cached_property
+    def crawl_service(self) -> "CrawlService":
+        from bq_meta.service.crawl_service import CrawlService
+
+        return CrawlService(self.console, self.config, self.client, self.project_service, self.catalog_service)
+
+    @cached_property
+    def batch_service(self) -> "BatchService":
+        from bq_meta.service.batch_service import BatchService
+
+        return BatchService(self.config, self.table_service)
+
+    @cached_property
+    def daemon_service(self) -> "DaemonService":
+        from bq_meta.service.daemon_service import DaemonService
+
+        return DaemonService(self.console, self.config, self.table_service)
+
+    @cached_property
+    def storage_service(self) -> "StorageService":
+        from bq_meta.service.storage_service import StorageService
+
+        return StorageService(self.console, self.config, self.client, self.table_service, self.catalog_service)
+
+    @cached_property
+    def snippet_service(self) -> "SnippetService":
+        from bq_meta.service.snippet_service import SnippetService
+
+        return SnippetService()
+
+    @cached_property
+    def history_service(self) -> "HistoryService":
+        from bq_meta.service.history_service import HistoryService
+
+        return HistoryService(self.console, self.config, self.table_service)
+
+    @cached_property
+    def iam_service(self) -> "IamService":
+        from bq_meta.service.iam_service import IamService
+
+        return IamService(self.console, self.config, self.client)
+
+    @cached_property
+    def window(self) -> "Window":
+        from bq_meta.window import Window
+
+        return Window(
+            self.console,
+            self.config,
+            self.history_service,
+            self.table_service,
+            self.snippet_service,
+            self.iam_service,
+            self.storage_service,
+        )
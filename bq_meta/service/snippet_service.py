@@ -1,12 +1,13 @@
 import os
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 
-from google.cloud import bigquery
-from jinja2 import Template
 from loguru import logger
 
 from bq_meta import const
 
+if TYPE_CHECKING:
+    from google.cloud import bigquery
+
 
 class SnippetService:
     def __init__(self) -> None:
@@ -16,10 +17,12 @@ class SnippetService:
         logger.trace("Method call")
         return next(os.walk(const.BQ_META_SNIPPETS), (None, None, []))[2]
 
-    def get_snippet(self, snippet: str, table: bigquery.Table) -> Optional[str]:
+    def get_snippet(self, snippet: str, table: "bigquery.Table") -> Optional[str]:
         logger.trace("Method call")
         rendered = None
         if snippet:
+            from jinja2 import Template
+
             with open(f"{const.BQ_META_SNIPPETS}/{snippet}") as f:
                 rendered = Template(f.read()).render(
                     project=table.project,
@@ -0,0 +1,146 @@
+from typing import List, Optional, Tuple
+
+from google.api_core.exceptions import GoogleAPICallError
+from loguru import logger
+from rich.console import Console
+from rich.text import Text
+
+from bq_meta import const, output
+from bq_meta.client import Client
+from bq_meta.config import Config
+from bq_meta.service.catalog_service import CatalogService
+from bq_meta.service.table_service import TableService
+from bq_meta.util import stats_utils
+from bq_meta.util.cache_utils import TtlLruCache
+
+PERCENTILES = (50, 90, 99)
+SUMMARY_PAGE_SIZE = 1000  # rows of the summary query fetched per request
+SUMMARY_CACHE_SIZE = 100  # number of cached dataset summaries
+SUMMARY_COLUMNS = {"num_rows": "total_rows"}  # catalog column -> INFORMATION_SCHEMA.TABLE_STORAGE column, if different
+
+
+class StorageService:
+    """
+    Storage rankings of cached tables, filtered by labels and description. Answered from the catalog (indexed sqlite
+    tables), no table is fetched. Storage of a whole dataset is summarized by a single INFORMATION_SCHEMA query.
+    """
+
+    def __init__(
+        self,
+        console: Console,
+        config: Config,
+        client: Client,
+        table_service: TableService,
+        catalog_service: CatalogService,
+    ) -> None:
+        self.console = console
+        self.config = config
+        self.client = client
+        self.table_service = table_service
+        self.catalog_service = catalog_service
+        # project:dataset:metric -> summary of the dataset, see _query_dataset_summary
+        self.summary_cache = TtlLruCache(
+            max_size=lambda: SUMMARY_CACHE_SIZE,
+            ttl=lambda: self.config.dataset_summary_ttl,
+            path=const.BQ_META_DATASET_CACHE,
+        )
+
+    def report(self, labels: List[str], description: Optional[str], sort_by: str, limit: int, percentiles: bool):
+        logger.trace("Method call")
+        self.table_service.ensure_indexed()
+        label_filter = [self._parse_label(label) for label in labels]
+        tables = self.catalog_service.list_table_stats(label_filter, description, sort_by, limit)
+        self.console.print(output.get_storage_report_output(tables, sort_by))
+        if percentiles:
+            stats = self.catalog_service.get_stats_percentiles(label_filter, description, sort_by, PERCENTILES)
+            self.console.print(output.get_percentiles_output(stats, sort_by))
+
+    def print_dataset_summary(self, dataset_str: str, sort_by: str, limit: int):
+        logger.trace("Method call")
+        project_id, _, dataset_id = dataset_str.replace(":", ".").partition(".")
+        try:
+            summary = self.get_dataset_summary(project_id, dataset_id, sort_by, limit)
+        except GoogleAPICallError as e:
+            logger.warning(f"Dataset {dataset_str} not summarized: {e}")
+            self.console.print(Text(f"Dataset summary failed: {output.get_error_message(e)}", style=const.error_style))
+            return
+        self.console.print(output.get_dataset_summary_output(summary, 0, limit))
+
+    def get_dataset_summary(
+        self,
+        project_id: str,
+        dataset_id: str,
+        sort_by: str = "physical",
+        limit: int = 100,
+        location: Optional[str] = None,
+        fresh: bool = False,
+    ) -> dict:
+        """
+        Totals of the dataset and its largest tables. Cached summary is used when it holds at least limit tables
+        (or all tables of the dataset).
+        """
+        logger.trace("Method call")
+        key = f"{project_id}:{dataset_id}:{sort_by}"
+        if fresh:
+            self.summary_cache.invalidate(lambda cached_key: cached_key.startswith(f"{project_id}:{dataset_id}:"))
+        summary = self.summary_cache.get(key)
+        cache_hit = bool(summary) and (summary["limit"] >= limit or len(summary["tables"]) == summary["count"])
+        stats_utils.cache("dataset_summary", cache_hit)
+        if cache_hit:
+            logger.debug(f"Dataset summary cache hit: {key}")
+            return summary
+        if not location and summary:
+            location = summary["location"]
+        elif not location:
+            with stats_utils.span("get_dataset"):
+                location = self.client.bq_client.get_dataset(f"{project_id}.{dataset_id}").location
+        summary = self._query_dataset_summary(project_id, dataset_id, location, sort_by, limit)
+        self.summary_cache.put(key, summary)
+        return summary
+
+    def _query_dataset_summary(self, project_id: str, dataset_id: str, location: str, sort_by: str, limit: int) -> dict:
+        """
+        Totals are window aggregates over all tables of the dataset, computed before the limit is applied, so a single
+        query returns both the totals and the largest tables. Rows are fetched in pages.
+        """
+        from google.cloud import bigquery
+
+        columns = {column: SUMMARY_COLUMNS.get(column, column) for column, _ in const.STORAGE_METRICS.values()}
+        select = ",\n  ".join(
+            [f"{source} AS {column}" for column, source in columns.items()]
+            + [f"SUM({source}) OVER () AS sum_{column}" for column, source in columns.items()]
+        )
+        query = f"""
+SELECT
+  table_name AS table_id,
+  {select},
+  COUNT(*) OVER () AS tables_count
+FROM `{project_id}`.`region-{location.lower()}`.INFORMATION_SCHEMA.TABLE_STORAGE
+WHERE table_schema = @dataset_id AND NOT deleted
+ORDER BY {columns[const.STORAGE_METRICS[sort_by][0]]} DESC
+LIMIT @limit"""
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[
+                bigquery.ScalarQueryParameter("dataset_id", "STRING", dataset_id),
+                bigquery.ScalarQueryParameter("limit", "INT64", limit),
+            ]
+        )
+        logger.debug(f"Dataset summary query: {query}")
+        with stats_utils.span("query"):
+            job = self.client.bq_client.query(query, job_config=job_config, project=project_id, location=location)
+            rows = job.result(page_size=SUMMARY_PAGE_SIZE)
+        summary = {"location": location, "sort_by": sort_by, "limit": limit, "count": 0, "totals": {}, "tables": []}
+        for page in stats_utils.pages("query.results", rows):
+            for row in page:
+                summary["count"] = row["tables_count"]
+                summary["totals"] = {column: row[f"sum_{column}"] for column in columns}
+                summary["tables"].append({"table_id": row["table_id"], **{column: row[column] for column in columns}})
+        logger.debug(f"Dataset {project_id}:{dataset_id} summarized: {summary['count']} tables")
+        return summary
+
+    def _parse_label(self, label: str) -> Tuple[str, Optional[str]]:
+        """
+        key=value matches the value, key alone matches any value
+        """
+        key, separator, value = label.partition("=")
+        return key, value if separator else None
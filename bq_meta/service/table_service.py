@@ -1,15 +1,27 @@
-from typing import Optional
+import sqlite3
+import time
+from functools import partial
+from typing import Iterator, List, Optional, Set
 
-from bq_meta.client import Client
+from bq_meta.client import Client, rate_limit_retry
 from bq_meta.config import Config
+from bq_meta.service.cache_service import CacheService
+from bq_meta.service.catalog_service import METADATA_BACKFILLED, CatalogService
 from bq_meta.service.project_service import ProjectService
-from bq_meta.util import bash_util
+from bq_meta.util import picker_util, stats_utils
+from bq_meta.util.num_utils import bytes_fmt, num_fmt
 from bq_meta.util.rich_utils import progress
+from bq_meta.util.shard_utils import ShardGroups
+from google.api_core.exceptions import NotFound, NotModified
 from google.cloud import bigquery
 from rich.console import Console
 from rich.live import Live
 from loguru import logger
 
+REVALIDATE_AFTER = 60  # seconds, tables fetched more recently are considered fresh
+PAGE_SIZE = 1000
+INDEX_BATCH_SIZE = 500  # cached tables indexed in a single transaction
+
 
 class TableService:
     def __init__(
@@ -18,11 +30,15 @@ class TableService:
         config: Config,
         client: Client,
         project_service: ProjectService,
+        cache_service: CacheService,
+        catalog_service: CatalogService,
     ):
         self.console = console
         self.config = config
         self.client = client
         self.project_service = project_service
+        self.cache_service = cache_service
+        self.catalog_service = catalog_service
 
     def get_table(
         self,
@@ -43,39 +59,279 @@ class TableService:
         return table
 
     def get_table_str(self, table_str: str) -> Optional[bigquery.Table]:
+        """
+        Get table from the cache, expired entries are revalidated using their etag
+        """
         logger.trace("Method call")
         table = None
         try:
-            table = self.client.bq_client.get_table(table_str)
-        except Exception:
+            table = self.load_table(table_str)
+        except NotFound:
+            logger.warning(f"Table {table_str} not found")
+            self.remove_cached_table(table_str)
+        except Exception as e:
+            logger.warning(f"Table {table_str} not fetched: {e}")
+        return table
+
+    def load_table(self, table_str: str) -> bigquery.Table:
+        """
+        Same as get_table_str, but errors are raised
+        """
+        logger.trace("Method call")
+        entry = self.cache_service.get(table_str)
+        stats_utils.cache("table", entry is not None and not self.cache_service.is_expired(entry))
+        if entry and not self.cache_service.is_expired(entry):
+            logger.debug(f"Cache hit: {table_str}")
+            table = bigquery.Table.from_api_repr(entry.properties)
+        elif entry and entry.etag:
+            table = self._revalidate_table(table_str, entry.properties)
+        else:
+            table = self._fetch_table(table_str)
+        return table
+
+    def get_fresh_table(self, table: bigquery.Table) -> Optional[bigquery.Table]:
+        logger.trace("Method call")
+        return self.get_fresh_table_str(f"{table.project}.{table.dataset_id}.{table.table_id}")
+
+    def get_fresh_table_str(self, table_str: str) -> Optional[bigquery.Table]:
+        """
+        Get table directly from the BigQuery, bypassing the cache
+        """
+        logger.trace("Method call")
+        table = None
+        try:
+            table = self._fetch_table(table_str)
+        except NotFound:
             logger.warning(f"Table {table_str} not found")
+            self.remove_cached_table(table_str)
+        except Exception as e:
+            logger.warning(f"Table {table_str} not fetched: {e}")
         return table
 
-    def get_fresh_table(self, table: bigquery.Table) -> bigquery.Table:
+    def table_exists(self, table_str: str) -> bool:
+        """
+        Check existence directly in the BigQuery, backing off when rate limited
+        """
         logger.trace("Method call")
-        return self.get_table_str(f"{table.project}.{table.dataset_id}.{table.table_id}")
+        try:
+            with stats_utils.span("get_table"):
+                table = self.client.bq_client.get_table(table_str, retry=rate_limit_retry())
+            self._cache_table(table_str, table._properties)
+            return True
+        except NotFound:
+            self.remove_cached_table(table_str)
+            return False
+
+    def existing_table_ids(self, project_id: str, dataset_id: str) -> Set[str]:
+        """
+        All table ids of the dataset in a single listing, backing off when rate limited. Updates the catalog.
+        """
+        logger.trace("Method call")
+        try:
+            iterator = self.client.bq_client.list_tables(
+                f"{project_id}.{dataset_id}", page_size=PAGE_SIZE, retry=rate_limit_retry()
+            )
+            table_ids = [table.table_id for page in stats_utils.pages("list_tables", iterator) for table in page]
+        except NotFound:
+            table_ids = []
+        self.catalog_service.save_tables(project_id, dataset_id, table_ids)
+        return set(table_ids)
+
+    def _fetch_table(self, table_str: str) -> bigquery.Table:
+        logger.trace("Method call")
+        with stats_utils.span("get_table"):
+            table = self.client.bq_client.get_table(table_str)
+        self._cache_table(table_str, table._properties)
+        return table
+
+    def revalidate_table(self, table: bigquery.Table) -> Optional[bigquery.Table]:
+        """
+        Fresh table, only if it changed since it was fetched (or revalidated less than a minute ago)
+        """
+        logger.trace("Method call")
+        table_str = f"{table.project}.{table.dataset_id}.{table.table_id}"
+        entry = self.cache_service.get(table_str)
+        if not table.etag or entry and time.time() - entry.fetched < REVALIDATE_AFTER:
+            return None
+        properties = self._conditional_fetch(table_str, table.etag)
+        return bigquery.Table.from_api_repr(properties) if properties else None
+
+    def _revalidate_table(self, table_str: str, properties: dict) -> bigquery.Table:
+        logger.trace("Method call")
+        properties = self._conditional_fetch(table_str, properties["etag"]) or properties
+        return bigquery.Table.from_api_repr(properties)
+
+    def _conditional_fetch(self, table_str: str, etag: str) -> Optional[dict]:
+        """
+        Conditional request, BigQuery responds with 304 when cached etag is still current (returns None)
+        """
+        logger.trace("Method call")
+        table_ref = bigquery.TableReference.from_string(table_str)
+        properties = None
+        try:
+            with stats_utils.span("get_table.conditional"):
+                properties = self.client.get_if_none_match(table_ref.path, etag)
+            stats_utils.cache("table.etag", False)
+            self._cache_table(table_str, properties)
+            logger.debug(f"Cache refreshed: {table_str}")
+        except NotModified:
+            stats_utils.cache("table.etag", True)
+            self.cache_service.touch(table_str)
+            logger.debug(f"Cache revalidated: {table_str}")
+        return properties
+
+    def remove_cached_table(self, table_str: str):
+        logger.trace("Method call")
+        self.cache_service.remove(table_str)
+        table_ref = bigquery.TableReference.from_string(table_str)
+        self._guard_index(
+            self.catalog_service.remove_table_metadata, table_ref.project, table_ref.dataset_id, table_ref.table_id
+        )
+
+    def _cache_table(self, table_str: str, properties: dict):
+        """
+        Cache table metadata and index it in the catalog
+        """
+        self.cache_service.put(table_str, properties)
+        self._guard_index(self.catalog_service.save_table_metadata, [properties])
+
+    # ======================   Index   ======================
+
+    def find_columns(self, column: str, limit: Optional[int] = None) -> List[tuple]:
+        """
+        Tables with the column
+        """
+        logger.trace("Method call")
+        self.ensure_indexed()
+        return self.catalog_service.find_columns(column, limit)
+
+    def ensure_indexed(self):
+        """
+        Tables cached before the catalog indexed their metadata are indexed on first use
+        """
+        if not self.catalog_service.get_state(METADATA_BACKFILLED):
+            self.index_cached_tables()
+            self.catalog_service.save_state(METADATA_BACKFILLED, str(time.time()))
+
+    def index_cached_tables(self):
+        logger.trace("Method call")
+        table_strs = list(self.cache_service.cached_table_strs())
+
+        def index_tables():
+            """
+            Yields indexed table strs, tables are indexed in batches
+            """
+            for start in range(0, len(table_strs), INDEX_BATCH_SIZE):
+                batch = table_strs[start : start + INDEX_BATCH_SIZE]
+                entries = (self.cache_service.peek(table_str) for table_str in batch)
+                self._guard_index(
+                    self.catalog_service.save_table_metadata, [entry.properties for entry in entries if entry]
+                )
+                yield from batch
+
+        progress(self.console, "cached tables", index_tables())
+        logger.debug(f"Indexed metadata of {len(table_strs)} cached tables")
+
+    def _guard_index(self, fn, *args):
+        """
+        Index is secondary, failing to update it never fails the metadata fetch
+        """
+        try:
+            fn(*args)
+        except sqlite3.Error as e:
+            logger.warning(f"Catalog index not updated: {e}")
 
     # ======================   Pick   ======================
 
     def _pick_project_id(self, live: Optional[Live]) -> Optional[str]:
         logger.trace("Method call")
         project_ids = self.project_service.list_projects()
-        return bash_util.pick_one(project_ids, live)
+        return picker_util.pick_one(project_ids, live, self.config.picker)
 
     def _pick_dataset_id(self, project_id: str, live: Optional[Live]) -> Optional[str]:
         logger.trace("Method call")
-        dataset_ids = []
-        iterator = self.client.bq_client.list_datasets(project=project_id)
-        for dataset in progress(self.console, "datasets", iterator):
-            dataset_ids.append(dataset.dataset_id)
-        logger.debug(f"Fetched datasets {dataset_ids}")
-        return bash_util.pick_one(dataset_ids, live)
+        dataset_ids = self.catalog_service.list_datasets(project_id)
+        pages = [dataset_ids] if dataset_ids is not None else self.stream_dataset_ids(project_id)
+        refresh = partial(self.stream_dataset_ids, project_id)  # datasets created since the catalog listing
+        return picker_util.pick_one_from_pages(pages, live, self.config.picker, refresh=refresh)
 
     def _pick_table_id(self, project_id: str, dataset_id: str, live: Optional[Live]) -> Optional[str]:
+        logger.trace("Method call")
+        table_ids = self.catalog_service.list_tables(project_id, dataset_id)
+        pages = [table_ids] if table_ids is not None else self.stream_table_ids(project_id, dataset_id)
+        if not self.config.group_shards:
+            refresh = partial(self.stream_table_ids, project_id, dataset_id)  # tables created since the catalog listing
+            return picker_util.pick_one_from_pages(pages, live, self.config.picker, refresh=refresh)
+        shard_groups = ShardGroups()
+
+        def regroup() -> Iterator[List[str]]:
+            shard_groups.clear()
+            return shard_groups.group_pages(self.stream_table_ids(project_id, dataset_id))
+
+        pages = shard_groups.group_pages(pages)
+        table_id = picker_util.pick_one_from_pages(
+            pages, live, self.config.picker, shard_groups.describe, refresh=regroup
+        )
+        if table_id in shard_groups:
+            table_id = self._pick_shard_id(project_id, dataset_id, table_id, shard_groups.shards(table_id), live)
+        return table_id
+
+    def _pick_shard_id(
+        self, project_id: str, dataset_id: str, group: str, shard_ids: List[str], live: Optional[Live]
+    ) -> Optional[str]:
+        """
+        Pick from shards of the group (newest first), shards are listed only up to the moment the group was picked
+        """
+        logger.trace("Method call")
+        if len(shard_ids) == 1:
+            return shard_ids[0]
+        title = f"{group} {self._shards_summary(project_id, dataset_id, shard_ids)}"
+        return picker_util.pick_one(sorted(shard_ids, reverse=True), live, self.config.picker, title=title)
+
+    def _shards_summary(self, project_id: str, dataset_id: str, shard_ids: List[str]) -> str:
+        """
+        Aggregated storage of shards already in the metadata cache, no shard is fetched
+        """
+        cached = self.cache_service.cached_table_strs()
+        num_cached, num_rows, num_bytes = 0, 0, 0
+        for shard_id in shard_ids:
+            table_str = f"{project_id}.{dataset_id}.{shard_id}"
+            entry = self.cache_service.peek(table_str) if table_str.replace(":", ".") in cached else None
+            if entry:
+                num_cached += 1
+                num_rows += int(entry.properties.get("numRows") or 0)
+                num_bytes += int(entry.properties.get("numBytes") or 0)
+        summary = f"{len(shard_ids)} shards"
+        if num_cached:
+            summary += f", {num_cached} cached: {num_fmt(num_rows)} rows, {bytes_fmt(num_bytes)}"
+        return summary
+
+    # ======================   Fetch   ======================
+
+    def stream_dataset_ids(self, project_id: str) -> Iterator[List[str]]:
+        """
+        Pages of dataset ids as they are listed, the catalog is updated once the listing completes
+        """
+        logger.trace("Method call")
+        dataset_ids = []
+        iterator = self.client.bq_client.list_datasets(project=project_id, page_size=PAGE_SIZE)
+        for page in stats_utils.pages("list_datasets", iterator):
+            page_ids = [dataset.dataset_id for dataset in page]
+            dataset_ids.extend(page_ids)
+            yield page_ids
+        logger.debug(f"Fetched {len(dataset_ids)} datasets of {project_id}")
+        self.catalog_service.save_datasets(project_id, dataset_ids)
+
+    def stream_table_ids(self, project_id: str, dataset_id: str) -> Iterator[List[str]]:
+        """
+        Pages of table ids as they are listed, the catalog is updated once the listing completes
+        """
         logger.trace("Method call")
         table_ids = []
-        iterator = self.client.bq_client.list_tables(f"{project_id}.{dataset_id}")
-        for table in progress(self.console, "tables", iterator):
-            table_ids.append(table.table_id)
-        logger.debug(f"Fetched tables {table_ids}")
-        return bash_util.pick_one(table_ids, live)
+        iterator = self.client.bq_client.list_tables(f"{project_id}.{dataset_id}", page_size=PAGE_SIZE)
+        for page in stats_utils.pages("list_tables", iterator):
+            page_ids = [table.table_id for table in page]
+            table_ids.extend(page_ids)
+            yield page_ids
+        logger.debug(f"Fetched {len(table_ids)} tables of {project_id}.{dataset_id}")
+        self.catalog_service.save_tables(project_id, dataset_id, table_ids)
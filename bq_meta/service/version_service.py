@@ -1,33 +1,59 @@
-from importlib.metadata import version
+import time
+from concurrent.futures import Future
 
-import requests
 from loguru import logger
 
 from bq_meta.config import Config
+from bq_meta.util import stats_utils
+from bq_meta.util.thread_utils import run_in_background
+
+VERSION_CHECK_TIMEOUT = 2  # seconds
 
 
 class VersionService:
     def __init__(self):
         ...
 
-    def update_config(self, config: Config):
+    def update_config(self, config: Config) -> Future:
+        """
+        Check versions in the background, PyPI is asked at most once per version_check_interval
+        """
+        logger.trace("Method call")
+        return run_in_background(self._update_config, config, name="version-check")
+
+    def _update_config(self, config: Config):
         logger.trace("Method call")
-        available_version = VersionService._get_available_version()
+        values = {}
         current_version = VersionService._get_current_version()
-        config.available_version = available_version
-        config.current_version = current_version
+        if current_version != config.current_version:
+            values["current_version"] = current_version
+        if time.time() - (config.version_checked or 0) >= config.version_check_interval:
+            try:
+                values["available_version"] = VersionService._get_available_version()
+                values["version_checked"] = time.time()
+            except Exception as e:
+                logger.warning(f"Available version not fetched: {e}")
+        if values:
+            config.update(values)
 
     def _get_available_version() -> str:
         logger.trace("Method call")
+        import requests
+
         package = "bq-meta"
         url = f"https://pypi.org/pypi/{package}/json"
-        response: dict = requests.request("GET", url).json()
+        with stats_utils.span("pypi_version") as record:
+            http_response = requests.request("GET", url, timeout=VERSION_CHECK_TIMEOUT)
+            record.bytes = len(http_response.content)
+        response: dict = http_response.json()
         version = response.get("info", None).get("version", None)
         logger.debug(f"Fetched version: {version}")
         return version
 
     def _get_current_version() -> str:
         logger.trace("Method call")
+        from importlib.metadata import version
+
         try:
             ver = version("bq-meta")
         except:
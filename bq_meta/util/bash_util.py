@@ -1,30 +1,45 @@
 import subprocess
-import tempfile
 from rich.live import Live
-from typing import List, Optional
+from typing import Iterable, List, Optional
 
+from loguru import logger
 
-def _run_fzf(choices: List[str], live: Optional[Live]) -> List[str]:
-    choices.reverse()  # reverse order when searching - from bottom to top
-    choices_str = "\n".join(choices)
+from bq_meta.util.thread_utils import run_in_background
+
+
+def _run_fzf(pages: Iterable[List[str]], live: Optional[Live]) -> List[str]:
     selection = []
     if live:
         live.stop()
-    fzf_args = filter(None, ["fzf", "--ansi"])
-    with tempfile.NamedTemporaryFile() as input_file:
-        with tempfile.NamedTemporaryFile() as output_file:
-            input_file.write(choices_str.encode("utf-8"))
-            input_file.flush()
-            cat = subprocess.Popen(["cat", input_file.name], stdout=subprocess.PIPE)
-            subprocess.run(fzf_args, stdin=cat.stdout, stdout=output_file)
-            cat.wait()
-            with open(output_file.name) as f:
-                selection = [line.strip("\n") for line in f.readlines()]
+    fzf_args = filter(None, ["fzf", "--ansi", "--tac"])  # reverse order when searching - from bottom to top
+    fzf = subprocess.Popen(fzf_args, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+
+    def feed():
+        """
+        Write pages into fzf as they arrive, fzf is searchable from the first page
+        """
+        try:
+            for page in pages:
+                fzf.stdin.write("".join(f"{choice}\n" for choice in page))
+                fzf.stdin.flush()
+        except BrokenPipeError:
+            pass  # fzf exited before all pages were written
+        except Exception as e:
+            logger.warning(f"Listing not completed: {e}")
+        finally:
+            try:
+                fzf.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    run_in_background(feed, name="fzf")
+    selection = [line.strip("\n") for line in fzf.stdout.readlines()]
+    fzf.wait()
     if live:
         live.start()
     return selection
 
 
-def pick_one(choices: List[str], live: Optional[Live]) -> Optional[str]:
-    result = next(iter(_run_fzf(choices, live)), None)
+def pick_one(pages: Iterable[List[str]], live: Optional[Live]) -> Optional[str]:
+    result = next(iter(_run_fzf(pages, live)), None)
     return result
@@ -0,0 +1,62 @@
+import json
+import os
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Callable, Optional
+
+from loguru import logger
+
+from bq_meta.util.file_utils import atomic_write
+
+
+class TtlLruCache:
+    """
+    In-memory cache bounded by number of entries (least recently used evicted) and entry age.
+    Entries must be json serializable when the cache is persisted to the path.
+    """
+
+    def __init__(self, max_size: Callable[[], int], ttl: Callable[[], int], path: Optional[str] = None) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path
+        self.lock = Lock()
+        self._entries: Optional[OrderedDict[str, tuple]] = None  # key -> (fetched, value)
+
+    @property
+    def entries(self) -> OrderedDict:
+        if self._entries is None:
+            self._entries = OrderedDict()
+            if self.path and os.path.exists(self.path):
+                try:
+                    with open(self.path, "r") as f:
+                        self._entries.update((key, tuple(entry)) for key, entry in json.load(f).items())
+                except Exception as e:
+                    logger.warning(f"Corrupted cache {self.path}: {e}")
+        return self._entries
+
+    def get(self, key: str) -> Optional[Any]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if not entry:
+                return None
+            fetched, value = entry
+            if time.time() - fetched > self.ttl():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: Any):
+        with self.lock:
+            self.entries[key] = (time.time(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size():
+                self.entries.popitem(last=False)
+            if self.path:
+                atomic_write(self.path, json.dumps(self.entries))
+
+    def invalidate(self, predicate: Callable[[str], bool]):
+        with self.lock:
+            for key in [key for key in self.entries if predicate(key)]:
+                del self.entries[key]
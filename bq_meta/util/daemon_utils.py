@@ -0,0 +1,45 @@
+import json
+import os
+import socket
+from typing import Optional
+
+from bq_meta import const
+
+CONNECT_TIMEOUT = 0.5  # seconds, an unresponsive daemon is skipped quickly
+REQUEST_TIMEOUT = 60  # seconds, fetching a table may take a while
+
+
+def request(payload: dict, path: str = const.BQ_META_DAEMON_SOCKET) -> Optional[dict]:
+    """
+    Send single request to the daemon, None when the daemon is not running (or the connection failed), callers then
+    fall back to in-process execution. Error replies of the daemon are returned as they are. Only the standard library is used, so the client side stays cheap to import.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(CONNECT_TIMEOUT)
+            sock.connect(path)
+            sock.settimeout(REQUEST_TIMEOUT)
+            sock.sendall(json.dumps(payload).encode() + b"\n")
+            with sock.makefile("rb") as f:
+                line = f.readline()
+        return json.loads(line) if line else None
+    except (OSError, ValueError):
+        return None
+
+
+def is_stale(path: str = const.BQ_META_DAEMON_SOCKET) -> bool:
+    """
+    Socket left over by a killed daemon, nobody listens on it. A daemon which is busy or slow to respond still accepts
+    connections, its socket is not stale.
+    """
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(CONNECT_TIMEOUT)
+            sock.connect(path)
+        return False
+    except ConnectionRefusedError:
+        return True
+    except OSError:
+        return False
@@ -0,0 +1,30 @@
+import fcntl
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+
+def atomic_write(path: str, content: str):
+    """
+    Write content into temporary file first and then replace the target, readers never see partial content.
+    Missing parent directory is created (e.g. cache directory of an installation initialized before it existed).
+    """
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+@contextmanager
+def locked(path: str):
+    """
+    Exclusive lock of the file among processes, held on a separate lock file (the file itself may be replaced)
+    """
+    with open(f"{path}.lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
@@ -0,0 +1,312 @@
+import re
+import shutil
+from threading import RLock
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import readchar
+from loguru import logger
+from readchar import key
+from rich.console import Group
+from rich.live import Live
+from rich.panel import Panel
+from rich.text import Text
+
+from bq_meta import const
+from bq_meta.util import bash_util
+from bq_meta.util.thread_utils import run_in_background
+
+RANK_LIMIT = 10000  # matches are ranked only up to this count, larger result sets keep the listing order
+PAGE = 10  # rows skipped by page up / page down
+
+
+class FuzzyIndex:
+    """
+    Choices joined into blobs (one per added page), every choice starts with a newline. A query is matched by one regex
+    scan of each blob (in C) instead of a python loop over the choices, longer queries only filter matches of the
+    shorter ones and pages added later are scanned only once per query.
+    """
+
+    def __init__(self, choices: Iterable[str] = ()) -> None:
+        self.choices: List[str] = []
+        self.chunks: List[Tuple[int, str, str]] = []  # (index of the first choice, blob, lower case blob)
+        self._matches: Dict[str, Tuple[List[int], int]] = {}  # query -> (matches, number of scanned chunks)
+        self.extend(list(choices))
+
+    def extend(self, choices: List[str]):
+        if not choices:
+            return
+        blob = "\n" + "\n".join(choices)
+        self.chunks.append((len(self.choices), blob, blob.lower()))
+        self.choices.extend(choices)
+
+    def search(self, query: str) -> List[int]:
+        """
+        Indexes of choices containing characters of the query in order, best matches first. Query is case sensitive
+        only if it contains upper case characters (smart case).
+        """
+        if not query:
+            self._matches.clear()
+            return list(range(len(self.choices)))
+        self._matches = {prefix: matches for prefix, matches in self._matches.items() if query.startswith(prefix)}
+        matches, scanned = self._matches.get(query, ([], 0))
+        if query not in self._matches:
+            prefix = max(self._matches, key=len, default=None)
+            if prefix is not None and len(self._matches[prefix][0]) < len(self.choices) // 8:
+                prefix_matches, scanned = self._matches[prefix]
+                matches = self._filter(query, prefix_matches)
+        if scanned < len(self.chunks):
+            matches = matches + self._scan(query, self.chunks[scanned:])
+        self._matches[query] = (matches, len(self.chunks))
+        return self._rank(query, matches)
+
+    def positions(self, query: str, choice: str) -> List[int]:
+        """
+        Positions of the query characters in the choice, first occurrence of every character
+        """
+        if _ignore_case(query):
+            choice = choice.lower()
+        positions = []
+        start = 0
+        for char in query:
+            start = choice.find(char, start)
+            if start < 0:
+                return []
+            positions.append(start)
+            start += 1
+        return positions
+
+    def _scan(self, query: str, chunks: List[Tuple[int, str, str]]) -> List[int]:
+        pattern = re.compile("\n" + self._pattern(query))
+        matches = []
+        for first, blob, lower_blob in chunks:
+            blob = lower_blob if _ignore_case(query) else blob
+            idx = first - 1
+            last = 0
+            for match in pattern.finditer(blob):
+                idx += blob.count("\n", last, match.start() + 1)  # newlines are cheaper to count than to index
+                last = match.start() + 1
+                matches.append(idx)
+        return matches
+
+    def _filter(self, query: str, matches: List[int]) -> List[int]:
+        pattern = re.compile(self._pattern(query), re.IGNORECASE if _ignore_case(query) else 0)
+        return [idx for idx in matches if pattern.match(self.choices[idx])]
+
+    def _rank(self, query: str, matches: List[int]) -> List[int]:
+        if len(matches) > RANK_LIMIT:
+            return matches
+        ignore_case = _ignore_case(query)
+
+        def rank(idx: int) -> tuple:
+            choice = self.choices[idx].lower() if ignore_case else self.choices[idx]
+            return query not in choice, len(choice)
+
+        return sorted(matches, key=rank)
+
+    def _pattern(self, query: str) -> str:
+        """
+        Negated classes make the scan linear, each character is searched only after the previous one is found
+        """
+        return "".join(f"[^{re.escape(char)}\\n]*{re.escape(char)}" for char in query)
+
+
+Describe = Callable[[str], Optional[str]]
+Refresh = Callable[[], Iterable[List[str]]]
+
+
+def pick_one(
+    choices: List[str],
+    live: Optional[Live],
+    picker: str = "builtin",
+    describe: Optional[Describe] = None,
+    title: Optional[str] = None,
+    reverse: bool = False,
+) -> Optional[str]:
+    """
+    With reverse the last choice is shown first, fzf always shows choices from the last one (--tac)
+    """
+    if reverse and not _fzf_available(picker):
+        choices = choices[::-1]
+    return pick_one_from_pages([choices], live, picker, describe, title)
+
+
+def pick_one_from_pages(
+    pages: Iterable[List[str]],
+    live: Optional[Live],
+    picker: str = "builtin",
+    describe: Optional[Describe] = None,
+    title: Optional[str] = None,
+    refresh: Optional[Refresh] = None,
+) -> Optional[str]:
+    """
+    Pick with the built-in picker, or with fzf if configured (and installed). Pages are consumed in the background,
+    picking starts with the first page. Consuming stops once picked, remaining pages are never fetched.
+    Description of the visible choices, the title and refresh (ctrl-r replaces the choices by pages of a new listing)
+    are supported only by the built-in picker.
+    """
+    if _fzf_available(picker):
+        return bash_util.pick_one(pages, live)
+    if picker == "fzf":
+        logger.warning("fzf is not installed, using built-in picker")
+    if live:
+        previous = live.renderable
+        result = _Picker(live, describe, title, refresh).pick(pages)
+        live.update(previous, refresh=True)
+    else:
+        with Live(auto_refresh=False, screen=True, transient=True) as live:
+            result = _Picker(live, describe, title, refresh).pick(pages)
+    return result
+
+
+def _fzf_available(picker: str) -> bool:
+    return picker == "fzf" and bool(shutil.which("fzf"))
+
+
+class _Picker:
+    def __init__(
+        self, live: Live, describe: Optional[Describe], title: Optional[str], refresh: Optional[Refresh] = None
+    ) -> None:
+        self.live = live
+        self.describe = describe
+        self.title = title
+        self.refresh = refresh
+        self.index = FuzzyIndex()
+        self.query = ""
+        self.matches: List[int] = []
+        self.selected = 0
+        self.loading = True
+        self.closed = False
+        self.lock = RLock()  # guards state and rendering, shared by the key loop and the pages producer
+
+    def pick(self, pages: Iterable[List[str]]) -> Optional[str]:
+        with self.lock:
+            self._render()
+        run_in_background(self._produce, pages, name="picker")
+        try:
+            while True:
+                char = readchar.readkey()
+                with self.lock:
+                    done, result = self._handle_key(char)
+                    if done:
+                        return result
+                    self._render()
+        finally:
+            with self.lock:
+                self.closed = True
+
+    def _produce(self, pages: Iterable[List[str]]):
+        try:
+            for page in pages:
+                with self.lock:
+                    if self.closed:
+                        return
+                    self.index.extend(page)
+                    self.matches = self.index.search(self.query)
+                    self._render()
+        except Exception as e:
+            logger.warning(f"Listing not completed: {e}")
+        finally:
+            with self.lock:
+                self.loading = False
+                if not self.closed:
+                    self._render()
+
+    def _handle_key(self, char: str) -> Tuple[bool, Optional[str]]:
+        match char:
+            case key.ENTER | key.CR | key.LF:
+                return True, self.index.choices[self.matches[self.selected]] if self.matches else None
+            case key.ESC | key.CTRL_C | key.CTRL_G:
+                return True, None
+            case key.UP | key.CTRL_P | key.CTRL_K:
+                self.selected = max(0, self.selected - 1)
+            case key.DOWN | key.CTRL_N:
+                self.selected = min(len(self.matches) - 1, self.selected + 1) if self.matches else 0
+            case key.PAGE_UP:
+                self.selected = max(0, self.selected - PAGE)
+            case key.PAGE_DOWN:
+                self.selected = min(len(self.matches) - 1, self.selected + PAGE) if self.matches else 0
+            case key.BACKSPACE if self.query:
+                self._search(self.query[:-1])
+            case key.CTRL_U:
+                self._search("")
+            case key.CTRL_R if self.refresh and not self.loading:
+                self._reload(self.refresh())
+            case _ if len(char) == 1 and char.isprintable():
+                self._search(self.query + char)
+        return False, None
+
+    def _search(self, query: str):
+        self.query = query
+        self.matches = self.index.search(query)
+        self.selected = 0
+
+    def _reload(self, pages: Iterable[List[str]]):
+        """
+        Choices are replaced by pages of a new listing, the query is kept
+        """
+        self.index = FuzzyIndex()
+        self.matches = []
+        self.selected = 0
+        self.loading = True
+        run_in_background(self._produce, pages, name="picker")
+
+    def _render(self):
+        self.selected = min(self.selected, max(0, len(self.matches) - 1))
+        height = self.live.console.size.height
+        panel = _picker_panel(
+            self.index,
+            self.query,
+            self.matches,
+            self.selected,
+            height,
+            self.loading,
+            self.describe,
+            self.title,
+            bool(self.refresh),
+        )
+        self.live.update(panel, refresh=True)
+
+
+def _picker_panel(
+    index: FuzzyIndex,
+    query: str,
+    matches: List[int],
+    selected: int,
+    height: int,
+    loading: bool = False,
+    describe: Optional[Describe] = None,
+    title: Optional[str] = None,
+    refreshable: bool = False,
+) -> Panel:
+    """
+    Only the visible window of matches around the selected one is rendered
+    """
+    rows = max(1, height - 5)  # borders, prompt and counter
+    first = max(0, selected - rows + 1)
+    lines = []
+    for position, idx in enumerate(matches[first : first + rows], start=first):
+        choice = index.choices[idx]
+        text = Text(choice, style=const.request_style if position == selected else "")
+        for char_position in index.positions(query, choice):
+            text.stylize(const.key_style, char_position, char_position + 1)
+        description = describe(choice) if describe else None
+        if description:
+            text.append(f"  {description}", style=const.darker_style)
+        lines.append(Text("> " if position == selected else "  ", style=const.request_style).append(text))
+    prompt = Text("> ", style=const.key_style).append(query).append("█", style=const.darker_style)
+    counter = Text(f"  {len(matches)}/{len(index.choices)}", style=const.darker_style)
+    if loading:
+        counter.append("  fetching...", style=const.info_style)
+    elif refreshable:
+        counter.append("  ctrl-r re-list", style=const.darker_style)
+    return Panel(
+        Group(prompt, counter, *lines),
+        title=title,
+        title_align="left",
+        border_style=const.border_style,
+        height=height,
+    )
+
+
+def _ignore_case(query: str) -> bool:
+    return query == query.lower()
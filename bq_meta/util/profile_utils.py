@@ -0,0 +1,229 @@
+import builtins
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+SAMPLE_INTERVAL = 0.01  # seconds, 100 samples per second
+IDLE_FRAMES = {  # (module, function) of the innermost frame of a background thread blocked in a wait
+    ("threading", "wait"),
+    ("threading", "_wait_for_tstate_lock"),
+    ("queue", "get"),
+    ("selectors", "select"),
+    ("socket", "accept"),
+    ("concurrent.futures.thread", "_worker"),  # idle pool worker, waiting for a work item
+}
+
+
+@dataclass
+class ImportTiming:
+    module: str
+    cumulative: float = 0.0  # seconds, including nested imports
+    own: float = 0.0  # seconds, excluding nested imports
+
+
+@dataclass
+class StartupProfiler:
+    """
+    Measures imports of newly loaded modules (by wrapping builtins.__import__) and named init spans, imports of
+    background threads are not measured
+    """
+
+    started: float = field(default_factory=time.perf_counter)
+    imports: Dict[str, ImportTiming] = field(default_factory=dict)
+    spans: List[tuple] = field(default_factory=list)  # (name, seconds)
+    _stack: List[ImportTiming] = field(default_factory=list)
+    _original_import = None
+    _thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.current_thread()
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._import
+        return self
+
+    def stop(self):
+        if self._original_import:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    @contextmanager
+    def span(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans.append((name, time.perf_counter() - start))
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level or name in sys.modules or threading.current_thread() is not self._thread:
+            return self._original_import(name, globals, locals, fromlist, level)
+        timing = ImportTiming(name)
+        self._stack.append(timing)
+        start = time.perf_counter()
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start
+            self._stack.pop()
+            timing.cumulative += elapsed
+            timing.own += elapsed
+            if self._stack:
+                self._stack[-1].own -= elapsed
+            self.imports.setdefault(name, ImportTiming(name))
+            self.imports[name].cumulative += timing.cumulative
+            self.imports[name].own += timing.own
+
+    def report(self, console, limit: int = 25):
+        from rich.table import Table
+        from rich.text import Text
+
+        from bq_meta import const
+
+        self.stop()
+        total = time.perf_counter() - self.started
+        imports = sorted(self.imports.values(), key=lambda timing: timing.cumulative, reverse=True)
+        table = Table(title="Imports", title_style=const.info_style, border_style=const.darker_style)
+        table.add_column("Module", style=const.key_style)
+        table.add_column("Cumulative", justify="right")
+        table.add_column("Own", justify="right")
+        for timing in imports[:limit]:
+            table.add_row(timing.module, _ms(timing.cumulative), _ms(timing.own))
+        spans = Table(title="Init", title_style=const.info_style, border_style=const.darker_style)
+        spans.add_column("Span", style=const.key_style)
+        spans.add_column("Time", justify="right")
+        for name, seconds in self.spans:
+            spans.add_row(name, _ms(seconds))
+        imports_total = sum(timing.own for timing in imports)
+        console.print(table, spans)
+        console.print(
+            Text("Startup profile", style=const.info_style).append(
+                f": {_ms(total)} total, {_ms(imports_total)} in {len(imports)} imports", style=const.darker_style
+            )
+        )
+
+
+class SamplingProfiler:
+    """
+    Samples stacks of all threads (sys._current_frames) from a background thread, at exit the samples are written as
+    folded stacks (one 'thread;frame;frame count' line per stack, flamegraph.pl and speedscope format). Samples of
+    background threads idling in a wait are dropped, the main thread is always sampled (waiting for a key included).
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL) -> None:
+        self.interval = interval
+        self.samples: Counter = Counter()  # (thread name, frames root first) -> count
+        self.started = time.perf_counter()
+        self.stopped: Optional[float] = None
+        self._labels: Dict[object, str] = {}  # code -> label
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self.stopped is None:
+            self._stop.set()
+            self._thread.join()
+            self.stopped = time.perf_counter()
+
+    def _run(self):
+        main_id = threading.main_thread().ident
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == self._thread.ident:
+                    continue
+                if thread_id != main_id and (frame.f_globals.get("__name__"), frame.f_code.co_name) in IDLE_FRAMES:
+                    continue
+                self.samples[(names.get(thread_id, str(thread_id)), self._stack(frame))] += 1
+
+    def _stack(self, frame) -> Tuple[str, ...]:
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                module = frame.f_globals.get("__name__", "?")
+                label = self._labels[code] = f"{module}:{getattr(code, 'co_qualname', code.co_name)}"
+            stack.append(label)
+            frame = frame.f_back
+        return tuple(reversed(stack))
+
+    def write(self, path: str):
+        with open(path, "w") as f:
+            for (thread, stack), count in self.samples.items():
+                f.write(f"{';'.join((thread, *stack))} {count}\n")
+
+    def report(self, console, path: str, limit: int = 15):
+        """
+        Functions of bq_meta modules by their samples, own samples are attributed to the innermost bq_meta frame
+        (time spent in libraries called by the function included)
+        """
+        from rich.table import Table
+        from rich.text import Text
+
+        from bq_meta import const
+
+        self.stop()
+        total = sum(self.samples.values())
+        own: Counter = Counter()
+        inclusive: Counter = Counter()
+        for (_, stack), count in self.samples.items():
+            functions = [label for label in stack if label.startswith("bq_meta")]
+            if functions:
+                own[functions[-1]] += count
+            for function in set(functions):
+                inclusive[function] += count
+        table = Table(title="Profile", title_style=const.info_style, border_style=const.darker_style)
+        table.add_column("Function", style=const.key_style)
+        table.add_column("Own", justify="right")
+        table.add_column("Total", justify="right")
+        for function, count in own.most_common(limit):
+            table.add_row(function, _percent(count, total), _percent(inclusive[function], total))
+        if own:
+            console.print(table)
+        console.print(
+            Text("Profile", style=const.info_style).append(
+                f": {total} samples in {self.stopped - self.started:.1f} s, folded stacks written to {path}",
+                style=const.darker_style,
+            )
+        )
+
+
+_profiler: Optional[StartupProfiler] = None
+
+
+def start_profiler() -> StartupProfiler:
+    """
+    Install the import hook, the running profiler is returned when it was already started by the entry point
+    """
+    global _profiler
+    if not _profiler:
+        _profiler = StartupProfiler().start()
+    return _profiler
+
+
+@contextmanager
+def span(name: str):
+    """
+    Named init span of the startup profiler, no-op when profiling is disabled
+    """
+    if _profiler:
+        with _profiler.span(name):
+            yield
+    else:
+        yield
+
+
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1000:.1f} ms"
+
+
+def _percent(count: int, total: int) -> str:
+    return f"{count / total:.1%}" if total else ""
@@ -0,0 +1,75 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import TYPE_CHECKING, Any, Callable, Dict, List
+
+from loguru import logger
+from rich.console import Console, ConsoleOptions, RenderableType, RenderResult
+from rich.segment import Segment
+
+from bq_meta.util import stats_utils, table_utils
+
+if TYPE_CHECKING:
+    from google.cloud import bigquery
+
+MAX_SIZE = 64  # renderables of recently viewed tables
+MAX_WIDTHS = 4  # rendered widths kept per renderable, the terminal is rarely resized more often
+
+
+class RenderCache:
+    """
+    Prebuilt renderables of recently viewed tables keyed by table id and etag, unchanged metadata is never formatted
+    twice. Least recently used renderables are evicted.
+    """
+
+    def __init__(self, max_size: int = MAX_SIZE) -> None:
+        self.max_size = max_size
+        self.lock = Lock()
+        self.entries: OrderedDict[tuple, Any] = OrderedDict()  # (kind, table id, etag) -> renderable
+
+    def get(self, kind: str, table: "bigquery.Table", build: Callable[[], Any]) -> Any:
+        key = (kind, table_utils.get_table_id(table), table.etag)
+        with self.lock:
+            if key in self.entries:
+                stats_utils.cache("render", True)
+                self.entries.move_to_end(key)
+                return self.entries[key]
+        stats_utils.cache("render", False)
+        logger.trace(f"Render cache miss: {key}")
+        value = build()
+        with self.lock:
+            self.entries[key] = value
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        return value
+
+    def rendered(self, kind: str, table: "bigquery.Table", build: Callable[[], RenderableType]) -> "RenderedLines":
+        """
+        Renderable which is rendered into lines once per width
+        """
+        return self.get(kind, table, lambda: RenderedLines(build()))
+
+    def invalidate(self, table: "bigquery.Table"):
+        """
+        Remove renderables of other versions (etags) of the table, renderables of the current version are kept
+        """
+        table_id = table_utils.get_table_id(table)
+        with self.lock:
+            for key in [key for key in self.entries if key[1] == table_id and key[2] != table.etag]:
+                del self.entries[key]
+
+
+class RenderedLines:
+    def __init__(self, renderable: RenderableType) -> None:
+        self.renderable = renderable
+        self.lines: Dict[int, List[List[Segment]]] = {}  # width -> rendered lines
+
+    def __rich_console__(self, console: Console, options: ConsoleOptions) -> RenderResult:
+        lines = self.lines.get(options.max_width)
+        if lines is None:
+            if len(self.lines) >= MAX_WIDTHS:
+                self.lines.clear()
+            lines = console.render_lines(self.renderable, options.update(height=None), pad=False)
+            self.lines[options.max_width] = lines
+        for line in lines:
+            yield from line
+            yield Segment.line()
@@ -2,7 +2,7 @@ from threading import Event
 from typing import Iterator
 from rich.console import Console
 
-from rich.progress import Progress, TextColumn, TimeElapsedColumn
+from rich.progress import BarColumn, Progress, TextColumn, TimeElapsedColumn
 from rich.live import Live
 from rich.panel import Panel
 from rich.layout import Layout
@@ -30,6 +30,22 @@ def progress(console: Console, name: str, iterator: Iterator) -> list:
     return result
 
 
+def bar_progress(console: Console) -> Progress:
+    """
+    Transient progress bars of tasks with known totals
+    """
+    return Progress(
+        TextColumn("[progress.description]{task.description}", style=const.info_style),
+        "•",
+        BarColumn(),
+        TextColumn("[progress.completed]{task.completed}/{task.total}"),
+        "•",
+        TimeElapsedColumn(),
+        console=console,
+        transient=True,
+    )
+
+
 def flash_panel(live: Live, layout: Layout, panel: Panel):
     event = Event()
     panel.border_style = const.request_style  # border will flash a short period of time
@@ -39,6 +55,7 @@ def flash_panel(live: Live, layout: Layout, panel: Panel):
         panel.border_style = const.border_style
         live.update(layout, refresh=True)
 
+
 def flash_content(live: Live, layout: Layout, panel: Panel):
     event = Event()
     panel.border_style = const.info_style  # border will flash a short period of time
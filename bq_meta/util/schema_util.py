@@ -0,0 +1,198 @@
+from dataclasses import dataclass
+from typing import List, Optional, Set
+
+from readchar import key
+from rich.console import Console, ConsoleOptions, RenderResult
+from rich.text import Text
+
+from bq_meta import const
+
+PAGE = 10  # rows skipped by page up / page down
+
+
+@dataclass
+class SchemaNode:
+    path: str
+    name: str
+    type: str
+    mode: str
+    depth: int
+    end: int  # index after the last nested node, nodes of a record are nodes[index + 1 : end]
+
+
+class SchemaBrowser:
+    """
+    Schema flattened into a pre-order list of nodes, only the rows fitting the view height are rendered. Collapsed
+    records are skipped as a whole (using their end index), search filters nodes by their path.
+    """
+
+    def __init__(self, title: str, fields: List[dict]) -> None:
+        self.title = title
+        self.nodes: List[SchemaNode] = []
+        self._flatten(fields)
+        self.lower_paths = [node.path.lower() for node in self.nodes]
+        self.expanded: Set[int] = set()
+        self.query = ""
+        self.searching = False  # query is being typed, keys go to the query
+        self.selected = 0  # position in rows
+        self.offset = 0  # position of the first rendered row
+        self.rows: List[int] = []  # indexes of visible nodes
+        self._update_rows()
+
+    def handle_key(self, char: str) -> bool:
+        """
+        Returns False for keys not used by the browser
+        """
+        if self.searching:
+            match char:
+                case key.ENTER | key.CR | key.LF:
+                    self.searching = False
+                case key.ESC:
+                    self.searching = False
+                    self._search("")
+                case key.BACKSPACE:
+                    self._search(self.query[:-1])
+                case _ if len(char) == 1 and char.isprintable():
+                    self._search(self.query + char)
+            return True
+        match char:
+            case "/":
+                self.searching = True
+            case key.ESC if self.query:
+                self._search("")
+            case key.UP | "k":
+                self.selected = max(0, self.selected - 1)
+            case key.DOWN | "j":
+                self.selected = min(len(self.rows) - 1, self.selected + 1)
+            case key.PAGE_UP:
+                self.selected = max(0, self.selected - PAGE)
+            case key.PAGE_DOWN:
+                self.selected = min(len(self.rows) - 1, self.selected + PAGE)
+            case key.HOME:
+                self.selected = 0
+            case key.END:
+                self.selected = len(self.rows) - 1
+            case key.ENTER | key.CR | key.LF | " " if self._selected_record() is not None:
+                self._toggle(self._selected_record())
+            case key.RIGHT if self._selected_record() is not None:
+                self._expand(self._selected_record())
+            case key.LEFT if self.rows and not self.query:
+                self._collapse(self.rows[self.selected])
+            case _:
+                return False
+        self.selected = max(0, self.selected)
+        return True
+
+    def selected_path(self) -> Optional[str]:
+        return self.nodes[self.rows[self.selected]].path if self.rows else None
+
+    def _flatten(self, fields: List[dict], parent: str = "", depth: int = 0):
+        for field in fields:
+            idx = len(self.nodes)
+            path = f"{parent}{field['name']}"
+            node = SchemaNode(path, field["name"], field.get("type"), field.get("mode", "NULLABLE"), depth, idx + 1)
+            self.nodes.append(node)
+            if field.get("fields"):
+                self._flatten(field["fields"], f"{path}.", depth + 1)
+                node.end = len(self.nodes)
+
+    def _update_rows(self):
+        """
+        Visible nodes, all matching nodes when searching, otherwise nodes of expanded records
+        """
+        if self.query:
+            query = self.query.lower()
+            self.rows = [idx for idx, path in enumerate(self.lower_paths) if query in path]
+        else:
+            rows = []
+            idx = 0
+            while idx < len(self.nodes):
+                rows.append(idx)
+                idx = idx + 1 if idx in self.expanded else self.nodes[idx].end
+            self.rows = rows
+        self.selected = min(self.selected, max(0, len(self.rows) - 1))
+
+    def _search(self, query: str):
+        selected = self.rows[self.selected] if self.rows else None
+        self.query = query
+        self._update_rows()
+        if not query and selected is not None:
+            self._reveal(selected)
+
+    def _selected_record(self) -> Optional[int]:
+        if not self.rows or self.query:
+            return None
+        idx = self.rows[self.selected]
+        return idx if self.nodes[idx].end > idx + 1 else None
+
+    def _toggle(self, idx: int):
+        if idx in self.expanded:
+            self._collapse(idx)
+        else:
+            self._expand(idx)
+
+    def _expand(self, idx: int):
+        self.expanded.add(idx)
+        self._update_rows()
+
+    def _collapse(self, idx: int):
+        """
+        Collapse the record, or the parent record when the node is not an expanded record
+        """
+        if idx not in self.expanded:
+            idx = self._parent(idx)
+            if idx is None:
+                return
+        self.expanded.discard(idx)
+        self._update_rows()
+        self.selected = self.rows.index(idx)
+
+    def _reveal(self, idx: int):
+        """
+        Expand all records containing the node and select it
+        """
+        parent = self._parent(idx)
+        while parent is not None:
+            self.expanded.add(parent)
+            parent = self._parent(parent)
+        self._update_rows()
+        self.selected = self.rows.index(idx)
+
+    def _parent(self, idx: int) -> Optional[int]:
+        depth = self.nodes[idx].depth
+        for parent in range(idx - 1, -1, -1):
+            if self.nodes[parent].depth < depth:
+                return parent
+        return None
+
+    def __rich_console__(self, console: Console, options: ConsoleOptions) -> RenderResult:
+        height = (options.height or console.size.height) - 2  # title and prompt
+        self.offset = min(self.offset, max(0, len(self.rows) - height))  # no empty rows after collapsing
+        self.offset = max(0, min(max(self.offset, self.selected - height + 1), self.selected))
+        yield Text(self.title, style=const.key_style).append(f"  {len(self.nodes)} columns", style=const.darker_style)
+        for position in range(self.offset, min(self.offset + height, len(self.rows))):
+            yield self._row(self.rows[position], position == self.selected)
+        if self.searching or self.query:
+            prompt = Text("/", style=const.key_style).append(self.query)
+            if self.searching:
+                prompt.append("█", style=const.darker_style)
+            yield prompt.append(f"  {len(self.rows)} matches", style=const.darker_style)
+
+    def _row(self, idx: int, selected: bool) -> Text:
+        node = self.nodes[idx]
+        if self.query:
+            text = Text(node.path)
+            start = self.lower_paths[idx].find(self.query.lower())
+            text.stylize(const.key_style, start, start + len(self.query))
+        else:
+            marker = ("▾ " if idx in self.expanded else "▸ ") if node.end > idx + 1 else "  "
+            text = Text("  " * node.depth + marker, style=const.darker_style).append(node.name)
+        text.append(f"  {node.type} {node.mode}", style=const.darker_style)
+        if selected:
+            text.stylize(const.request_style, 0, len(text) - len(node.type) - len(node.mode) - 3)
+            text = Text("> ", style=const.request_style).append(text)
+        else:
+            text = Text("  ").append(text)
+        text.no_wrap = True
+        text.overflow = "ellipsis"
+        return text
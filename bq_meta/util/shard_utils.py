@@ -0,0 +1,56 @@
+import re
+from typing import Dict, Iterable, Iterator, List, Optional
+
+# table_YYYYMMDD (or tableYYYYMMDD), same families as grouped by the BigQuery console
+SHARD_PATTERN = re.compile(r"^(?P<prefix>.+?)(?P<date>(19|20)\d\d(0[1-9]|1[0-2])(0[1-9]|[12]\d|3[01]))$")
+GROUP_SUFFIX = "*"
+
+
+class ShardGroups:
+    """
+    Date sharded tables grouped into a single 'prefix*' entry per family, other tables are kept as they are
+    """
+
+    def __init__(self) -> None:
+        self.groups: Dict[str, List[str]] = {}  # prefix* -> table ids of shards
+
+    def group_pages(self, pages: Iterable[List[str]]) -> Iterator[List[str]]:
+        """
+        Pages of table ids with shards replaced by their group, every group is yielded once (with its first shard)
+        """
+        for page in pages:
+            entries = []
+            for table_id in page:
+                group = self.add(table_id)
+                if group is None:
+                    entries.append(table_id)
+                elif len(self.groups[group]) == 1:
+                    entries.append(group)
+            yield entries
+
+    def add(self, table_id: str) -> Optional[str]:
+        """
+        Group of the table, None if it is not a shard
+        """
+        match = SHARD_PATTERN.match(table_id)
+        if not match:
+            return None
+        group = match.group("prefix") + GROUP_SUFFIX
+        self.groups.setdefault(group, []).append(table_id)
+        return group
+
+    def clear(self):
+        self.groups.clear()
+
+    def shards(self, group: str) -> List[str]:
+        return self.groups.get(group, [])
+
+    def describe(self, group: str) -> Optional[str]:
+        shards = self.groups.get(group)
+        if not shards:
+            return None
+        dates = [SHARD_PATTERN.match(table_id).group("date") for table_id in (min(shards), max(shards))]
+        return f"{len(shards)} shards, {dates[0]}..{dates[1]}" if len(shards) > 1 else dates[0]
+
+    def __contains__(self, group: str) -> bool:
+        return group in self.groups
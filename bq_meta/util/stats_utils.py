@@ -0,0 +1,261 @@
+import functools
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from loguru import logger
+
+from bq_meta import const
+
+
+@dataclass
+class Span:
+    name: str
+    items: int = 0  # results of the call (tables, datasets, members, ...)
+    bytes: int = 0  # response payload, http responses received within the span are added automatically
+
+
+@dataclass
+class SpanStats:
+    name: str
+    durations: List[float] = field(default_factory=list)  # seconds
+    errors: int = 0
+    items: int = 0
+    bytes: int = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": len(self.durations),
+            "errors": self.errors,
+            "total_ms": _ms(sum(self.durations)),
+            "p50_ms": _ms(percentile(sorted(self.durations), 50)),
+            "p95_ms": _ms(percentile(sorted(self.durations), 95)),
+            "max_ms": _ms(max(self.durations, default=0.0)),
+            "items": self.items,
+            "bytes": self.bytes,
+        }
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+
+    def to_dict(self) -> dict:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_ratio": round(self.hits / total, 3) if total else None}
+
+
+class SessionStats:
+    """
+    Timings, result counts and payload sizes of remote calls and render phases, and hits / misses of the caches,
+    aggregated over the session. Sizes of http responses are added to the innermost span of the receiving thread.
+    """
+
+    def __init__(self) -> None:
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.spans: Dict[str, SpanStats] = {}
+        self.caches: Dict[str, CacheStats] = {}
+        self.local = threading.local()
+
+    def record(self, span: Span, seconds: float, error: bool):
+        with self.lock:
+            stats = self.spans.setdefault(span.name, SpanStats(span.name))
+            stats.durations.append(seconds)
+            stats.errors += error
+            stats.items += span.items
+            stats.bytes += span.bytes
+
+    def cache(self, name: str, hit: bool):
+        with self.lock:
+            stats = self.caches.setdefault(name, CacheStats())
+            if hit:
+                stats.hits += 1
+            else:
+                stats.misses += 1
+
+    def stack(self) -> List[Span]:
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+        return self.local.stack
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            return {
+                "started": self.started,
+                "seconds": round(time.time() - self.started, 3),
+                "spans": {name: stats.to_dict() for name, stats in sorted(self.spans.items())},
+                "caches": {name: stats.to_dict() for name, stats in sorted(self.caches.items())},
+            }
+
+    def dump(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def report(self, console, path: Optional[str] = None):
+        from rich.table import Table
+        from rich.text import Text
+
+        from bq_meta.util.num_utils import bytes_fmt
+
+        stats = self.to_dict()
+        spans = Table(title="Calls", title_style=const.info_style, border_style=const.darker_style)
+        spans.add_column("Span", style=const.key_style)
+        for column in ["Calls", "Errors", "Total", "p50", "p95", "Max", "Items", "Bytes"]:
+            spans.add_column(column, justify="right")
+        for name, span in sorted(stats["spans"].items(), key=lambda item: item[1]["total_ms"], reverse=True):
+            spans.add_row(
+                name,
+                str(span["calls"]),
+                str(span["errors"] or ""),
+                f"{span['total_ms']:.1f} ms",
+                f"{span['p50_ms']:.1f} ms",
+                f"{span['p95_ms']:.1f} ms",
+                f"{span['max_ms']:.1f} ms",
+                str(span["items"] or ""),
+                bytes_fmt(span["bytes"]) if span["bytes"] else "",
+            )
+        caches = Table(title="Caches", title_style=const.info_style, border_style=const.darker_style)
+        caches.add_column("Cache", style=const.key_style)
+        for column in ["Hits", "Misses", "Hit ratio"]:
+            caches.add_column(column, justify="right")
+        for name, cache in stats["caches"].items():
+            ratio = f"{cache['hit_ratio']:.0%}" if cache["hit_ratio"] is not None else ""
+            caches.add_row(name, str(cache["hits"]), str(cache["misses"]), ratio)
+        console.print(*[table for table in (spans, caches) if table.row_count])
+        summary = Text("Session stats", style=const.info_style).append(
+            f": {stats['seconds']:.1f} s total", style=const.darker_style
+        )
+        if path:
+            summary.append(f", written to {path}", style=const.darker_style)
+        console.print(summary)
+
+
+_stats: Optional[SessionStats] = None
+
+
+def start_stats() -> SessionStats:
+    global _stats
+    _stats = SessionStats()
+    return _stats
+
+
+def enabled() -> bool:
+    return _stats is not None
+
+
+@contextmanager
+def span(name: str) -> Iterator[Span]:
+    """
+    Timed span of a remote call or render phase, logged at trace level and aggregated when stats are enabled
+    """
+    record = Span(name)
+    stats = _stats
+    if stats:
+        stats.stack().append(record)
+    start = time.perf_counter()
+    error = False
+    try:
+        yield record
+    except BaseException:
+        error = True
+        raise
+    finally:
+        _finish(stats, record, time.perf_counter() - start, error)
+
+
+def timed(name: str, suffix: Optional[Callable[..., str]] = None) -> Callable:
+    """
+    Decorated function runs inside a span, suffix of the span name (e.g. the rendered view) is derived from the call
+    arguments
+    """
+
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(f"{name}.{suffix(*args, **kwargs)}" if suffix else name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def pages(name: str, iterator: Any) -> Iterator[Any]:
+    """
+    Pages of an api iterator, fetch of every page is a span (counting its items)
+    """
+    page_iterator = iter(iterator.pages)
+    stats = _stats
+    while True:
+        record = Span(name)
+        if stats:
+            stats.stack().append(record)
+        start = time.perf_counter()
+        try:
+            page = next(page_iterator, None)
+        except BaseException:
+            _finish(stats, record, time.perf_counter() - start, True)
+            raise
+        if page is None:  # iterator knew there was no next page, nothing fetched
+            if stats:
+                stats.stack().pop()
+            return
+        record.items = page.num_items
+        _finish(stats, record, time.perf_counter() - start, False)
+        yield page
+
+
+def percentile(values: List[float], percent: int) -> float:
+    """
+    Nearest-rank percentile of sorted values
+    """
+    return values[percentile_rank(len(values), percent)] if values else 0.0
+
+
+def percentile_rank(count: int, percent: int) -> int:
+    """
+    Index of the nearest-rank percentile among count sorted values, shared by session stats and catalog percentiles
+    """
+    return max(0, min(count - 1, math.ceil(percent / 100 * count) - 1))
+
+
+def cache(name: str, hit: bool):
+    """
+    Count cache hit or miss, no-op when stats are disabled
+    """
+    if _stats:
+        _stats.cache(name, hit)
+
+
+def record_response(response, *args, **kwargs):
+    """
+    Response hook of the http session (requests), the response size is added to the innermost span of the thread
+    """
+    stats = _stats
+    if stats:
+        stack = stats.stack()
+        if stack:
+            stack[-1].bytes += len(response.content)
+    return response
+
+
+def _finish(stats: Optional[SessionStats], record: Span, seconds: float, error: bool):
+    logger.trace(
+        f"{record.name} took {seconds * 1000:.1f} ms"
+        + (f", {record.items} items" if record.items else "")
+        + (f", {record.bytes} bytes" if record.bytes else "")
+        + (", failed" if error else "")
+    )
+    if stats:
+        stats.stack().pop()
+        stats.record(record, seconds, error)
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 3)
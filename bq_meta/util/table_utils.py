@@ -1,36 +1,35 @@
 import json
-from typing import List
+from typing import TYPE_CHECKING, Iterator, List, Tuple
 
-from google.cloud import bigquery
-from google.cloud.bigquery.schema import SchemaField
-from rich.table import Table
-from rich.text import Text
-from rich.tree import Tree
+if TYPE_CHECKING:
+    from google.cloud import bigquery
 
 
-def scheme_table(schema: List[SchemaField], table: Table):
-    for field in schema:
-        table.add_row(field.field_type, field.mode)
-        if field.field_type == "RECORD":
-            scheme_table(field.fields, table)
-    return
+def column_paths(fields: List[dict], parent: str = "") -> Iterator[Tuple[str, str, str]]:
+    """
+    Path, type and mode of every column in the schema (api representation), nested columns as record.column
+    """
+    for field in fields:
+        path = f"{parent}{field['name']}"
+        yield path, field.get("type"), field.get("mode", "NULLABLE")
+        if field.get("fields"):
+            yield from column_paths(field["fields"], f"{path}.")
 
 
-def scheme_tree(schema: List[SchemaField], tree: Tree):
-    for field in schema:
-        node = tree.add(Text(f"{field.name}"))
-        if field.field_type == "RECORD":
-            scheme_tree(field.fields, node)
-    return
+def get_table_id(table: "bigquery.Table") -> str:
+    """
+    project:dataset.table, also for tables without full_table_id (built from a minimal api representation)
+    """
+    return f"{table.project}:{table.dataset_id}.{table.table_id}"
 
 
-def get_properties(table: bigquery.Table) -> str:
+def get_properties(table: "bigquery.Table") -> str:
     return json.dumps(table._properties, indent=2)
 
 
-def get_schema_json(table: bigquery.Table) -> str:
+def get_schema_json(table: "bigquery.Table") -> str:
     return json.dumps(table._properties.get("schema", {}).get("fields", {}))
 
 
-def get_table_link(table: bigquery.Table) -> str:
+def get_table_link(table: "bigquery.Table") -> str:
     return f"https://console.cloud.google.com/bigquery?p={table.project}&d={table.dataset_id}&t={table.table_id}&page=table"
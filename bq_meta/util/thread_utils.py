@@ -0,0 +1,21 @@
+from concurrent.futures import Future
+from threading import Thread
+from typing import Callable
+
+
+def run_in_background(fn: Callable, *args, name: str = "background") -> Future:
+    """
+    Run function in a daemon thread, unlike ThreadPoolExecutor it never blocks the interpreter exit
+    """
+    future = Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    Thread(target=run, name=name, daemon=True).start()
+    return future
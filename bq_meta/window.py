@@ -1,11 +1,12 @@
 import webbrowser
+from concurrent.futures import Future
 from dataclasses import dataclass
 from datetime import datetime
 from enum import Enum
-from typing import List, Optional
+from threading import RLock
+from typing import List, Optional, Set
 
 import click
-import pyperclip
 import readchar
 from google.cloud import bigquery
 from loguru import logger
@@ -19,9 +20,13 @@ from bq_meta.config import Config
 from bq_meta.service.history_service import HistoryService
 from bq_meta.service.iam_service import IamService
 from bq_meta.service.snippet_service import SnippetService
+from bq_meta.service.storage_service import StorageService
 from bq_meta.service.table_service import TableService
-from bq_meta.util import table_utils
+from bq_meta.util import stats_utils, table_utils
+from bq_meta.util.render_cache import RenderCache
+from bq_meta.util.schema_util import SchemaBrowser
 from bq_meta.util.rich_utils import flash_content, flash_panel
+from bq_meta.util.thread_utils import run_in_background
 
 
 class View(Enum):
@@ -32,6 +37,14 @@ class View(Enum):
     metadata = 5
     iam = 6
     error = 7
+    dataset = 8
+
+
+class Region(Enum):
+    header = 1
+    hints = 2
+    content = 3
+    list = 4
 
 
 class Metadata(Enum):
@@ -52,10 +65,13 @@ hint_schema = Hint("s", "Show schema")
 hint_snippets = Hint("p", "Show snippets")
 hint_metadata = Hint("m", "Show metadata")
 hint_iam = Hint("i", "Show iam")
+hint_dataset = Hint("d", "Show dataset")
 hint_history = Hint("h", "Show history")
 hint_open_browser = Hint("b", "Open in browser")
 
 hint_refresh = Hint("r", "Refresh")
+hint_search = Hint("/", "Search")
+hint_expand = Hint("enter", "Expand")
 hint_copy = Hint("c", "Copy")
 hint_quit = Hint("q", "Quit")
 
@@ -67,9 +83,12 @@ all_hints = [
     hint_snippets,
     hint_metadata,
     hint_iam,
+    hint_dataset,
     hint_history,
 ]
 
+DATASET_SUMMARY_LIMIT = 1000  # largest tables of the dataset paged through in the dataset view
+
 
 class Window:
     def __init__(
@@ -80,6 +99,7 @@ class Window:
         table_service: TableService,
         snippet_service: SnippetService,
         iam_service: IamService,
+        storage_service: StorageService,
     ):
         self.console = console
         self.config = config
@@ -87,10 +107,12 @@ class Window:
         self.table_service = table_service
         self.snippet_service = snippet_service
         self.iam_service = iam_service
+        self.storage_service = storage_service
         self.table: Optional[bigquery.Table] = None
         self.project_id: Optional[str] = None
         self.dataset_id: Optional[str] = None
         self.layout: Layout = Layout()
+        self.window_layout: Layout = Layout(name="window")
         self.content: Optional[RenderableType] = None
         self.view: View = View.empty
         self.hints: List[str] = []
@@ -98,29 +120,59 @@ class Window:
         self.values: List[str] = []
         self.selected_value: Optional[str] = None
         self.snippet: Optional[str] = None
+        self.dirty: Set[Region] = set(Region)
+        self.lock = RLock()  # guards state and rendering, shared by the key loop and prefetch callbacks
+        self.live: Optional[Live] = None
+        self.iam_future: Optional[Future] = None
+        self.iam_refetched = False  # iam future was started because prefetched members were no longer cached
+        self.schema_browser: Optional[SchemaBrowser] = None
+        self.render_cache = RenderCache()
+        self.dataset_future: Optional[Future] = None
+        self.dataset_key: Optional[str] = None  # project:dataset of the dataset future
 
     def live_window(self, table: Optional[bigquery.Table]):
         self.now = datetime.utcnow()
-        self.table = table
+        if table:
+            self._open_table(table)
+        self._build_layout()
         with Live(self.layout, auto_refresh=False, screen=True, transient=True) as live:
+            self.live = live
             self._loop(live)
 
+    def _build_layout(self):
+        """
+        Build layout skeleton once, regions are later updated in place
+        """
+        body_layout = Layout(name="body")
+        body_layout.split_row(
+            Layout(name=Region.hints.name, size=30),
+            Layout(name=Region.content.name),
+            Layout(name=Region.list.name, size=32, visible=False),
+        )
+        self.window_layout = Layout(name="window")
+        self.window_layout.split_column(output.header_layout(self.config), body_layout)
+        self.window_panel = output.window_panel(self.window_layout, self.now)
+        self.layout = Layout(self.window_panel)
+
+    @stats_utils.timed("window.content", lambda self, live: self.view.name)
     def _update_content(self, live: Live):
         logger.trace("Updated content")
+        hints, bottom_hints = self.hints, self.bottom_hints
         match self.view:
             case View.empty:
                 self.hints = [hint_open, hint_history]
             case View.table if self.table:
                 self.hints = all_hints
                 self.bottom_hints = [hint_refresh, hint_quit]
-                self.content = output.get_table_output(self.table)
-                self._update_table(self.table)
+                table = self.table
+                self.content = self.render_cache.rendered("table", table, lambda: output.get_table_output(table))
             case View.schema if self.table:
-                live.stop()
-                with self.console.pager():
-                    self.console.print(output.get_schema_output(self.table))
-                self.view = View.table
-                live.start()
+                self.hints = all_hints
+                self.bottom_hints = [hint_search, hint_expand, hint_copy, hint_quit]
+                title = table_utils.get_table_id(self.table)
+                fields = self.table._properties.get("schema", {}).get("fields", [])
+                self.schema_browser = self.render_cache.get("schema", self.table, lambda: SchemaBrowser(title, fields))
+                self.content = self.schema_browser
             case View.snippets if self.table:
                 self.hints = all_hints
                 self.bottom_hints = [hint_refresh, hint_copy, hint_quit]
@@ -137,84 +189,216 @@ class Window:
             case View.iam if self.table:
                 self.hints = all_hints
                 self.bottom_hints = [hint_refresh, hint_copy, hint_quit]
-                members = self.iam_service.get_role_members(self.table, self.selected_value)
-                self.content = output.get_members_output(members)
-
-    def _update_panel(self, live: Live) -> None:
-        window_layout = Layout(name="window")
-        body_layout = Layout(name="body")
-        hints_layout = output.hints_layout(self.hints, self.bottom_hints)
-        self.content_panel = output.content_panel(self.content)
-        content_layout = Layout(self.content_panel, name="content")
-        list_layout = output.list_layout(self.values, self.selected_value)
-        header_layout = output.header_layout(self.config)
-        body_layout.split_row(hints_layout, content_layout, list_layout)
-        window_layout.split_column(header_layout, body_layout)
-        self.window_panel = output.window_panel(window_layout, self.now)
-        self.layout = Layout(self.window_panel)
-        live.update(self.layout, refresh=True)
+                if not self.iam_future.done():
+                    self.content = output.get_loading_output("iam roles members")
+                elif self.iam_future.exception():
+                    self.content = output.get_error_output("Iam roles members failed", self.iam_future.exception())
+                elif self.iam_future.result():
+                    members = self.iam_service.get_role_members(self.table, self.selected_value)
+                    if members is None and not self.iam_refetched:  # expired or evicted since the prefetch
+                        self.content = output.get_loading_output("iam roles members")
+                        self._fetch_iam(self.table, refetch=True)
+                    elif members is None:  # not cached even after the refetch (cache disabled), not retried
+                        logger.warning(f"Iam members of {self.table.table_id} not cached after refetch")
+                        self.content = output.get_members_output([])
+                    else:
+                        self.iam_refetched = False
+                        self.content = output.get_members_output(members)
+                else:
+                    self.view = View.error
+                    self.values = []
+                    self.dirty.add(Region.list)
+                    self.content = output.get_missing_assets_permission_output(self.config, self.table)
+            case View.dataset if self.table:
+                self.hints = all_hints
+                self.bottom_hints = [hint_refresh, hint_quit]
+                if not self.dataset_future.done():
+                    self.content = output.get_loading_output("dataset summary")
+                elif self.dataset_future.exception():
+                    self.content = output.get_error_output("Dataset summary failed", self.dataset_future.exception())
+                else:
+                    summary = self.dataset_future.result()
+                    page_size = max(5, self.console.size.height - 26)  # header, totals and table borders
+                    if not self.values and summary["tables"]:
+                        count = len(summary["tables"])
+                        self.values = [
+                            f"{first + 1}-{min(first + page_size, count)}" for first in range(0, count, page_size)
+                        ]
+                        self.selected_value = self.values[0]
+                        self.dirty.add(Region.list)
+                    first = self.values.index(self.selected_value) * page_size if self.values else 0
+                    self.content = output.get_dataset_summary_output(summary, first, page_size)
+        if (hints, bottom_hints) != (self.hints, self.bottom_hints):
+            self.dirty.add(Region.hints)
+
+    @stats_utils.timed("window.render")
+    def _render(self, live: Live) -> None:
+        """
+        Re-render only dirty regions of the layout
+        """
+        if not self.dirty:
+            return
+        logger.trace(f"Render {sorted(region.name for region in self.dirty)}")
+        if Region.header in self.dirty:
+            self.window_panel.title = output.window_title(self.now)
+            self.window_layout["version"].update(output.version_text(self.config))
+        if Region.hints in self.dirty:
+            self.window_layout[Region.hints.name].update(output.hints_panel(self.hints, self.bottom_hints))
+        if Region.content in self.dirty:
+            self.content_panel = output.content_panel(self.content)
+            self.window_layout[Region.content.name].update(self.content_panel)
+        if Region.list in self.dirty:
+            list_layout = self.window_layout[Region.list.name]
+            list_layout.update(output.list_panel(self.values, self.selected_value))
+            list_layout.visible = bool(self.values and self.selected_value)
+        self.dirty.clear()
+        with stats_utils.span("window.draw"):
+            live.update(self.layout, refresh=True)
+
+    def _open_table(self, table: bigquery.Table):
+        """
+        Switch to the opened table, update table identifiers to the state, save table to the history
+        """
+        self.view = View.table
+        self.table = table
+        self.project_id = table.project
+        self.dataset_id = table.dataset_id
+        self.history_service.save_table(table)
+        self._prefetch(table)
 
-    def _update_table(self, table: Optional[bigquery.Table]):
+    def _prefetch(self, table: bigquery.Table, fresh: bool = False):
         """
-        Update table identifiers to the state, save table to the history
+        Start fetching slow per-table data in the background, views render it once it's done
         """
-        if table:
-            self.table = table
-            self.project_id = table.project
-            self.dataset_id = table.dataset_id
-            self.history_service.save_table(table)
+        self._fetch_iam(table, fresh)
+        fresh_future = run_in_background(self.table_service.revalidate_table, table, name="prefetch-table")
+        fresh_future.add_done_callback(lambda future: self._on_revalidated(table, future))
+
+    def _fetch_iam(self, table: bigquery.Table, fresh: bool = False, refetch: bool = False):
+        self.iam_refetched = refetch
+        self.iam_future = run_in_background(
+            self.iam_service.fetch_all_roles_members, table, self.config.iam_roles, fresh, name="prefetch-iam"
+        )
+        self.iam_future.add_done_callback(lambda _: self._on_prefetched(table, View.iam))
+
+    def _fetch_dataset_summary(self, table: bigquery.Table, fresh: bool = False):
+        """
+        Storage summary of the table's dataset, fetched in the background once per dataset (or on refresh)
+        """
+        dataset_key = f"{table.project}:{table.dataset_id}"
+        future = self.dataset_future
+        if not fresh and future and self.dataset_key == dataset_key and not (future.done() and future.exception()):
+            return
+        self.dataset_key = dataset_key
+        self.dataset_future = run_in_background(
+            self.storage_service.get_dataset_summary,
+            table.project,
+            table.dataset_id,
+            "physical",
+            DATASET_SUMMARY_LIMIT,
+            table.location,
+            fresh,
+            name="dataset-summary",
+        )
+        self.dataset_future.add_done_callback(self._on_dataset_summary)
+
+    def _on_dataset_summary(self, future: Future):
+        with self.lock:
+            if future is self.dataset_future and self.view == View.dataset and self.live:
+                self.dirty.update([Region.content, Region.list])
+                self._update_content(self.live)
+                self._render(self.live)
+
+    def _on_prefetched(self, table: bigquery.Table, view: View):
+        with self.lock:
+            same_table = self.table and table_utils.get_table_id(self.table) == table_utils.get_table_id(table)
+            if same_table and self.view == view and self.live:  # table may be replaced by its revalidated version
+                self.dirty.update([Region.content, Region.list])
+                self._update_content(self.live)
+                self._render(self.live)
+
+    def _on_revalidated(self, table: bigquery.Table, future: Future):
+        try:
+            fresh_table = future.result()
+        except Exception as e:
+            logger.warning(f"Table {table.full_table_id} not revalidated: {e}")
+            fresh_table = None
+        with self.lock:
+            if fresh_table and self.table is table:
+                self.table = fresh_table
+                self.render_cache.invalidate(fresh_table)
+                if self.view in (View.table, View.schema) and self.live:  # both are rendered from the table
+                    self.dirty.add(Region.content)
+                    self._update_content(self.live)
+                    self._render(self.live)
 
     def _loop(self, live: Live):
         """
-        Loop listening on specific keypress, updating live CLI
+        Loop listening on specific keypress, updating live CLI, until quitted (q)
         """
-        self._update_content(live)
-        self._update_panel(live)
-        char = readchar.readkey()
+        while True:
+            with self.lock:
+                if Region.content in self.dirty:
+                    self._update_content(live)
+                self._render(live)
+            char = readchar.readkey()
+            with self.lock:
+                self._handle_key(char, live)
+
+    def _handle_key(self, char: str, live: Live):
+        """
+        Update state for the pressed key, marking affected regions as dirty
+        """
+        if self.view == View.schema and self.schema_browser and self.schema_browser.handle_key(char):
+            self.dirty.add(Region.content)
+            return
         match char:
             case "t" | key.BACKSPACE | key.ESC:
                 logger.trace("Table view")
                 self.view = View.table
                 self.values = []
                 self.selected_value = None
+                self.dirty.update([Region.content, Region.list])
 
             case key.UP if self.values and self.selected_value:
                 idx = max([0, self.values.index(self.selected_value) - 1])
-                self.selected_value = self.values[idx]
+                self._select_value(self.values[idx])
 
             case key.DOWN if self.values and self.selected_value:
                 idx = min([len(self.values) - 1, self.values.index(self.selected_value) + 1])
-                self.selected_value = self.values[idx]
+                self._select_value(self.values[idx])
 
             # List projects / Open new table
             case "1" | "o":
                 logger.trace(f"Pressed 'o' ({hint_open.name})")
-                self.view = View.table
-                self.table = self.table_service.get_table(live=live)
+                table = self.table_service.get_table(live=live)
+                if table:
+                    self._open_table(table)
+                self.dirty.update(Region)  # picker leaves the screen, repaint everything
 
             # List datasets
             case "2":
                 logger.trace("Pressed '2' (List datasets)")
                 table = self.table_service.get_table(self.project_id, live=live)
                 if table:
-                    self.view = View.table
-                    self.table = table
+                    self._open_table(table)
+                self.dirty.update(Region)
 
             # List tables
             case "3":
                 logger.trace("Pressed '3' (List tables)")
                 table = self.table_service.get_table(self.project_id, self.dataset_id, live=live)
                 if table:
-                    self.view = View.table
-                    self.table = table
+                    self._open_table(table)
+                self.dirty.update(Region)
 
             # List history
             case "h":
                 logger.trace(f"Pressed 'h' ({hint_history.name})")
                 table = self.history_service.pick_table(live)
                 if table:
-                    self.view = View.table
-                    self.table = table
+                    self._open_table(table)
+                self.dirty.update(Region)
 
             # Refresh content
             case "r" if self.table:
@@ -222,12 +406,20 @@ class Window:
                 flash_panel(live, self.layout, self.window_panel)
                 self.now = datetime.utcnow()
                 self.table = self.table_service.get_fresh_table(self.table)
+                if self.table:
+                    self.render_cache.invalidate(self.table)
+                    self._prefetch(self.table, fresh=True)
+                    if self.view == View.dataset:
+                        self.values = []
+                        self._fetch_dataset_summary(self.table, fresh=True)
+                self.dirty.update([Region.header, Region.content])
 
             # Show schema view
             case "s" if self.table:
                 logger.trace(f"Pressed 's' ({hint_schema.name})")
                 self.values = []
                 self.view = View.schema
+                self.dirty.update([Region.content, Region.list])
 
             # Open in browser
             case "b" if self.table:
@@ -244,8 +436,12 @@ class Window:
                         copy_content = self.content
                     case View.table:
                         copy_content = table_utils.get_properties(self.table)
+                    case View.schema if self.schema_browser:
+                        copy_content = self.schema_browser.selected_path()
                 if copy_content:
                     flash_content(live, self.layout, self.content_panel)
+                    import pyperclip
+
                     pyperclip.copy(copy_content)
 
             # Show metadata
@@ -254,18 +450,24 @@ class Window:
                 self.view = View.metadata
                 self.values = [Metadata.table_id.name, Metadata.link.name, Metadata.schema.name]
                 self.selected_value = Metadata.table_id.name
+                self.dirty.update([Region.content, Region.list])
 
-            # Show iam
+            # Show iam, prefetched when the table was opened
             case "i" if self.table:
                 logger.trace(f"Pressed 'i' ({hint_iam.name})")
-                iam_result = self.iam_service.fetch_all_roles_members(self.table, self.config.iam_roles)
-                if iam_result:
-                    self.view = View.iam
-                    self.values = self.config.iam_roles
-                    self.selected_value = self.config.iam_roles[0]
-                else:
-                    self.view = View.error
-                    self.content = output.get_missing_assets_permission_output(self.config, self.table)
+                self.view = View.iam
+                self.values = self.config.iam_roles
+                self.selected_value = self.config.iam_roles[0]
+                self.dirty.update([Region.content, Region.list])
+
+            # Show storage summary of the dataset
+            case "d" if self.table:
+                logger.trace(f"Pressed 'd' ({hint_dataset.name})")
+                self.view = View.dataset
+                self.values = []
+                self.selected_value = None
+                self._fetch_dataset_summary(self.table)
+                self.dirty.update([Region.content, Region.list])
 
             # Show snippets view
             case "p" if self.table:
@@ -274,6 +476,7 @@ class Window:
                 snippets = self.snippet_service.list_snippets()
                 self.values = snippets
                 self.selected_value = snippets[0] if snippets else None
+                self.dirty.update([Region.content, Region.list])
 
             # Quit
             case "q":
@@ -281,5 +484,7 @@ class Window:
                 live.stop()
                 click.get_current_context().exit()
 
-        # Infinite loop, until quitted (q)
-        self._loop(live)
+    def _select_value(self, value: str):
+        if value != self.selected_value:
+            self.selected_value = value
+            self.dirty.update([Region.content, Region.list])
@@ -0,0 +1,34 @@
+import os
+import tempfile
+
+# before bq_meta.const is imported, tests never touch the real BQ_META_HOME
+os.environ["BQ_META_HOME"] = tempfile.mkdtemp(prefix="bq-meta-test-")
+
+import pytest  # noqa: E402
+
+from bq_meta.config import Config  # noqa: E402
+
+
+class Clock:
+    """
+    Stand-in for the time module of the tested module, time moves only when the test moves it
+    """
+
+    def __init__(self, now: float = 1_700_000_000.0) -> None:
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def config(tmp_path) -> Config:
+    config = Config()
+    config.config_path = str(tmp_path / "config.yaml")
+    config.write_default()
+    return config
+
+
+@pytest.fixture
+def clock() -> Clock:
+    return Clock()
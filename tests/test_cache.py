@@ -0,0 +1,141 @@
+import os
+
+import pytest
+
+from bq_meta.service import cache_service
+from bq_meta.service.cache_service import CacheService
+from bq_meta.util import cache_utils
+from bq_meta.util.cache_utils import TtlLruCache
+
+
+@pytest.fixture
+def cache(config, tmp_path) -> CacheService:
+    cache = CacheService(config)
+    cache.tables_path = str(tmp_path / "cache" / "tables")
+    return cache
+
+
+def _properties(table_id: str, padding: int = 0) -> dict:
+    return {
+        "etag": f"etag-{table_id}",
+        "tableReference": {"projectId": "p", "datasetId": "d", "tableId": table_id},
+        "description": "x" * padding,
+    }
+
+
+def _ttl_cache(path=None, max_size: int = 2, ttl: int = 60) -> TtlLruCache:
+    return TtlLruCache(max_size=lambda: max_size, ttl=lambda: ttl, path=path)
+
+
+def test_put_and_get(cache):
+    cache.put("p.d.t", _properties("t"))
+    entry = cache.get("p.d.t")
+    assert entry.properties == _properties("t")
+    assert entry.etag == "etag-t"
+    assert cache.get("p.d.missing") is None
+
+
+def test_legacy_and_standard_ids_share_entry(cache):
+    cache.put("p:d.t", _properties("t"))
+    assert cache.get("p.d.t") is not None
+    assert cache.cached_table_strs() == {"p.d.t"}
+
+
+def test_entry_expires_after_ttl(cache, config, clock, monkeypatch):
+    monkeypatch.setattr(cache_service, "time", clock)
+    config.update({"cache_ttl": 60})
+    cache.put("p.d.t", _properties("t"))
+    clock.now += 60
+    assert not cache.is_expired(cache.get("p.d.t"))
+    clock.now += 1
+    assert cache.is_expired(cache.get("p.d.t"))
+
+
+def test_touch_renews_entry(cache, clock, monkeypatch):
+    monkeypatch.setattr(cache_service, "time", clock)
+    cache.put("p.d.t", _properties("t"))
+    clock.now += 100
+    cache.touch("p.d.t")
+    entry = cache.get("p.d.t")
+    assert entry.fetched == clock.now
+    assert entry.properties == _properties("t")
+
+
+def test_corrupted_entry_is_removed(cache):
+    cache.put("p.d.t", _properties("t"))
+    with open(cache._path("p.d.t"), "w") as f:
+        f.write("{")
+    assert cache.get("p.d.t") is None
+    assert not os.path.exists(cache._path("p.d.t"))
+
+
+def test_evicts_least_recently_used_tables(cache, config):
+    config.update({"cache_size": 2600})  # two entries fit, also after evicting to 90 %
+    cache.put("p.d.a", _properties("a", 1000))
+    cache.put("p.d.b", _properties("b", 1000))
+    os.utime(cache._path("p.d.a"), (100, 100))
+    os.utime(cache._path("p.d.b"), (200, 200))
+    cache.get("p.d.a")  # a becomes the most recently used
+    cache.put("p.d.c", _properties("c", 1000))
+    assert cache.cached_table_strs() == {"p.d.a", "p.d.c"}
+
+
+def test_removed_entry_is_not_counted(cache, config):
+    config.update({"cache_size": 2600})
+    cache.put("p.d.a", _properties("a", 1000))
+    cache.put("p.d.b", _properties("b", 1000))
+    cache.remove("p.d.a")
+    cache.put("p.d.c", _properties("c", 1000))
+    assert cache.cached_table_strs() == {"p.d.b", "p.d.c"}
+
+
+def test_ttl_lru_evicts_least_recently_used():
+    cache = _ttl_cache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # a becomes the most recently used
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+
+
+def test_ttl_lru_put_replaces_value():
+    cache = _ttl_cache(max_size=2)
+    cache.put("a", 1)
+    cache.put("a", 2)
+    cache.put("b", 3)
+    assert (cache.get("a"), cache.get("b")) == (2, 3)
+
+
+def test_ttl_lru_expires_entries(clock, monkeypatch):
+    monkeypatch.setattr(cache_utils, "time", clock)
+    cache = _ttl_cache(ttl=60)
+    cache.put("a", 1)
+    clock.now += 60
+    assert cache.get("a") == 1
+    clock.now += 1
+    assert cache.get("a") is None
+    assert "a" not in cache.entries
+
+
+def test_ttl_lru_invalidate():
+    cache = _ttl_cache(max_size=3)
+    for key in ("p:d1:physical", "p:d1:rows", "p:d2:physical"):
+        cache.put(key, key)
+    cache.invalidate(lambda key: key.startswith("p:d1:"))
+    assert list(cache.entries) == ["p:d2:physical"]
+
+
+def test_ttl_lru_is_persisted(tmp_path):
+    path = str(tmp_path / "cache" / "iam.json")  # cache directory doesn't exist yet
+    _ttl_cache(path).put("table", {"roles/viewer": ["user:a@example.com"]})
+    assert _ttl_cache(path).get("table") == {"roles/viewer": ["user:a@example.com"]}
+
+
+def test_ttl_lru_ignores_corrupted_file(tmp_path):
+    path = tmp_path / "iam.json"
+    path.write_text("{")
+    cache = _ttl_cache(str(path))
+    assert cache.get("table") is None
+    cache.put("table", [])
+    assert _ttl_cache(str(path)).get("table") == []
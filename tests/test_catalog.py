@@ -0,0 +1,157 @@
+from typing import List, Optional
+
+import pytest
+
+from bq_meta.service import catalog_service
+from bq_meta.service.catalog_service import CatalogService, migrations
+
+
+@pytest.fixture
+def catalog(config, tmp_path) -> CatalogService:
+    catalog = CatalogService(config)
+    catalog.catalog_path = str(tmp_path / "catalog.db")
+    yield catalog
+    if catalog._connection:
+        catalog._connection.close()
+
+
+def _table(
+    table_id: str,
+    etag: str = "e1",
+    fields: Optional[List[dict]] = None,
+    description: Optional[str] = None,
+    labels: Optional[dict] = None,
+    physical: int = 0,
+) -> dict:
+    return {
+        "tableReference": {"projectId": "p", "datasetId": "d", "tableId": table_id},
+        "etag": etag,
+        "type": "TABLE",
+        "description": description,
+        "labels": labels or {},
+        "numRows": "10",
+        "numTotalPhysicalBytes": str(physical),
+        "schema": {"fields": fields if fields is not None else [{"name": "id", "type": "INTEGER"}]},
+    }
+
+
+def _columns(rows) -> List[str]:
+    return [f"{table_id}.{path}" for _, _, table_id, path, _, _ in rows]
+
+
+def test_new_catalog_has_final_schema(catalog):
+    connection = catalog.connection
+    assert connection.execute("PRAGMA user_version").fetchone()[0] == len(migrations)
+    columns = [row[1] for row in connection.execute("PRAGMA table_info(datasets)")]
+    assert columns == ["project_id", "dataset_id", "tables_count", "tables_created"]
+
+
+def test_migrated_catalog_is_reopened(catalog, config):
+    catalog.save_datasets("p", ["d"])
+    catalog._connection.close()
+    reopened = CatalogService(config)
+    reopened.catalog_path = catalog.catalog_path
+    assert reopened.list_datasets("p") == ["d"]
+    reopened.connection.close()
+
+
+def test_listing_is_stale_after_ttl(catalog, config, clock, monkeypatch):
+    monkeypatch.setattr(catalog_service, "time", clock)
+    config.update({"catalog_ttl": 60})
+    assert catalog.list_datasets("p") is None
+    catalog.save_datasets("p", ["b", "a"])
+    assert catalog.list_datasets("p") == ["a", "b"]
+    clock.now += 61
+    assert catalog.list_datasets("p") is None
+    assert catalog.list_datasets("p", fresh=False) == ["a", "b"]
+    catalog.touch_listing("p", catalog_service.PROJECT_LISTING)
+    assert catalog.list_datasets("p") == ["a", "b"]
+
+
+def test_removed_dataset_drops_its_tables(catalog):
+    catalog.save_datasets("p", ["a", "b"])
+    catalog.save_tables("p", "a", ["t1", "t2"])
+    catalog.save_datasets("p", ["b"])
+    assert catalog.list_datasets("p") == ["b"]
+    assert catalog.count_tables("p", "a") == 0
+
+
+def test_tables_listing_replaces_previous(catalog):
+    assert catalog.list_tables("p", "d") is None
+    assert not catalog.is_listed("p", "d")
+    catalog.save_tables("p", "d", ["t2", "t1"])
+    catalog.save_tables("p", "d", ["t3", "t1"])
+    assert catalog.list_tables("p", "d") == ["t1", "t3"]
+    assert catalog.is_listed("p", "d")
+
+
+def test_dataset_state(catalog):
+    assert catalog.get_dataset_state("p", "d") == (None, None)
+    catalog.save_datasets("p", ["d"])
+    catalog.save_dataset_state("p", "d", 3, 1_700_000_000_000)
+    assert catalog.get_dataset_state("p", "d") == (3, 1_700_000_000_000)
+
+
+def test_find_columns_by_name_prefix_and_path(catalog):
+    fields = [
+        {"name": "User_Id", "type": "STRING"},
+        {"name": "user", "type": "RECORD", "fields": [{"name": "id", "type": "INTEGER"}]},
+        {"name": "a_b", "type": "RECORD", "fields": [{"name": "c", "type": "STRING"}]},
+        {"name": "axb", "type": "RECORD", "fields": [{"name": "c", "type": "STRING"}]},
+    ]
+    catalog.save_table_metadata([_table("t", fields=fields)])
+    assert _columns(catalog.find_columns("user_id")) == ["t.User_Id"]
+    assert _columns(catalog.find_columns("user*")) == ["t.User_Id", "t.user"]
+    assert _columns(catalog.find_columns("user.id")) == ["t.user.id"]
+    assert _columns(catalog.find_columns("id")) == ["t.user.id"]
+    assert _columns(catalog.find_columns("a_b.c")) == ["t.a_b.c"]  # '_' is not a wildcard
+    assert _columns(catalog.find_columns("a%.c")) == []
+    assert _columns(catalog.find_columns("a*.c")) == ["t.a_b.c", "t.axb.c"]
+    assert len(catalog.find_columns("*", limit=2)) == 2
+
+
+def test_metadata_is_reindexed_only_when_etag_changes(catalog):
+    catalog.save_table_metadata([_table("t", etag="e1")])
+    catalog.save_table_metadata([_table("t", etag="e1", fields=[{"name": "other", "type": "STRING"}])])
+    assert _columns(catalog.find_columns("id")) == ["t.id"]
+    catalog.save_table_metadata([_table("t", etag="e2", fields=[{"name": "other", "type": "STRING"}])])
+    assert _columns(catalog.find_columns("id")) == []
+    assert _columns(catalog.find_columns("other")) == ["t.other"]
+
+
+def test_tables_listing_drops_metadata_of_removed_tables(catalog):
+    catalog.save_table_metadata([_table("t1"), _table("t2")])
+    catalog.save_tables("p", "d", ["t1"])
+    assert _columns(catalog.find_columns("id")) == ["t1.id"]
+
+
+def test_table_stats_filtered_by_labels_and_description(catalog):
+    catalog.save_table_metadata(
+        [
+            _table("t1", description="100% done", labels={"team": "a"}, physical=1),
+            _table("t2", description="1000 rows", labels={"team": "b"}, physical=2),
+            _table("t3", description="a_b", labels={"env": "prod"}, physical=3),
+            _table("t4", description="axb", physical=4),
+        ]
+    )
+
+    def table_ids(labels, description=None) -> List[str]:
+        return [row["table_id"] for row in catalog.list_table_stats(labels, description, "physical", None)]
+
+    assert table_ids([]) == ["t4", "t3", "t2", "t1"]
+    assert table_ids([("team", None)]) == ["t2", "t1"]
+    assert table_ids([("team", "a")]) == ["t1"]
+    assert table_ids([], "100%") == ["t1"]
+    assert table_ids([], "a_b") == ["t3"]
+    assert table_ids([("team", None)], "rows") == ["t2"]
+
+
+def test_stats_percentiles_are_nearest_rank(catalog):
+    catalog.save_table_metadata([_table(f"t{idx}", physical=idx) for idx in range(1, 11)])
+    stats = catalog.get_stats_percentiles([], None, "physical", (50, 90, 99))
+    assert stats == {"count": 10, "sum": 55, "min": 1, "p50": 5, "p90": 9, "p99": 10, "max": 10}
+
+
+def test_stats_percentiles_of_no_tables(catalog):
+    stats = catalog.get_stats_percentiles([], "missing", "physical", (50,))
+    assert stats == {"count": 0, "sum": 0, "min": None, "p50": None, "max": None}
@@ -0,0 +1,79 @@
+import io
+
+import pytest
+from google.cloud.bigquery.table import Table
+from rich.console import Console
+
+from bq_meta.service import history_service
+from bq_meta.service.history_service import HistoryService
+
+
+@pytest.fixture
+def history_path(tmp_path) -> str:
+    path = tmp_path / "history"
+    path.write_text("")
+    return str(path)
+
+
+def _history(config, history_path: str) -> HistoryService:
+    history = HistoryService(Console(file=io.StringIO()), config, table_service=None)
+    history.history_path = history_path
+    return history
+
+
+def _table(table_id: str) -> Table:
+    project_id, _, dataset_table = table_id.partition(":")
+    dataset_id, _, name = dataset_table.partition(".")
+    reference = {"projectId": project_id, "datasetId": dataset_id, "tableId": name}
+    return Table.from_api_repr({"id": table_id, "tableReference": reference})
+
+
+def _lines(history_path: str) -> list:
+    with open(history_path) as f:
+        return f.read().splitlines()
+
+
+def test_opened_tables_are_appended_and_deduplicated(config, history_path):
+    history = _history(config, history_path)
+    for table_id in ("p:d.a", "p:d.b", "p:d.a"):
+        history.save_table(_table(table_id))
+    assert history.list_tables() == ["p:d.b", "p:d.a"]  # least recent first
+    assert _lines(history_path) == ["p:d.a", "p:d.b", "p:d.a"]
+    assert _history(config, history_path).list_tables() == ["p:d.b", "p:d.a"]
+
+
+def test_log_is_compacted_once_it_grows(config, history_path, monkeypatch):
+    monkeypatch.setattr(history_service, "COMPACT_MIN_LINES", 4)
+    history = _history(config, history_path)
+    for table_id in ("p:d.a", "p:d.b", "p:d.a", "p:d.b"):
+        history.save_table(_table(table_id))
+    assert len(_lines(history_path)) == 4
+    history.save_table(_table("p:d.a"))
+    assert _lines(history_path) == ["p:d.b", "p:d.a"]
+
+
+def test_removed_table_is_dropped_from_log(config, history_path):
+    history = _history(config, history_path)
+    for table_id in ("p:d.a", "p:d.b", "p:d.a"):
+        history.save_table(_table(table_id))
+    history.remove_table("p:d.a")
+    assert history.list_tables() == ["p:d.b"]
+    assert _lines(history_path) == ["p:d.b"]
+
+
+def test_compaction_keeps_tables_appended_by_other_process(config, history_path):
+    first = _history(config, history_path)
+    first.save_table(_table("p:d.a"))
+    second = _history(config, history_path)
+    second.save_table(_table("p:d.b"))
+    first.remove_table("p:d.a")
+    assert _lines(history_path) == ["p:d.b"]
+    assert first.list_tables() == ["p:d.b"]
+
+
+def test_entry_is_appended_after_unterminated_line(config, history_path):
+    with open(history_path, "w") as f:
+        f.write("p:d.a")
+    history = _history(config, history_path)
+    history.save_table(_table("p:d.b"))
+    assert _lines(history_path) == ["p:d.a", "p:d.b"]
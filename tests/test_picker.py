@@ -0,0 +1,131 @@
+import io
+import random
+import time
+
+import pytest
+from readchar import key
+from rich.console import Console
+from rich.live import Live
+
+from bq_meta.util import picker_util
+from bq_meta.util.picker_util import FuzzyIndex
+
+
+def _search(index: FuzzyIndex, query: str) -> list:
+    return [index.choices[idx] for idx in index.search(query)]
+
+
+def _is_subsequence(query: str, choice: str) -> bool:
+    if query == query.lower():
+        choice = choice.lower()
+    chars = iter(choice)
+    return all(char in chars for char in query)
+
+
+@pytest.fixture
+def keys(monkeypatch):
+    """
+    Keys read by the built-in picker, each after a pause so background pages are consumed first
+    """
+    pressed = []
+
+    def readkey() -> str:
+        time.sleep(0.05)
+        return pressed.pop(0)
+
+    monkeypatch.setattr(picker_util.readchar, "readkey", readkey)
+    return pressed
+
+
+def _live() -> Live:
+    return Live(console=Console(file=io.StringIO(), width=80, height=20), auto_refresh=False)
+
+
+def test_empty_query_keeps_listing_order():
+    assert _search(FuzzyIndex(["b", "a", "c"]), "") == ["b", "a", "c"]
+
+
+def test_substring_matches_rank_before_scattered_ones():
+    index = FuzzyIndex(["o_r_d_e_r_s", "xx_orders_xx", "orders", "users"])
+    assert _search(index, "orders") == ["orders", "xx_orders_xx", "o_r_d_e_r_s"]
+
+
+def test_query_is_case_sensitive_only_with_upper_case():
+    index = FuzzyIndex(["Orders", "orders"])
+    assert _search(index, "ord") == ["Orders", "orders"]
+    assert _search(index, "Ord") == ["Orders"]
+
+
+def test_pages_added_later_are_searched():
+    index = FuzzyIndex(["orders"])
+    assert _search(index, "or") == ["orders"]
+    index.extend(["order_items", "users"])
+    assert _search(index, "or") == ["orders", "order_items"]
+    assert _search(index, "ord") == ["orders", "order_items"]
+
+
+def test_matches_are_found_like_a_brute_force_scan():
+    rng = random.Random(7)
+    choices = ["".join(rng.choices("abcAB_\\.*[", k=rng.randint(1, 12))) for _ in range(2000)]
+    index = FuzzyIndex(choices[:1000])
+    index.extend(choices[1000:])
+    for query in ["a", "ab", "abc", "abca", "A", "Ab", "_", "\\", ".", "*", "[", "a.b", "x"]:
+        expected = {idx for idx, choice in enumerate(choices) if _is_subsequence(query, choice)}
+        assert set(index.search(query)) == expected, query
+
+
+def test_large_result_sets_keep_listing_order(monkeypatch):
+    monkeypatch.setattr(picker_util, "RANK_LIMIT", 2)
+    index = FuzzyIndex(["a_long", "ab", "a"])
+    assert _search(index, "a") == ["a_long", "ab", "a"]
+
+
+def test_positions_of_query_characters():
+    index = FuzzyIndex()
+    assert index.positions("odr", "orders") == [0, 2, 4]
+    assert index.positions("ORD", "orders") == []
+
+
+def test_picker_filters_and_picks(keys):
+    keys.extend(["u", "s", key.ENTER])
+    assert picker_util.pick_one(["orders", "users", "sessions"], _live()) == "users"
+
+
+def test_picker_moves_selection(keys):
+    keys.extend([key.DOWN, key.DOWN, key.UP, key.ENTER])
+    assert picker_util.pick_one(["a", "b", "c"], _live()) == "b"
+
+
+def test_picker_reverse_shows_last_choice_first(keys):
+    keys.append(key.ENTER)
+    assert picker_util.pick_one(["oldest", "newest"], _live(), reverse=True) == "newest"
+
+
+def test_picker_without_match_or_cancelled_picks_nothing(keys):
+    keys.extend(["x", key.ENTER])
+    assert picker_util.pick_one(["a"], _live()) is None
+    keys.append(key.ESC)
+    assert picker_util.pick_one(["a"], _live()) is None
+
+
+def test_picker_consumes_pages(keys):
+    keys.extend(["t", "2", key.ENTER])
+    pages = iter([["t1"], ["t2"]])
+    assert picker_util.pick_one_from_pages(pages, _live()) == "t2"
+
+
+def test_picker_refresh_replaces_choices(keys):
+    keys.extend([key.CTRL_R, "n", "e", "w", key.ENTER])
+    relisted = []
+
+    def refresh():
+        relisted.append(True)
+        return iter([["old"], ["new"]])
+
+    assert picker_util.pick_one_from_pages([["old"]], _live(), refresh=refresh) == "new"
+    assert relisted == [True]
+
+
+def test_picker_ignores_refresh_key_without_refresh(keys):
+    keys.extend([key.CTRL_R, key.ENTER])
+    assert picker_util.pick_one_from_pages([["old"]], _live()) == "old"
@@ -0,0 +1,86 @@
+import io
+
+from readchar import key
+from rich.console import Console
+
+from bq_meta.util.schema_util import SchemaBrowser
+
+FIELDS = [
+    {"name": "id", "type": "INTEGER", "mode": "REQUIRED"},
+    {
+        "name": "user",
+        "type": "RECORD",
+        "fields": [
+            {"name": "name", "type": "STRING"},
+            {"name": "address", "type": "RECORD", "fields": [{"name": "city", "type": "STRING"}]},
+        ],
+    },
+    {"name": "created", "type": "TIMESTAMP"},
+]
+
+
+def _visible(browser: SchemaBrowser) -> list:
+    return [browser.nodes[idx].path for idx in browser.rows]
+
+
+def _press(browser: SchemaBrowser, *chars: str):
+    for char in chars:
+        assert browser.handle_key(char)
+
+
+def _render(browser: SchemaBrowser, height: int) -> list:
+    console = Console(file=io.StringIO(), width=80, height=height)
+    console.print(browser)
+    return console.file.getvalue().splitlines()
+
+
+def test_schema_is_flattened_in_pre_order():
+    browser = SchemaBrowser("t", FIELDS)
+    paths = [node.path for node in browser.nodes]
+    assert paths == ["id", "user", "user.name", "user.address", "user.address.city", "created"]
+    assert [node.end for node in browser.nodes] == [1, 5, 3, 5, 5, 6]
+    assert [node.mode for node in browser.nodes][:2] == ["REQUIRED", "NULLABLE"]
+
+
+def test_records_are_expanded_and_collapsed():
+    browser = SchemaBrowser("t", FIELDS)
+    assert _visible(browser) == ["id", "user", "created"]
+    _press(browser, key.DOWN, key.ENTER)
+    assert _visible(browser) == ["id", "user", "user.name", "user.address", "created"]
+    _press(browser, key.DOWN, key.DOWN, key.RIGHT)
+    assert _visible(browser) == ["id", "user", "user.name", "user.address", "user.address.city", "created"]
+    _press(browser, key.DOWN, key.LEFT)  # collapses the parent of a leaf and selects it
+    assert browser.selected_path() == "user.address"
+    assert _visible(browser) == ["id", "user", "user.name", "user.address", "created"]
+
+
+def test_search_filters_by_path_and_reveals_selection():
+    browser = SchemaBrowser("t", FIELDS)
+    _press(browser, "/", "C", "i", "t")
+    assert _visible(browser) == ["user.address.city"]
+    _press(browser, key.ENTER)  # stops typing, keeps the filter
+    assert not browser.searching
+    _press(browser, key.ESC)  # clears the filter, selected column stays visible
+    assert browser.selected_path() == "user.address.city"
+    assert _visible(browser) == ["id", "user", "user.name", "user.address", "user.address.city", "created"]
+
+
+def test_unused_keys_are_not_handled():
+    browser = SchemaBrowser("t", FIELDS)
+    assert not browser.handle_key("q")
+    assert not browser.handle_key(key.ENTER)  # not a record
+
+
+def test_only_rows_fitting_the_height_are_rendered():
+    fields = [{"name": f"column_{idx:03d}", "type": "STRING"} for idx in range(200)]
+    browser = SchemaBrowser("wide", fields)
+    lines = _render(browser, height=7)
+    assert len(lines) == 6  # title and 5 rows, one line is left for the search prompt
+    assert "200 columns" in lines[0]
+    assert "column_000" in lines[1] and "column_004" in lines[5]
+    _press(browser, key.END)
+    lines = _render(browser, height=7)
+    assert "column_195" in lines[1] and "column_199" in lines[5]
+    _press(browser, key.PAGE_UP)
+    lines = _render(browser, height=7)
+    assert "column_189" in lines[1] and "> " in lines[1]
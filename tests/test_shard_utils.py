@@ -0,0 +1,32 @@
+from bq_meta.util.shard_utils import ShardGroups
+
+
+def test_shards_are_grouped_once_across_pages():
+    groups = ShardGroups()
+    pages = [["events_20240101", "users", "events_20240102"], ["events_20240103", "logs20231231"]]
+    assert list(groups.group_pages(pages)) == [["events_*", "users"], ["logs*"]]
+    assert groups.shards("events_*") == ["events_20240101", "events_20240102", "events_20240103"]
+    assert "logs*" in groups
+    assert "users" not in groups
+
+
+def test_only_valid_dates_are_shards():
+    groups = ShardGroups()
+    table_ids = ["t_20241301", "t_20240230x", "t_2024010", "t_18991231", "v2_2024", "t_20240229"]
+    assert [groups.add(table_id) for table_id in table_ids] == [None, None, None, None, None, "t_*"]
+
+
+def test_group_is_described_by_its_date_range():
+    groups = ShardGroups()
+    list(groups.group_pages([["t_20240103", "t_20240101", "t_20240102", "s_20230505"]]))
+    assert groups.describe("t_*") == "3 shards, 20240101..20240103"
+    assert groups.describe("s_*") == "20230505"
+    assert groups.describe("users") is None
+
+
+def test_clear_forgets_groups():
+    groups = ShardGroups()
+    list(groups.group_pages([["t_20240101"]]))
+    groups.clear()
+    assert list(groups.group_pages([["t_20240102"]])) == [["t_*"]]
+    assert groups.shards("t_*") == ["t_20240102"]